@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from typing import Optional
 
 from fastapi import Depends, HTTPException, status
 
@@ -10,10 +11,14 @@ from fastapi.security.http import HTTPBearer
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.users.repositories.users import UserRepository
-
 # app
-from core.db.session import get_session
+from app.auth.dependencies.principal import (
+    Principal,
+    get_cached_principal,
+    principal_cache,
+)
+from app.users.repositories.users import UserRepository
+from core.db.session import get_session, reads_from_replica
 from core.settings import Settings
 
 settings = Settings()
@@ -42,11 +47,31 @@ class JwtBearer:
         except JWTError:
             return None
 
+    async def get_optional_user(
+        self,
+        token: HTTPAuthorizationCredentials = Depends(HTTPBearer(auto_error=False)),
+        session: AsyncSession = Depends(get_session),
+    ) -> Optional[Principal]:
+        """
+        Current principal when a valid bearer token is sent, None otherwise
+        An invalid or expired token is treated as anonymous, not rejected
+        """
+        if token is None:
+            return None
+        try:
+            return await self.get_current_user(token=token, session=session)
+        except HTTPException:
+            return None
+
     async def get_current_user(
         self,
         token: HTTPAuthorizationCredentials = Depends(HTTPBearer()),
         session: AsyncSession = Depends(get_session),
-    ):
+    ) -> Principal:
+        """
+        Principal of the bearer token, served from the principal cache when
+        possible. Handlers needing the full User load it by principal.id
+        """
         payload = await self.decode_access_token(token.credentials)
         if not payload or "sub" not in payload:
             raise HTTPException(
@@ -56,9 +81,20 @@ class JwtBearer:
             )
 
         email = payload["sub"]
+        principal = await get_cached_principal(email)
+        if principal:
+            return principal
+
+        # Replica rows may predate a commit and its invalidation
+        generation = None
+        if not reads_from_replica(session):
+            generation = await principal_cache.generation(email)
         user = await UserRepository(session).get_by_email(email)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
             )
-        return user
+        principal = Principal.from_user(user)
+        if generation is not None:
+            await principal_cache.set(email, principal.to_json(), generation)
+        return principal
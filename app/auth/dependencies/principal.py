@@ -0,0 +1,66 @@
+"""Authenticated principal snapshot and its cache"""
+
+import json
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from uuid import UUID
+
+import redis.asyncio as redis
+
+from app.users.models.users import User
+from core.cache.two_tier import TwoTierCache
+from core.settings import Settings
+
+settings = Settings()
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """The few user fields request handling needs, cheap to cache and copy"""
+
+    id: UUID
+    email: str
+    username: str
+    is_verified: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            is_verified=user.is_verified,
+        )
+
+    def to_json(self) -> str:
+        return json.dumps([str(self.id), self.email, self.username, self.is_verified])
+
+    @classmethod
+    def from_json(cls, value: str) -> "Principal":
+        user_id, email, username, is_verified = json.loads(value)
+        return cls(UUID(user_id), email, username, is_verified)
+
+
+# Keyed by token subject (the user's email)
+principal_cache = TwoTierCache(
+    namespace="principal",
+    ttl=settings.cache.principal_ttl,
+    local_max_entries=settings.entity_cache.local_max_entries,
+)
+
+
+async def get_cached_principal(subject: str) -> Optional[Principal]:
+    cached = await principal_cache.get(subject)
+    if cached is None:
+        return None
+    try:
+        return Principal.from_json(cached)
+    except (ValueError, TypeError):
+        return None
+
+
+async def invalidate_principals(
+    subjects: Iterable[str], redis_client: Optional[redis.Redis] = None
+) -> None:
+    """Drop cached principals after the users behind them changed"""
+    await principal_cache.invalidate_many(list(subjects), redis_client)
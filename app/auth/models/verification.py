@@ -2,6 +2,7 @@ import uuid
 from datetime import datetime
 from typing import TYPE_CHECKING
 
+from sqlalchemy import Index, text
 from sqlmodel import Field, Relationship
 
 from core.models.base import BaseModel
@@ -12,6 +13,14 @@ if TYPE_CHECKING:
 
 class EmailVerification(BaseModel, table=True):
     __tablename__ = "email_verification"
+    __table_args__ = (
+        # Pending verifications aged out by the cleanup task
+        Index(
+            "ix_email_verification_created_at_pending",
+            "created_at",
+            postgresql_where=text("is_verified IS false AND is_deleted IS false"),
+        ),
+    )
 
     user_id: uuid.UUID = Field(
         foreign_key="users.id", unique=True, nullable=False, index=True
@@ -1,5 +1,4 @@
 from fastapi import HTTPException, Request, status
-from passlib.context import CryptContext
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.auth.dependencies.jwt import JwtBearer
@@ -7,11 +6,11 @@ from app.auth.schemas.auth import UserCreate
 from app.auth.services.verification import VerificationService
 from app.users.repositories.users import UserRepository
 from core.db.redis_client import get_redis_client
+from core.db.session import pin_subject
 from core.security.brute_force import BruteForceProtection
+from core.security.password import password_hasher
 from core.security.sanitizer import sanitize_string
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 class AuthService:
     def __init__(self, session: AsyncSession):
@@ -40,10 +39,12 @@ class AuthService:
                 detail="Email already exists",
             )
 
-        hashed_password = pwd_context.hash(user.password)
+        hashed_password = await password_hasher.hash(user.password)
 
         user.password = hashed_password
 
+        # No token yet: pin by the email its tokens will carry
+        pin_subject(self.repo.db, user.email)
         user_obj = await self.repo.create(user)
 
         print("USER CREATED")
@@ -72,37 +73,28 @@ class AuthService:
 
         # Get client IP for brute force protection
         client_ip = request.client.host if request else "unknown"
-        identifier = f"{client_ip}:{email}"
 
-        # Check brute force protection
-        await self.brute_force_protection.check_attempts(identifier)
+        # Check lockout and count this attempt in one Redis round trip
+        await self.brute_force_protection.register_attempt(client_ip, email)
 
         user = await self.repo.get_by_email(email)
-        if not user or not pwd_context.verify(password, user.password):
-            # Record failed attempt
-            await self.brute_force_protection.record_failed_attempt(identifier)
-
-            # Check if we should block after this attempt
-            attempts_key = f"brute_force:{identifier}"
-            redis_client = await get_redis_client()
-            if redis_client:
-                try:
-                    attempts = await redis_client.get(attempts_key)
-                    if (
-                        attempts
-                        and int(attempts)
-                        >= self.brute_force_protection.max_attempts - 1
-                    ):
-                        await self.brute_force_protection.block_identifier(identifier)
-                except Exception:
-                    pass
-
+        valid, new_hash = False, None
+        if user:
+            valid, new_hash = await password_hasher.verify_and_update(
+                password, user.password
+            )
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
             )
 
         # Clear failed attempts on successful login
-        await self.brute_force_protection.record_successful_login(identifier)
+        await self.brute_force_protection.record_successful_login(client_ip, email)
+
+        # Upgrade hashes made with outdated settings while the password is known
+        if new_hash:
+            pin_subject(self.repo.db, user.email)
+            await self.repo.update(user, {"password": new_hash})
 
         token = await self.jwt_bearer.create_access_token({"sub": user.email})
         return {"access_token": token, "token_type": "bearer"}
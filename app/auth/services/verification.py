@@ -1,12 +1,17 @@
 import secrets
 from datetime import datetime, timedelta
+from functools import partial
 from uuid import UUID
 
 from fastapi import HTTPException, status
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.auth.dependencies.principal import invalidate_principals
 from app.auth.repositories.verification import VerificationRepository
 from app.auth.schemas.auth import EmailVerificationSchema
+from app.users.repositories.users import UserRepository
+from core.db.session import pin_subject
+from core.db.unit_of_work import after_commit
 
 
 class VerificationService:
@@ -36,8 +41,7 @@ class VerificationService:
             existing.token = token
             existing.expires_at = expires_at
             existing.is_verified = False
-            await self.db.commit()
-            await self.db.refresh(existing)
+            await self.repo.commit()
             return token
 
         # Create new verification
@@ -69,8 +73,16 @@ class VerificationService:
                 detail="Verification token has expired",
             )
 
+        user = await UserRepository(self.db).get(verification.user_id)
+        if user:
+            # The request carries no token, pin the user's reads by email
+            pin_subject(self.db, user.email)
+
         verification.is_verified = True
-        await self.db.commit()
-        await self.db.refresh(verification)
+        await self.repo.commit()
+
+        # Cached principals still say unverified
+        if user:
+            after_commit(self.db, partial(invalidate_principals, [user.email]))
 
         return True
@@ -4,10 +4,15 @@ from datetime import datetime
 from typing import TYPE_CHECKING, List, Optional
 
 from pydantic import field_validator
+from sqlalchemy import Column, Computed, Index, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import Field, Relationship
 
 # models
-from core.models.base import BaseModel
+from core.models.base import LIVE_ROWS, BaseModel
+from core.settings import Settings
+
+settings = Settings()
 
 if TYPE_CHECKING:
     from app.users.models.users import User
@@ -15,6 +20,18 @@ if TYPE_CHECKING:
 
 class Post(BaseModel, table=True):
     __tablename__ = "post"
+    __table_args__ = (
+        # Keyset pagination seeks on (created_at, id) over live posts, the
+        # expired-post cleanup ranges over created_at
+        Index(
+            "ix_post_created_at_id_live",
+            "created_at",
+            "id",
+            postgresql_where=LIVE_ROWS,
+        ),
+        # Live posts of a user
+        Index("ix_post_user_id_live", "user_id", postgresql_where=LIVE_ROWS),
+    )
 
     user_id: uuid.UUID = Field(foreign_key="users.id")
     user: "User" = Relationship(back_populates="posts")
@@ -23,6 +40,15 @@ class Post(BaseModel, table=True):
     content: str = Field(..., max_length=10_000)
     expires_at: Optional[datetime] = Field(default=None, nullable=True)
 
+    # Denormalized counters, kept in step with likes/comments in the same
+    # transaction and repaired by the reconcile_post_counters task
+    like_count: int = Field(
+        default=0, nullable=False, sa_column_kwargs={"server_default": text("0")}
+    )
+    comment_count: int = Field(
+        default=0, nullable=False, sa_column_kwargs={"server_default": text("0")}
+    )
+
     comments: List["Comment"] = Relationship(back_populates="post")
     likes: List["PostLike"] = Relationship(back_populates="post")
 
@@ -53,9 +79,47 @@ class Post(BaseModel, table=True):
         return v
 
 
+# Full-text search document: title ranks above content. The column is generated
+# by Postgres and deliberately left unmapped so it is never loaded or written by
+# the ORM; changing search.language requires regenerating it
+Post.__table__.append_column(
+    Column(
+        "search_vector",
+        TSVECTOR,
+        Computed(
+            f"setweight(to_tsvector('{settings.search.language}'::regconfig, "
+            f"coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{settings.search.language}'::regconfig, "
+            f"coalesce(content, '')), 'B')",
+            persisted=True,
+        ),
+    )
+)
+Index(
+    "ix_post_search_vector",
+    Post.__table__.c.search_vector,
+    postgresql_using="gin",
+)
+
+
 class PostLike(BaseModel, table=True):
     __tablename__ = "postlike"
-
+    __table_args__ = (
+        # Likers and like counts of a post; (user_id, post_id) probes use
+        # the primary key
+        Index(
+            "ix_postlike_post_id_user_id_live",
+            "post_id",
+            "user_id",
+            postgresql_where=LIVE_ROWS,
+        ),
+    )
+
+    # (user_id, post_id) is the key: a user has one like row per post and a
+    # toggle flips its is_deleted, so id is only a unique surrogate
+    id: uuid.UUID = Field(
+        default_factory=lambda: uuid.uuid4(), nullable=False, unique=True
+    )
     user_id: uuid.UUID = Field(foreign_key="users.id", primary_key=True)
     post_id: uuid.UUID = Field(foreign_key="post.id", primary_key=True)
 
@@ -65,6 +129,18 @@ class PostLike(BaseModel, table=True):
 
 class Comment(BaseModel, table=True):
     __tablename__ = "comment"
+    __table_args__ = (
+        # Comment pages of a post seek on (created_at, id) over live comments
+        Index(
+            "ix_comment_post_id_created_at_id_live",
+            "post_id",
+            "created_at",
+            "id",
+            postgresql_where=LIVE_ROWS,
+        ),
+        # Version probes of a post's comments span deleted ones too
+        Index("ix_comment_post_id", "post_id"),
+    )
 
     post_id: uuid.UUID = Field(foreign_key="post.id", nullable=False)
     user_id: uuid.UUID = Field(foreign_key="users.id", nullable=False)
@@ -1,6 +1,9 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
 
-from sqlmodel import select
+from sqlalchemy import Row, tuple_
+from sqlmodel import func, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.blogs.models.posts import Comment
@@ -11,23 +14,33 @@ class CommentRepository(BaseRepository[Comment]):
     def __init__(self, db: AsyncSession):
         super().__init__(Comment, db)
 
-    async def get_by_post_id(self, post_id) -> List[Comment]:
+    async def list_by_post_id(
+        self, post_id, limit: int, after: Optional[Tuple[datetime, UUID]] = None
+    ) -> List[Comment]:
+        """Page of live comments oldest first, starting after a (created_at, id)"""
         statement = select(Comment).where(
             Comment.post_id == post_id, Comment.is_deleted.is_(False)
         )
+        if after:
+            statement = statement.where(
+                tuple_(Comment.created_at, Comment.id) > tuple_(*after)
+            )
+        statement = statement.order_by(Comment.created_at, Comment.id).limit(limit)
         result = await self.db.exec(statement)
         return result.all()
 
-    async def delete_all_by_post_id(self, post_id):
-        """Delete all comments of a post (soft delete)"""
-        statement = select(Comment).where(
-            Comment.post_id == post_id, Comment.is_deleted.is_(False)
-        )
+    async def get_version_by_post_id(self, post_id) -> Row:
+        """Count of live comments and last modification of any comment on a post"""
+        # Soft deletes bump updated_at too, so the max spans deleted rows
+        statement = select(
+            func.count(Comment.id).filter(Comment.is_deleted.is_(False)).label("count"),
+            func.max(Comment.updated_at).label("updated_at"),
+        ).where(Comment.post_id == post_id)
         result = await self.db.exec(statement)
-        comments = result.all()
-
-        for comment in comments:
-            comment.is_deleted = True
+        return result.one()
 
-        await self.db.commit()
-        return len(comments)
+    async def delete_all_by_post_id(self, post_id) -> int:
+        """Delete all comments of a post (soft delete)"""
+        deleted_count = await self.bulk_soft_delete(Comment.post_id == post_id)
+        await self.commit()
+        return deleted_count
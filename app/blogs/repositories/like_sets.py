@@ -0,0 +1,178 @@
+"""Per-post like sets kept in Redis"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+import redis.asyncio as redis
+
+from core.db.redis_client import get_redis_client
+
+# Member marking a set loaded in full from Postgres. Toggles may create a set
+# holding only recent likers, it is trusted once the sentinel is present
+SENTINEL = "*"
+# Hash of buffered toggles "post_id:user_id" -> "1" liked / "0" unliked
+PENDING_KEY = "likes:pending"
+# The batch a flush is writing, kept until committed so a failed run retries it
+FLUSHING_KEY = "likes:pending:flushing"
+
+LOAD_CHUNK_SIZE = 1000
+
+# KEYS[1] like set, KEYS[2] pending hash; ARGV[1] user id, ARGV[2] post id, ARGV[3] ttl
+TOGGLE_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[1], '*') == 0 then
+    return {-1, 0}
+end
+local liked = 1
+if redis.call('SREM', KEYS[1], ARGV[1]) == 1 then
+    liked = 0
+else
+    redis.call('SADD', KEYS[1], ARGV[1])
+end
+redis.call('HSET', KEYS[2], ARGV[2] .. ':' .. ARGV[1], liked)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {liked, redis.call('SCARD', KEYS[1]) - 1}
+"""
+
+
+class PostLikeSets:
+    """
+    Redis set of liker ids per post, answering like checks and counts in O(1)
+    Sets are loaded lazily from Postgres, toggles then update them in place.
+    All methods fail open and return None when Redis is unavailable
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(post_id) -> str:
+        return f"likes:post:{post_id}"
+
+    async def is_loaded(self, post_id: UUID) -> Optional[bool]:
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return None
+        try:
+            return bool(await redis_client.sismember(self._key(post_id), SENTINEL))
+        except redis.RedisError:
+            return None
+
+    async def load(self, post_id: UUID, user_ids: Iterable[UUID]) -> bool:
+        """Fill a post's set from the liker ids read from Postgres"""
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return False
+        key = self._key(post_id)
+        members = [str(user_id) for user_id in user_ids]
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                for start in range(0, len(members), LOAD_CHUNK_SIZE):
+                    pipe.sadd(key, *members[start : start + LOAD_CHUNK_SIZE])
+                # Sentinel last: a reader never sees a partially loaded set
+                pipe.sadd(key, SENTINEL)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except redis.RedisError:
+            return False
+        return True
+
+    async def contains(self, post_id: UUID, user_id: UUID) -> Optional[bool]:
+        """Whether the user likes the post, None if the set is not loaded"""
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return None
+        try:
+            loaded, liked = await redis_client.smismember(
+                self._key(post_id), [SENTINEL, str(user_id)]
+            )
+        except redis.RedisError:
+            return None
+        return bool(liked) if loaded else None
+
+    async def get_states(
+        self, post_ids: List[UUID], user_id: UUID
+    ) -> Dict[UUID, Tuple[bool, int]]:
+        """(liked, like_count) of the posts whose set is loaded, in one round trip"""
+        redis_client = await get_redis_client()
+        if not redis_client or not post_ids:
+            return {}
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for post_id in post_ids:
+                    pipe.smismember(self._key(post_id), [SENTINEL, str(user_id)])
+                    pipe.scard(self._key(post_id))
+                replies = await pipe.execute()
+        except redis.RedisError:
+            return {}
+
+        states = {}
+        for post_id, (loaded, liked), size in zip(
+            post_ids, replies[::2], replies[1::2]
+        ):
+            if loaded:
+                states[post_id] = (bool(liked), size - 1)
+        return states
+
+    async def apply(
+        self,
+        post_id: UUID,
+        user_id: UUID,
+        liked: bool,
+        redis_client: Optional[redis.Redis] = None,
+    ) -> None:
+        """Mirror a like change committed to Postgres"""
+        redis_client = redis_client or await get_redis_client()
+        if not redis_client:
+            return
+        key = self._key(post_id)
+        try:
+            if liked:
+                await redis_client.sadd(key, str(user_id))
+            else:
+                await redis_client.srem(key, str(user_id))
+        except redis.RedisError:
+            pass
+
+    async def toggle_buffered(
+        self, post_id: UUID, user_id: UUID
+    ) -> Optional[Tuple[bool, int]]:
+        """
+        Toggle in Redis only and queue the change for flush_pending_likes
+        Returns (liked, like_count), None if the set is not loaded
+        """
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return None
+        script = redis_client.register_script(TOGGLE_SCRIPT)
+        try:
+            liked, like_count = await script(
+                keys=[self._key(post_id), PENDING_KEY],
+                args=[str(user_id), str(post_id), self.ttl],
+            )
+        except redis.RedisError:
+            return None
+        if liked == -1:
+            return None
+        return bool(liked), like_count
+
+    async def drop(
+        self, post_id: UUID, redis_client: Optional[redis.Redis] = None
+    ) -> None:
+        redis_client = redis_client or await get_redis_client()
+        if not redis_client:
+            return
+        try:
+            await redis_client.delete(self._key(post_id))
+        except redis.RedisError:
+            pass
+
+    async def drop_many(
+        self, post_ids: List[UUID], redis_client: Optional[redis.Redis] = None
+    ) -> None:
+        redis_client = redis_client or await get_redis_client()
+        if not redis_client or not post_ids:
+            return
+        try:
+            await redis_client.delete(*(self._key(post_id) for post_id in post_ids))
+        except redis.RedisError:
+            pass
@@ -1,17 +1,32 @@
-from typing import Optional
-from uuid import UUID
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from uuid import UUID, uuid4
 
+from sqlalchemy import (
+    ARRAY,
+    Row,
+    and_,
+    any_,
+    case,
+    cast,
+    false,
+    literal,
+    not_,
+    true,
+    update,
+)
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.dialects.postgresql import insert
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.blogs.models.posts import PostLike
+from app.blogs.models.posts import Post, PostLike
 from core.repositories.base import BaseRepository
 
 
 class PostLikeRepository(BaseRepository[PostLike]):
     def __init__(self, db: AsyncSession):
-        self.db = db
-        self.model = PostLike
+        super().__init__(PostLike, db)
 
     async def get_by_user_and_post(
         self, user_id: UUID, post_id: UUID
@@ -23,3 +38,104 @@ class PostLikeRepository(BaseRepository[PostLike]):
         )
         result = await self.db.exec(statement)
         return result.first()
+
+    async def get_liker_ids(self, post_id: UUID) -> List[UUID]:
+        statement = select(PostLike.user_id).where(
+            PostLike.post_id == post_id, PostLike.is_deleted.is_(False)
+        )
+        result = await self.db.exec(statement)
+        return result.all()
+
+    async def get_states(self, user_id: UUID, post_ids: List[UUID]) -> List[Row]:
+        """(post_id, liked, like_count) of live posts among post_ids in one query"""
+        statement = (
+            select(
+                Post.id.label("post_id"),
+                PostLike.user_id.isnot(None).label("liked"),
+                Post.like_count,
+            )
+            .outerjoin(
+                PostLike,
+                and_(
+                    PostLike.post_id == Post.id,
+                    PostLike.user_id == user_id,
+                    PostLike.is_deleted.is_(False),
+                ),
+            )
+            .where(Post.id == any_(cast(post_ids, ARRAY(PG_UUID))))
+            .where(Post.is_deleted.is_(False))
+        )
+        result = await self.db.exec(statement)
+        return result.all()
+
+    async def toggle(self, user_id: UUID, post_id: UUID) -> Optional[Row]:
+        """
+        Flip a like and shift the post's like_count in one statement
+        Upserting on (user_id, post_id) makes concurrent toggles serialize on
+        the like row. The like is only written while the post is live in the
+        database, postlike.post_id has no foreign key once post is
+        partitioned. Returns (liked, like_count), None if the post is gone;
+        the caller commits
+        """
+        now = datetime.utcnow()
+        # FOR SHARE holds off a concurrent delete of the post until commit
+        live_post = (
+            select(
+                literal(uuid4(), PG_UUID),
+                literal(user_id, PG_UUID),
+                Post.id,
+                literal(now),
+                literal(now),
+                false(),
+            )
+            .where(Post.id == post_id, Post.is_deleted.is_(False))
+            .with_for_update(read=True)
+        )
+        upsert = insert(PostLike).from_select(
+            ["id", "user_id", "post_id", "created_at", "updated_at", "is_deleted"],
+            live_post,
+        )
+        toggled = (
+            upsert.on_conflict_do_update(
+                index_elements=[PostLike.user_id, PostLike.post_id],
+                set_={"is_deleted": not_(PostLike.is_deleted), "updated_at": now},
+            )
+            .returning(PostLike.post_id, PostLike.is_deleted)
+            .cte("toggled")
+        )
+        delta = case((select(toggled.c.is_deleted).scalar_subquery(), -1), else_=1)
+        counted = (
+            update(Post)
+            .where(Post.id.in_(select(toggled.c.post_id)))
+            .values(like_count=Post.like_count + delta, updated_at=now)
+            .returning(Post.like_count)
+            .cte("counted")
+        )
+        statement = select(
+            not_(toggled.c.is_deleted).label("liked"), counted.c.like_count
+        ).select_from(toggled.join(counted, true()))
+        result = await self.db.exec(statement)
+        return result.first()
+
+    async def apply_states(self, states: Iterable[Tuple[UUID, UUID, bool]]) -> None:
+        """Upsert buffered (post_id, user_id, liked) states without committing"""
+        now = datetime.utcnow()
+        rows = [
+            {
+                "id": uuid4(),
+                "post_id": post_id,
+                "user_id": user_id,
+                "is_deleted": not liked,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for post_id, user_id, liked in states
+        ]
+        if not rows:
+            return
+        upsert = insert(PostLike).values(rows)
+        statement = upsert.on_conflict_do_update(
+            index_elements=[PostLike.user_id, PostLike.post_id],
+            set_={"is_deleted": upsert.excluded.is_deleted, "updated_at": now},
+        )
+        await self.db.exec(statement)
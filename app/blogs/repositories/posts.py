@@ -1,9 +1,104 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import Row, update
+from sqlmodel import func, or_, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.blogs.models.posts import Post
+from app.blogs.models.posts import Comment, Post, PostLike
 from core.repositories.base import BaseRepository
 
 
 class PostRepository(BaseRepository[Post]):
     def __init__(self, db: AsyncSession):
         super().__init__(Post, db)
+
+    async def get_version(self, post_id: UUID) -> Optional[Row]:
+        """Fetch only the columns needed to validate a cached representation"""
+        statement = select(Post.updated_at, Post.expires_at).where(
+            Post.id == post_id, Post.is_deleted.is_(False)
+        )
+        result = await self.db.exec(statement)
+        return result.first()
+
+    async def adjust_counters(
+        self, post_id: UUID, likes: int = 0, comments: int = 0
+    ) -> bool:
+        """
+        Shift the denormalized counters without committing
+        Callers commit together with the like/comment change they count.
+        updated_at moves too, the counters are part of the post representation.
+        Returns False if the post is not live in the database; otherwise its
+        row stays locked until commit
+        """
+        statement = (
+            update(Post)
+            .where(Post.id == post_id, Post.is_deleted.is_(False))
+            .values(
+                like_count=Post.like_count + likes,
+                comment_count=Post.comment_count + comments,
+                updated_at=datetime.utcnow(),
+            )
+            .returning(Post.id)
+        )
+        result = await self.db.exec(statement)
+        return result.first() is not None
+
+    async def reset_comment_count(self, post_id: UUID) -> None:
+        """Zero the comment counter without committing"""
+        statement = (
+            update(Post)
+            .where(Post.id == post_id)
+            .values(comment_count=0, updated_at=datetime.utcnow())
+        )
+        await self.db.exec(statement)
+
+    @staticmethod
+    def _live_like_count():
+        # (user_id, post_id) is the like key, so live rows count distinct likers
+        return (
+            select(func.count())
+            .where(PostLike.post_id == Post.id, PostLike.is_deleted.is_(False))
+            .scalar_subquery()
+        )
+
+    async def recount_likes(self, post_ids: list[UUID]) -> None:
+        """Recompute like_count of the given posts without committing"""
+        statement = (
+            update(Post)
+            .where(Post.id.in_(post_ids))
+            .values(like_count=self._live_like_count(), updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.exec(statement)
+
+    async def get_live_ids(self, post_ids: list[UUID]) -> set[UUID]:
+        statement = select(Post.id).where(
+            Post.id.in_(post_ids), Post.is_deleted.is_(False)
+        )
+        result = await self.db.exec(statement)
+        return set(result.all())
+
+    async def reconcile_counters(self) -> list[UUID]:
+        """Recount likes and comments, fixing drifted posts in one statement"""
+        likes = self._live_like_count()
+        comments = (
+            select(func.count(Comment.id))
+            .where(Comment.post_id == Post.id, Comment.is_deleted.is_(False))
+            .scalar_subquery()
+        )
+        statement = (
+            update(Post)
+            .where(
+                Post.is_deleted.is_(False),
+                or_(Post.like_count != likes, Post.comment_count != comments),
+            )
+            .values(
+                like_count=likes, comment_count=comments, updated_at=datetime.utcnow()
+            )
+            .returning(Post.id)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.db.exec(statement)
+        return list(result.scalars())
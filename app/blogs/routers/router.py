@@ -1,11 +1,19 @@
 from datetime import datetime
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.dependencies.jwt import JwtBearer
-from app.blogs.schemas.comments import CommentCreateSchema, CommentResponseSchema
+from app.auth.dependencies.principal import Principal
+from app.blogs.schemas.comments import (
+    CommentCreateSchema,
+    CommentListResponseSchema,
+    CommentResponseSchema,
+)
+from app.blogs.schemas.likes import PostLikeStatesResponseSchema
 from app.blogs.schemas.posts import (
     PostCreateSchema,
     PostListResponseSchema,
@@ -16,8 +24,11 @@ from app.blogs.schemas.posts import (
 from app.blogs.services.v1.comments import CommentService
 from app.blogs.services.v1.likes import PostLikeService
 from app.blogs.services.v1.posts import PostService
-from app.users.models.users import User
 from core.db.session import get_session
+from core.http_cache import cache_headers, is_not_modified, make_etag, not_modified
+from core.settings import Settings
+
+settings = Settings()
 
 router = APIRouter(tags=["blogs"])
 
@@ -38,22 +49,57 @@ def get_like_service(session: AsyncSession = Depends(get_session)) -> PostLikeSe
 
 @router.get("/", response_model=PostListResponseSchema)
 async def posts(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
     search: str = Query(None),
     date_from: datetime = Query(None),
     date_to: datetime = Query(None),
+    cursor: str = Query(None, description="Opaque next_cursor/prev_cursor value"),
+    sort: Literal["recent", "relevance"] = Query("recent"),
+    count_mode: Literal["exact", "estimated", "none"] = Query("exact"),
+    include: Literal["liked_by_me"] = Query(None),
+    token: Optional[HTTPAuthorizationCredentials] = Depends(
+        HTTPBearer(auto_error=False)
+    ),
+    session: AsyncSession = Depends(get_session),
     service: PostService = Depends(get_post_service),
+    like_service: PostLikeService = Depends(get_like_service),
 ):
-    return await service.list_posts(
-        skip=skip, limit=limit, search=search, date_from=date_from, date_to=date_to
+    result = await service.list_posts(
+        skip=skip,
+        limit=limit,
+        search=search,
+        date_from=date_from,
+        date_to=date_to,
+        cursor=cursor,
+        sort=sort,
+        count_mode=count_mode,
     )
+    # The shared page comes from the listing cache, per-user state goes on top.
+    # The token is only looked at when asked to personalize, the public feed
+    # never fails on it
+    current_user = None
+    if include == "liked_by_me":
+        current_user = await jwt_bearer.get_optional_user(token=token, session=session)
+    personalized = current_user is not None
+    if personalized:
+        await like_service.mark_liked_by(result.items, current_user)
+
+    # Pages have no single row version, validate on the serialized body instead
+    body = result.model_dump_json()
+    headers = cache_headers(make_etag(body), public=not personalized)
+    # Same URL is public for anonymous callers and private when personalized
+    headers["Vary"] = "Authorization"
+    if is_not_modified(request, headers["ETag"]):
+        return not_modified(headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.post("/", response_model=PostResponseSchema)
 async def create_post(
     data: PostCreateSchema,
-    current_user: User = Depends(jwt_bearer.get_current_user),
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
     service: PostService = Depends(get_post_service),
 ):
     return await service.create_post(data=data, user=current_user)
@@ -61,15 +107,46 @@ async def create_post(
 
 @router.get("/all", response_model=UserWithArticlesListResponseSchema)
 async def get_all_users_with_articles(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
     service: PostService = Depends(get_post_service),
 ):
-    return await service.get_all_users_with_articles(skip=skip, limit=limit)
+    result = await service.get_all_users_with_articles(skip=skip, limit=limit)
+    body = result.model_dump_json()
+    headers = cache_headers(make_etag(body))
+    if is_not_modified(request, headers["ETag"]):
+        return not_modified(headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Declared before /{post_id} so "likes" is not parsed as a post id
+@router.get("/likes", response_model=PostLikeStatesResponseSchema)
+async def get_like_states(
+    post_ids: List[UUID] = Query(
+        ..., min_length=1, max_length=settings.likes.batch_max_ids
+    ),
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
+    service: PostLikeService = Depends(get_like_service),
+):
+    return await service.get_like_states(post_ids=post_ids, user=current_user)
 
 
 @router.get("/{post_id}", response_model=PostResponseSchema)
-async def get_post(post_id: UUID, service: PostService = Depends(get_post_service)):
+async def get_post(
+    post_id: UUID,
+    request: Request,
+    response: Response,
+    service: PostService = Depends(get_post_service),
+):
+    # Validate against updated_at before loading and serializing the full row
+    version = await service.get_post_version(post_id=post_id)
+    etag = make_etag(post_id, version.updated_at.isoformat())
+    headers = cache_headers(etag, version.updated_at)
+    if is_not_modified(request, etag, version.updated_at):
+        return not_modified(headers)
+
+    response.headers.update(headers)
     return await service.get_post(post_id=post_id)
 
 
@@ -77,7 +154,7 @@ async def get_post(post_id: UUID, service: PostService = Depends(get_post_servic
 async def update_post(
     post_id: UUID,
     data: PostUpdateSchema,
-    current_user: User = Depends(jwt_bearer.get_current_user),
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
     service: PostService = Depends(get_post_service),
 ):
     return await service.update_post(post_id=post_id, data=data, user=current_user)
@@ -86,7 +163,7 @@ async def update_post(
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_post(
     post_id: UUID,
-    current_user: User = Depends(jwt_bearer.get_current_user),
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
     service: PostService = Depends(get_post_service),
 ):
     await service.delete_post(post_id=post_id, user=current_user)
@@ -97,23 +174,40 @@ async def delete_post(
 async def create_comment(
     post_id: UUID,
     data: CommentCreateSchema,
-    current_user: User = Depends(jwt_bearer.get_current_user),
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
     service: CommentService = Depends(get_comment_service),
 ):
     return await service.create_comment(post_id=post_id, data=data, user=current_user)
 
 
-@router.get("/{post_id}/comments", response_model=list[CommentResponseSchema])
+@router.get("/{post_id}/comments", response_model=CommentListResponseSchema)
 async def get_comments(
-    post_id: UUID, service: CommentService = Depends(get_comment_service)
+    post_id: UUID,
+    request: Request,
+    response: Response,
+    limit: int = Query(
+        settings.pagination.comments_default_limit,
+        ge=1,
+        le=settings.pagination.comments_max_limit,
+    ),
+    cursor: str = Query(None, description="Opaque next_cursor value"),
+    service: CommentService = Depends(get_comment_service),
 ):
-    return await service.get_comments_by_post(post_id)
+    # Comments are only added or soft-deleted, so count + newest change is enough
+    version = await service.get_comments_version(post_id)
+    etag = make_etag(post_id, version.count, version.updated_at, limit, cursor)
+    headers = cache_headers(etag, version.updated_at)
+    if is_not_modified(request, etag, version.updated_at):
+        return not_modified(headers)
+
+    response.headers.update(headers)
+    return await service.get_comments_by_post(post_id, limit=limit, cursor=cursor)
 
 
 @router.delete("/{post_id}/comments", status_code=status.HTTP_200_OK)
 async def delete_all_comments(
     post_id: UUID,
-    current_user: User = Depends(jwt_bearer.get_current_user),
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
     service: CommentService = Depends(get_comment_service),
 ):
     return await service.delete_all_comments_by_post(post_id=post_id, user=current_user)
@@ -123,7 +217,7 @@ async def delete_all_comments(
 async def delete_comment(
     post_id: UUID,
     comment_id: UUID,
-    current_user: User = Depends(jwt_bearer.get_current_user),
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
     service: CommentService = Depends(get_comment_service),
 ):
     await service.delete_comment(
@@ -135,7 +229,7 @@ async def delete_comment(
 @router.post("/{post_id}/like")
 async def toggle_like(
     post_id: UUID,
-    current_user: User = Depends(jwt_bearer.get_current_user),
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
     service: PostLikeService = Depends(get_like_service),
 ):
     return await service.toggle_like(post_id=post_id, user=current_user)
@@ -144,7 +238,7 @@ async def toggle_like(
 @router.get("/{post_id}/like")
 async def check_like(
     post_id: UUID,
-    current_user: User = Depends(jwt_bearer.get_current_user),
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
     service: PostLikeService = Depends(get_like_service),
 ):
     liked = await service.check_like(post_id=post_id, user=current_user)
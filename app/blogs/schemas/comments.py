@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import List
 from uuid import UUID
 
 from pydantic import BaseModel, Field
@@ -18,3 +19,9 @@ class CommentResponseSchema(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class CommentListResponseSchema(BaseModel):
+    items: List[CommentResponseSchema]
+    limit: int
+    next_cursor: str | None = None
@@ -1,3 +1,4 @@
+from typing import List
 from uuid import UUID
 
 from pydantic import BaseModel
@@ -9,3 +10,14 @@ class PostLikeResponseSchema(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class PostLikeStateSchema(BaseModel):
+    post_id: UUID
+    liked: bool
+    like_count: int
+
+
+class PostLikeStatesResponseSchema(BaseModel):
+    # Posts that do not exist or were deleted are left out
+    items: List[PostLikeStateSchema]
@@ -21,16 +21,30 @@ class PostResponseSchema(BaseModel):
     title: str
     content: str
     created_at: datetime
+    like_count: int = 0
+    comment_count: int = 0
 
     class Config:
         from_attributes = True
 
 
+class PostListItemSchema(PostResponseSchema):
+    # Only populated when the listing is filtered by a search query
+    rank: float | None = None
+    headline: str | None = None
+    # Only populated with include=liked_by_me for an authenticated caller
+    liked_by_me: bool | None = None
+
+
 class PostListResponseSchema(BaseModel):
-    items: List[PostResponseSchema]
-    total: int
+    items: List[PostListItemSchema]
+    # None when the listing was requested with count_mode=none
+    total: int | None
     skip: int
     limit: int
+    has_more: bool = False
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
 
 
 class ArticleSchema(BaseModel):
@@ -38,6 +52,8 @@ class ArticleSchema(BaseModel):
     title: str | None = None
     content: str | None = None
     likes: List[UUID] | None = None
+    like_count: int = 0
+    comment_count: int = 0
 
     class Config:
         from_attributes = True
@@ -3,11 +3,12 @@ from uuid import UUID
 from fastapi import HTTPException, status
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.auth.dependencies.principal import Principal
 from app.blogs.models.posts import Comment
 from app.blogs.repositories.comments import CommentRepository
 from app.blogs.repositories.posts import PostRepository
 from app.blogs.schemas.comments import CommentCreateSchema
-from app.users.models.users import User
+from core.pagination import NEXT, decode_cursor, encode_cursor
 from core.security.sanitizer import sanitize_string
 
 
@@ -17,7 +18,7 @@ class CommentService:
         self.post_repo = PostRepository(db)
 
     async def create_comment(
-        self, post_id: UUID, data: CommentCreateSchema, user: User
+        self, post_id: UUID, data: CommentCreateSchema, user: Principal
     ) -> Comment:
         # Check if user is verified
         if not user.is_verified:
@@ -37,12 +38,40 @@ class CommentService:
         comment_data["text"] = sanitize_string(comment_data["text"])
         comment_data["post_id"] = post_id
         comment_data["user_id"] = user.id
-        return await self.repo.create(comment_data)
+        # Counted in the transaction committed by create(). The cached post
+        # may be stale and comment.post_id has no foreign key once post is
+        # partitioned, the counter update checks the post in the database
+        if not await self.post_repo.adjust_counters(post_id, comments=1):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
+            )
+        comment = await self.repo.create(comment_data)
+        await self.post_repo.invalidate(post_id)
+        return comment
+
+    async def get_comments_by_post(
+        self, post_id: UUID, limit: int, cursor: str = None
+    ) -> dict:
+        """Page of a post's comments in (created_at, id) order"""
+        # Comments only page forward, a PREV cursor comes from another listing
+        position = decode_cursor(cursor, directions=(NEXT,))
+        after = position[:2] if position else None
+
+        # Fetch one extra row to know whether another page exists
+        comments = await self.repo.list_by_post_id(
+            post_id, limit=limit + 1, after=after
+        )
+        next_cursor = None
+        if len(comments) > limit:
+            comments = comments[:limit]
+            next_cursor = encode_cursor(comments[-1].created_at, comments[-1].id)
+        return {"items": comments, "limit": limit, "next_cursor": next_cursor}
 
-    async def get_comments_by_post(self, post_id: UUID):
-        return await self.repo.get_by_post_id(post_id)
+    async def get_comments_version(self, post_id: UUID):
+        """(count, last updated_at) of a post's live comments"""
+        return await self.repo.get_version_by_post_id(post_id)
 
-    async def delete_comment(self, post_id: UUID, comment_id: UUID, user: User):
+    async def delete_comment(self, post_id: UUID, comment_id: UUID, user: Principal):
         comment = await self.repo.get(comment_id)
         if not comment:
             raise HTTPException(
@@ -61,9 +90,11 @@ class CommentService:
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You can only delete your own comments",
             )
+        await self.post_repo.adjust_counters(comment.post_id, comments=-1)
         await self.repo.delete(comment)
+        await self.post_repo.invalidate(comment.post_id)
 
-    async def delete_comment_by_id(self, comment_id: UUID, user: User):
+    async def delete_comment_by_id(self, comment_id: UUID, user: Principal):
         """Delete comment by its UUID only"""
         comment = await self.repo.get(comment_id)
         if not comment:
@@ -76,9 +107,11 @@ class CommentService:
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You can only delete your own comments",
             )
+        await self.post_repo.adjust_counters(comment.post_id, comments=-1)
         await self.repo.delete(comment)
+        await self.post_repo.invalidate(comment.post_id)
 
-    async def delete_all_comments_by_post(self, post_id: UUID, user: User):
+    async def delete_all_comments_by_post(self, post_id: UUID, user: Principal):
         """Delete all comments of a post - only post owner can do this"""
         # Check if post exists
         post = await self.post_repo.get(post_id)
@@ -94,7 +127,9 @@ class CommentService:
                 detail="You can only delete comments from your own posts",
             )
 
+        await self.post_repo.reset_comment_count(post_id)
         deleted_count = await self.repo.delete_all_by_post_id(post_id)
+        await self.post_repo.invalidate(post_id)
         return {
             "deleted_count": deleted_count,
             "message": f"Deleted {deleted_count} comment(s)",
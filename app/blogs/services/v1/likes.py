@@ -1,26 +1,38 @@
+from functools import partial
+from typing import List
 from uuid import UUID
 
 from fastapi import HTTPException, status
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.auth.dependencies.principal import Principal
+from app.blogs.models.posts import Post
+from app.blogs.repositories.like_sets import PostLikeSets
 from app.blogs.repositories.likes import PostLikeRepository
 from app.blogs.repositories.posts import PostRepository
-from app.blogs.schemas.posts import PostLikeSchema
-from app.users.models.users import User
+from app.blogs.schemas.posts import PostListItemSchema
+from core.db.session import reads_from_replica
+from core.db.unit_of_work import after_commit
+from core.settings import Settings
+
+settings = Settings()
+
+like_sets = PostLikeSets(ttl=settings.likes.set_ttl)
 
 
 class PostLikeService:
     def __init__(self, db: AsyncSession):
+        self.db = db
         self.repo = PostLikeRepository(db)
         self.post_repo = PostRepository(db)
 
-    async def toggle_like(self, post_id: UUID, user: User):
+    async def _get_likeable_post(self, post_id: UUID, user: Principal) -> Post:
         if not user.is_verified:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Unverified users cannot create posts. Please verify your email first.",
             )
-        # Check if post exists and is not expired
+        # Check if post exists and is not expired (served by the entity cache)
         post = await self.post_repo.get(post_id)
         if not post:
             raise HTTPException(
@@ -37,18 +49,78 @@ class PostLikeService:
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You cannot like your own post",
             )
+        return post
+
+    async def _load_like_set(self, post_id: UUID) -> bool:
+        """Make sure the post's Redis like set is complete, False without Redis"""
+        loaded = await like_sets.is_loaded(post_id)
+        if loaded is None:
+            return False
+        if loaded:
+            return True
+        # Likes read from a lagging replica would miss the latest toggles
+        if reads_from_replica(self.db):
+            return False
+        user_ids = await self.repo.get_liker_ids(post_id)
+        return await like_sets.load(post_id, user_ids)
+
+    async def toggle_like(self, post_id: UUID, user: Principal):
+        await self._get_likeable_post(post_id, user)
+
+        toggled = None
+        if settings.likes.write_behind and await self._load_like_set(post_id):
+            # Postgres catches up when flush_pending_likes runs
+            toggled = await like_sets.toggle_buffered(post_id, user.id)
+
+        if toggled is None:
+            result = await self.repo.toggle(user_id=user.id, post_id=post_id)
+            if result is None:
+                # Deleted since the cached read above
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
+                )
+            await self.post_repo.invalidate(post_id)
+            # The like set mirrors committed rows only
+            after_commit(
+                self.db, partial(like_sets.apply, post_id, user.id, result.liked)
+            )
+            await self.repo.commit()
+            toggled = (result.liked, result.like_count)
+
+        liked, like_count = toggled
+        return {
+            "liked": liked,
+            "like_count": like_count,
+            "message": "Post liked" if liked else "Post unliked",
+        }
+
+    async def get_like_states(self, post_ids: List[UUID], user: Principal) -> dict:
+        """Liked state and like count of a batch of posts for one user"""
+        post_ids = list(dict.fromkeys(post_ids))
+        rows = await self.repo.get_states(user_id=user.id, post_ids=post_ids)
+        states = {row.post_id: (row.liked, row.like_count) for row in rows}
+        if settings.likes.write_behind:
+            # Buffered toggles are only in Redis until the next flush
+            buffered = await like_sets.get_states(list(states), user.id)
+            states.update(buffered)
+        return {
+            "items": [
+                {"post_id": post_id, "liked": liked, "like_count": like_count}
+                for post_id, (liked, like_count) in states.items()
+            ]
+        }
+
+    async def mark_liked_by(self, items: List[PostListItemSchema], user: Principal):
+        """Fill liked_by_me of listing items after the shared page was cached"""
+        states = await self.get_like_states([item.id for item in items], user)
+        liked = {state["post_id"]: state["liked"] for state in states["items"]}
+        for item in items:
+            item.liked_by_me = liked.get(item.id, False)
 
-        existing_like = await self.repo.get_by_user_and_post(
-            user_id=user.id, post_id=post_id
-        )
-        if existing_like:
-            await self.repo.delete(existing_like)
-            return {"liked": False, "message": "Post unliked"}
-        else:
-            data = PostLikeSchema(user_id=user.id, post_id=post.id)
-            await self.repo.create(data)
-            return {"liked": True, "message": "Post liked"}
-
-    async def check_like(self, post_id: UUID, user: User) -> bool:
+    async def check_like(self, post_id: UUID, user: Principal) -> bool:
+        if await self._load_like_set(post_id):
+            liked = await like_sets.contains(post_id, user.id)
+            if liked is not None:
+                return liked
         like = await self.repo.get_by_user_and_post(user_id=user.id, post_id=post_id)
         return like is not None
@@ -1,39 +1,68 @@
 import json
 from datetime import datetime
+from functools import partial
 from typing import List
 from uuid import UUID
 
 from fastapi import HTTPException, status
-from sqlalchemy import JSON
+from sqlalchemy import JSON, cast, tuple_
+from sqlalchemy.dialects.postgresql import REGCONFIG
 from sqlmodel import and_, func, or_, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.auth.dependencies.principal import Principal
+
 # models
-from app.blogs.models.posts import Post, PostLike
+from app.blogs.models.posts import Comment, Post, PostLike
 
 # repo
+from app.blogs.repositories.comments import CommentRepository
+from app.blogs.repositories.likes import PostLikeRepository
 from app.blogs.repositories.posts import PostRepository
 
 # schemas
 from app.blogs.schemas.posts import (
     ArticleSchema,
     PostCreateSchema,
+    PostListItemSchema,
+    PostListResponseSchema,
     PostUpdateSchema,
     UserWithArticlesListResponseSchema,
     UserWithArticlesSchema,
 )
+
+# services
+from app.blogs.services.v1.likes import like_sets
 from app.users.models.users import User
+from core.cache.versioned import VersionedCache
+from core.db.explain import estimate_rows
+from core.db.session import reads_from_replica
+from core.db.unit_of_work import after_commit
+from core.pagination import NEXT, PREV, decode_cursor, encode_cursor
 
 # security
 from core.security.sanitizer import sanitize_string
+from core.settings import Settings
+
+settings = Settings()
+
+SEARCH_VECTOR = Post.__table__.c.search_vector
+SEARCH_CONFIG = cast(settings.search.language, REGCONFIG)
+
+# Listing pages are shared by all anonymous readers, any post write bumps the
+# namespace version so stale pages are never served
+post_list_cache = VersionedCache("posts:list", ttl=settings.cache.post_list_ttl)
 
 
 class PostService:
 
     def __init__(self, db: AsyncSession):
+        self.db = db
         self.repo = PostRepository(db)
+        self.comment_repo = CommentRepository(db)
+        self.like_repo = PostLikeRepository(db)
 
-    async def create_post(self, data: PostCreateSchema, user: User) -> Post:
+    async def create_post(self, data: PostCreateSchema, user: Principal) -> Post:
         if not user.is_verified:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -45,7 +74,9 @@ class PostService:
         post_data["title"] = sanitize_string(post_data["title"])
         post_data["content"] = sanitize_string(post_data["content"])
         post_data["user_id"] = user.id
-        return await self.repo.create(post_data)
+        post = await self.repo.create(post_data)
+        after_commit(self.db, post_list_cache.invalidate)
+        return post
 
     async def get_post(self, post_id: UUID) -> Post:
         post = await self.repo.get(post_id)
@@ -62,6 +93,19 @@ class PostService:
 
         return post
 
+    async def get_post_version(self, post_id: UUID):
+        """Version columns of a visible post, without loading the full row"""
+        version = await self.repo.get_version(post_id)
+        if not version:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Post not found"
+            )
+        if version.expires_at and datetime.utcnow() > version.expires_at:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE, detail="Post has expired"
+            )
+        return version
+
     async def list_posts(
         self,
         skip: int = 0,
@@ -69,69 +113,208 @@ class PostService:
         search: str = None,
         date_from: datetime = None,
         date_to: datetime = None,
+        cursor: str = None,
+        sort: str = "recent",
+        count_mode: str = "exact",
     ):
-        """List posts with pagination, search and date filtering"""
-        statement = select(Post).where(
-            Post.is_deleted.is_(False),
-            or_(
-                Post.expires_at.is_(None),
-                Post.expires_at > datetime.utcnow(),
-            ),
+        """
+        List posts with pagination, full-text search and date filtering
+        Offset mode pages with skip/limit, cursor mode seeks on (created_at, id)
+        so deep pages cost the same as the first one
+
+        count_mode picks how total is computed: "exact" in the same round trip
+        as the page, "estimated" from planner statistics, "none" skips it and
+        clients rely on has_more
+        """
+        position = decode_cursor(cursor)
+        search = " ".join(search.split()).lower() if search else None
+        cache_params = (
+            None if position else skip,
+            cursor,
+            limit,
+            search,
+            date_from.isoformat() if date_from else None,
+            date_to.isoformat() if date_to else None,
+            sort,
+            count_mode,
+        )
+        cached, cache_key = await post_list_cache.lookup(cache_params)
+        if cached is not None:
+            return PostListResponseSchema.model_validate_json(cached)
+
+        response, next_expiry = await self._query_posts(
+            position=position,
+            skip=skip,
+            limit=limit,
+            search=search,
+            date_from=date_from,
+            date_to=date_to,
+            sort=sort,
+            count_mode=count_mode,
         )
 
-        # Search by title or content
-        if search:
-            search_pattern = f"%{search}%"
-            statement = statement.where(
-                or_(
-                    Post.title.ilike(search_pattern),
-                    Post.content.ilike(search_pattern),
-                )
-            )
+        # Never serve a page past the moment one of its posts expires
+        ttl = None
+        if next_expiry:
+            ttl = int((next_expiry - datetime.utcnow()).total_seconds())
+        # A lagging replica's page may predate the last invalidation
+        if not reads_from_replica(self.db):
+            await post_list_cache.store(cache_key, response.model_dump_json(), ttl=ttl)
+        return response
 
-        # Date filtering
-        if date_from:
-            statement = statement.where(Post.created_at >= date_from)
-        if date_to:
-            statement = statement.where(Post.created_at <= date_to)
-
-        # Order by created_at descending
-        statement = statement.order_by(Post.created_at.desc())
+    async def _query_posts(
+        self,
+        position,
+        skip: int,
+        limit: int,
+        search: str,
+        date_from: datetime,
+        date_to: datetime,
+        sort: str,
+        count_mode: str,
+    ):
+        """Run the listing query, returning the page and its earliest expiry"""
+        ts_query = self._search_query(search)
+        by_relevance = sort == "relevance" and ts_query is not None
+        if position and by_relevance:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor pagination is only supported for sort=recent",
+            )
 
-        # Pagination
-        statement = statement.offset(skip).limit(limit)
+        filters = self._list_filters(
+            ts_query=ts_query, date_from=date_from, date_to=date_to
+        )
 
-        result = await self.repo.db.exec(statement)
-        posts = result.all()
+        columns = [Post]
+        if ts_query is not None:
+            rank = func.ts_rank_cd(SEARCH_VECTOR, ts_query)
+            headline = func.ts_headline(
+                SEARCH_CONFIG, Post.content, ts_query, settings.search.headline_options
+            )
+            columns += [rank.label("rank"), headline.label("headline")]
+        if count_mode == "exact":
+            if position:
+                # The seek predicate narrows the window, count the full set once
+                total_count = (
+                    select(func.count(Post.id)).where(*filters).scalar_subquery()
+                )
+            else:
+                total_count = func.count().over()
+            columns.append(total_count.label("total_count"))
+
+        statement = select(*columns).where(*filters)
+        backwards = False
+        if position:
+            created_at, post_id, direction = position
+            backwards = direction == PREV
+            key = tuple_(Post.created_at, Post.id)
+            # The redundant created_at bound lets a partitioned post table
+            # prune partitions, row comparisons are not used for pruning
+            if backwards:
+                statement = statement.where(
+                    key > tuple_(created_at, post_id), Post.created_at >= created_at
+                )
+                statement = statement.order_by(Post.created_at.asc(), Post.id.asc())
+            else:
+                statement = statement.where(
+                    key < tuple_(created_at, post_id), Post.created_at <= created_at
+                )
+                statement = statement.order_by(Post.created_at.desc(), Post.id.desc())
+            skip = 0
+        else:
+            if by_relevance:
+                statement = statement.order_by(rank.desc())
+            # Order by created_at descending
+            statement = statement.order_by(Post.created_at.desc(), Post.id.desc())
+            statement = statement.offset(skip)
+
+        # Fetch one extra row to know whether another page exists
+        result = await self.repo.db.exec(statement.limit(limit + 1))
+        rows = result.all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            rows.reverse()
+
+        total = None
+        if count_mode == "exact":
+            if rows:
+                total = rows[0].total_count
+            else:
+                # Past the last page the window is empty, fall back to a count
+                total = await self._count(filters)
+        elif count_mode == "estimated":
+            total = await estimate_rows(self.repo.db, select(Post.id).where(*filters))
+
+        posts = rows if len(columns) == 1 else [row[0] for row in rows]
+        items = [PostListItemSchema.model_validate(post) for post in posts]
+        if ts_query is not None:
+            for item, row in zip(items, rows):
+                item.rank = row.rank
+                item.headline = row.headline
+
+        # Relevance order has no stable seek key, so it pages by offset only
+        has_next = True if backwards else has_more
+        has_prev = has_more if backwards else bool(position or skip)
+        next_cursor = prev_cursor = None
+        if items and has_next and not by_relevance:
+            next_cursor = encode_cursor(items[-1].created_at, items[-1].id, NEXT)
+        if items and has_prev and not by_relevance:
+            prev_cursor = encode_cursor(items[0].created_at, items[0].id, PREV)
+
+        response = PostListResponseSchema(
+            items=items,
+            total=total,
+            skip=skip,
+            limit=limit,
+            has_more=has_next,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+        )
+        expiries = [post.expires_at for post in posts if post.expires_at]
+        return response, min(expiries, default=None)
 
-        # Get total count
-        count_statement = select(func.count(Post.id)).where(
+    async def _count(self, filters: list) -> int:
+        count_result = await self.repo.db.exec(
+            select(func.count(Post.id)).where(*filters)
+        )
+        return count_result.one()
+
+    @staticmethod
+    def _search_query(search: str = None):
+        """Parse user input into a tsquery, None when there is nothing to match"""
+        if not search or not search.strip():
+            return None
+        return func.websearch_to_tsquery(SEARCH_CONFIG, search)
+
+    @staticmethod
+    def _list_filters(
+        ts_query=None, date_from: datetime = None, date_to: datetime = None
+    ) -> list:
+        """Build the WHERE clauses shared by the listing page and count queries"""
+        filters = [
             Post.is_deleted.is_(False),
             or_(
                 Post.expires_at.is_(None),
                 Post.expires_at > datetime.utcnow(),
             ),
-        )
-        if search:
-            search_pattern = f"%{search}%"
-            count_statement = count_statement.where(
-                or_(
-                    Post.title.ilike(search_pattern),
-                    Post.content.ilike(search_pattern),
-                )
-            )
+        ]
+
+        # Search by title or content through the GIN-indexed search vector
+        if ts_query is not None:
+            filters.append(SEARCH_VECTOR.op("@@")(ts_query))
+
+        # Date filtering
         if date_from:
-            count_statement = count_statement.where(Post.created_at >= date_from)
+            filters.append(Post.created_at >= date_from)
         if date_to:
-            count_statement = count_statement.where(Post.created_at <= date_to)
+            filters.append(Post.created_at <= date_to)
 
-        count_result = await self.repo.db.exec(count_statement)
-        total = count_result.one()
-
-        return {"items": posts, "total": total, "skip": skip, "limit": limit}
+        return filters
 
     async def update_post(
-        self, post_id: UUID, data: PostUpdateSchema, user: User
+        self, post_id: UUID, data: PostUpdateSchema, user: Principal
     ) -> Post:
         post = await self.get_post(post_id)
         if post.user_id != user.id:
@@ -147,16 +330,23 @@ class PostService:
         if "content" in update_data and update_data["content"]:
             update_data["content"] = sanitize_string(update_data["content"])
 
-        return await self.repo.update(post, update_data)
+        post = await self.repo.update(post, update_data)
+        after_commit(self.db, post_list_cache.invalidate)
+        return post
 
-    async def delete_post(self, post_id: UUID, user: User):
+    async def delete_post(self, post_id: UUID, user: Principal):
         post = await self.get_post(post_id)
         if post.user_id != user.id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You can only delete your own posts",
             )
+        # Comments and likes go in the same transaction as the post
+        await self.comment_repo.bulk_soft_delete(Comment.post_id == post_id)
+        await self.like_repo.bulk_soft_delete(PostLike.post_id == post_id)
         await self.repo.delete(post)
+        after_commit(self.db, partial(like_sets.drop, post_id))
+        after_commit(self.db, post_list_cache.invalidate)
 
     async def get_all_users_with_articles(
         self, skip: int = 0, limit: int = 10
@@ -201,6 +391,10 @@ class PostService:
                     Post.content,
                     "likes",
                     likes_subq.c.likes,
+                    "like_count",
+                    Post.like_count,
+                    "comment_count",
+                    Post.comment_count,
                 )
             ).filter(Post.id.isnot(None)),
             func.cast("[]", JSON),
@@ -1,19 +1,28 @@
 import logging
+import secrets
 from contextlib import asynccontextmanager
+from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException, status
 
 # routers
 from app.auth.routers.auth import router as auth_router
 from app.blogs.routers.router import router as blog_router
+from app.blogs.services.v1.posts import post_list_cache
 from app.users.routers.router import router as user_router
-from core.db.redis_client import close_redis_client, get_redis_client
-from core.db.session import init_db
-from core.middleware.rate_limit import RateLimitMiddleware
-from core.middleware.security_headers import SecurityHeadersMiddleware
+from core.cache.invalidation import invalidation_bus
+from core.db.redis_client import close_redis_client, get_redis_client, redis_health
+from core.db.session import init_db, replicas, warm_up_pool
+from core.db.unit_of_work import unit_of_work
+from core.middleware.pipeline import SecurityPipelineMiddleware
+from core.security.password import password_hasher
+from core.security.rate_limit import lease_stats
+from core.settings import Settings
 
 logger = logging.getLogger(__name__)
 
+settings = Settings()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -22,30 +31,85 @@ async def lifespan(app: FastAPI):
     await init_db()
     logger.info("Database initialized")
 
+    # Connect ahead of the first requests instead of during them
+    warmed = await warm_up_pool()
+    logger.info(f"Database pool warmed up with {warmed} connections")
+
+    # Reads only go to replicas once their lag has been measured
+    await replicas.start()
+
     # Initialize Redis connection
     redis_client = await get_redis_client()
     if redis_client:
         logger.info("Redis connection established")
     else:
         logger.warning(
-            "Redis not available - rate limiting and brute force protection disabled"
+            "Redis not available - rate limiting and brute force protection "
+            "disabled until the circuit breaker closes again"
         )
 
+    # Keep per-worker caches coherent with writes made by other workers
+    await invalidation_bus.start()
+
     yield
 
     # Shutdown
+    await replicas.dispose()
+    await invalidation_bus.stop()
+    password_hasher.shutdown()
     await close_redis_client()
     logger.info("Application shutting down")
 
 
 app = FastAPI(title="Social Network API", lifespan=lifespan)
 
-# Add security middleware
-app.add_middleware(SecurityHeadersMiddleware)
+# Add security headers and rate limiting as one layer
+# (Redis will be initialized asynchronously in middleware)
+app.add_middleware(SecurityPipelineMiddleware)
+
+# One commit per request, before the response is sent
+unit_of_work_dependencies = [Depends(unit_of_work, scope="function")]
+
+app.include_router(
+    auth_router, prefix="/api/auth", dependencies=unit_of_work_dependencies
+)
+app.include_router(
+    user_router, prefix="/api/user", dependencies=unit_of_work_dependencies
+)
+app.include_router(
+    blog_router, prefix="/api/blog", dependencies=unit_of_work_dependencies
+)
+
+
+@app.get("/health")
+async def health():
+    """Liveness, degraded while the Redis circuit breaker is open"""
+    redis_state = redis_health()
+    return {"status": "ok" if redis_state["state"] == "closed" else "degraded"}
+
+
+async def metrics_access(x_metrics_token: Optional[str] = Header(None)):
+    """Only callers holding the configured metrics token, 404 for others"""
+    token = settings.metrics.token
+    if not (
+        token and x_metrics_token and secrets.compare_digest(x_metrics_token, token)
+    ):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-# Add rate limiting middleware (Redis will be initialized asynchronously in middleware)
-app.add_middleware(RateLimitMiddleware)
 
-app.include_router(auth_router, prefix="/api/auth")
-app.include_router(user_router, prefix="/api/user")
-app.include_router(blog_router, prefix="/api/blog")
+@app.get(
+    "/internal/metrics",
+    dependencies=[Depends(metrics_access)],
+    include_in_schema=False,
+)
+async def metrics():
+    """
+    This worker's Redis circuit breaker and pool, listing cache, password
+    hashing and rate limit lease counters
+    """
+    return {
+        "redis": redis_health(),
+        "post_list_cache": post_list_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "rate_limit_leases": lease_stats(),
+    }
@@ -2,10 +2,11 @@ import re
 from typing import TYPE_CHECKING, List, Optional
 
 # sqlmodel
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship
 
 # models
-from core.models.base import BaseModel
+from core.models.base import LIVE_ROWS, BaseModel
 
 if TYPE_CHECKING:
     from app.auth.models.verification import EmailVerification
@@ -17,6 +18,11 @@ from pydantic import EmailStr, validator
 
 class User(BaseModel, table=True):
     __tablename__ = "users"
+    __table_args__ = (
+        # Username lookups of register/update_user; email is covered by its
+        # unique constraint
+        Index("ix_users_username_live", "username", postgresql_where=LIVE_ROWS),
+    )
 
     email: EmailStr = Field(..., unique=True)
     full_name: str = Field(..., min_length=1, max_length=100)
@@ -30,11 +30,4 @@ class UserRepository(BaseRepository[User]):
 
     async def get_users_by_user_ids(self, user_ids: List[str]) -> List[User]:
         """Get users by user IDs"""
-        import uuid
-
-        uuid_list = [uuid.UUID(uid) for uid in user_ids]
-        statement = select(User).where(
-            User.id.in_(uuid_list), User.is_deleted.is_(False)
-        )
-        result = await self.db.exec(statement)
-        return result.all()
+        return await self.get_many(user_ids)
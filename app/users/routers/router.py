@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.dependencies.jwt import JwtBearer
-from app.users.models.users import User
+from app.auth.dependencies.principal import Principal
 from app.users.schemas.users import UserResponse, UserUpdate
 from app.users.services.v1.users import UserService
 from core.db.session import get_session
@@ -17,16 +17,20 @@ def get_user_service(session: AsyncSession = Depends(get_session)) -> UserServic
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(current_user: User = Depends(jwt_bearer.get_current_user)):
+async def get_current_user(
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
+    service: UserService = Depends(get_user_service),
+):
     """Get current authenticated user"""
-    return current_user
+    return await service.get_user_by_email(current_user.email)
 
 
 @router.put("/me", response_model=UserResponse)
 async def update_current_user(
     user_data: UserUpdate,
-    current_user: User = Depends(jwt_bearer.get_current_user),
+    current_user: Principal = Depends(jwt_bearer.get_current_user),
     service: UserService = Depends(get_user_service),
 ):
     """Update current authenticated user"""
-    return await service.update_user(current_user, user_data)
+    user = await service.get_user_by_email(current_user.email)
+    return await service.update_user(user, user_data)
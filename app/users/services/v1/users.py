@@ -1,11 +1,14 @@
+from functools import partial
 from uuid import UUID
 
 from fastapi import HTTPException, status
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.auth.dependencies.principal import invalidate_principals
 from app.users.models.users import User
 from app.users.repositories.users import UserRepository
 from app.users.schemas.users import UserUpdate
+from core.db.unit_of_work import after_commit
 
 
 class UserService:
@@ -20,6 +23,14 @@ class UserService:
             )
         return user
 
+    async def get_user_by_email(self, email: str) -> User:
+        user = await self.repo.get_by_email(email)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+            )
+        return user
+
     async def update_user(self, user: User, user_data: UserUpdate) -> User:
         update_data = user_data.model_dump(exclude_unset=True)
 
@@ -41,4 +52,10 @@ class UserService:
                     detail="Email already exists",
                 )
 
-        return await self.repo.update(user, update_data)
+        old_email = user.email
+        user = await self.repo.update(user, update_data)
+        # Tokens carry the email as subject, drop principals under both
+        after_commit(
+            self.repo.db, partial(invalidate_principals, {old_email, user.email})
+        )
+        return user
@@ -0,0 +1,109 @@
+"""
+Per-request overhead of the security middleware stacks, without Redis
+
+Rate limiting is disabled so only the layering cost is measured, see
+benchmarks.rate_limit for the Redis side:
+    python -m benchmarks.middleware --requests 20000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from starlette.applications import Starlette  # noqa: E402
+from starlette.middleware import Middleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.responses import PlainTextResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from core.middleware.pipeline import SecurityPipelineMiddleware  # noqa: E402
+from core.middleware.rate_limit import RateLimitMiddleware  # noqa: E402
+
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    """SecurityHeadersMiddleware as it was before the single ASGI layer"""
+
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        path = request.url.path
+        is_docs = any(
+            path.startswith(p) for p in ["/docs", "/redoc", "/openapi.json", "/static"]
+        )
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        if is_docs:
+            return response
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["Strict-Transport-Security"] = (
+            "max-age=31536000; includeSubDomains"
+        )
+        response.headers["Content-Security-Policy"] = "default-src 'self'"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        response.headers["Permissions-Policy"] = (
+            "geolocation=(), microphone=(), camera=()"
+        )
+        return response
+
+
+async def ping(request):
+    return PlainTextResponse("pong")
+
+
+STACKS = {
+    "no middleware": [],
+    "headers + rate limit": [
+        Middleware(RateLimitMiddleware),
+        Middleware(LegacySecurityHeadersMiddleware),
+    ],
+    "pipeline": [Middleware(SecurityPipelineMiddleware)],
+}
+
+
+async def run(app, requests: int) -> float:
+    """Mean microseconds per request, calling the ASGI app directly"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/ping",
+        "raw_path": b"/api/ping",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(min(requests, 1000)):
+        await app(dict(scope), receive, send)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    baseline = None
+    for name, middleware in STACKS.items():
+        app = Starlette(routes=[Route("/api/ping", ping)], middleware=middleware)
+        micros = await run(app, args.requests)
+        baseline = micros if baseline is None else baseline
+        print(f"{name:<22} {micros:>8.1f} us/request  +{micros - baseline:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
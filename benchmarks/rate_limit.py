@@ -0,0 +1,95 @@
+"""
+Requests per second through RateLimitMiddleware with and without local leases
+
+Runs against the Redis configured in Settings:
+    python -m benchmarks.rate_limit --requests 20000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import redis.asyncio as redis
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from core.db.redis_client import create_redis_client
+from core.middleware.rate_limit import RateLimitMiddleware
+from core.security.rate_limit import KEY_PREFIX, RateLimitRule
+from core.settings import Settings
+
+settings = Settings()
+
+
+async def ping(request):
+    return PlainTextResponse("pong")
+
+
+def build_app(redis_client: redis.Redis, algorithm: str, local_leases: bool):
+    # Limit far above the request count so every request is under the limit,
+    # the common case the local tier is meant for
+    return Starlette(
+        routes=[Route("/ping", ping)],
+        middleware=[
+            Middleware(
+                RateLimitMiddleware,
+                redis_client=redis_client,
+                rules={"/ping": RateLimitRule(10_000_000, 60)},
+                algorithm=algorithm,
+                local_leases=local_leases,
+            )
+        ],
+    )
+
+
+async def run(app, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        queue = iter(range(requests))
+
+        async def worker():
+            for _ in queue:
+                response = await c.get("/ping")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+async def clear(redis_client: redis.Redis):
+    async for key in redis_client.scan_iter(match=f"{KEY_PREFIX}*"):
+        await redis_client.delete(key)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--algorithm", default=settings.rate_limit.algorithm)
+    args = parser.parse_args()
+
+    redis_client = await create_redis_client()
+    if redis_client is None:
+        raise SystemExit(f"Redis is not reachable at {settings.redis.dsn}")
+
+    try:
+        for local_leases in (False, True):
+            await clear(redis_client)
+            rps = await run(
+                build_app(redis_client, args.algorithm, local_leases),
+                args.requests,
+                args.concurrency,
+            )
+            label = "local leases" if local_leases else "redis only"
+            print(f"{args.algorithm:<12} {label:<13} {rps:>10.0f} req/s")
+    finally:
+        await clear(redis_client)
+        await redis_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
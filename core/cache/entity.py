@@ -0,0 +1,24 @@
+"""Per-model entity caches used by BaseRepository"""
+
+from typing import Dict, Optional
+
+from core.cache.two_tier import TwoTierCache
+from core.settings import Settings
+
+settings = Settings()
+
+_caches: Dict[str, TwoTierCache] = {}
+
+
+def get_entity_cache(table_name: str) -> Optional[TwoTierCache]:
+    """Cache for a table, None unless a TTL is configured for it"""
+    ttl = settings.entity_cache.ttls.get(table_name, 0)
+    if not settings.entity_cache.enabled or ttl <= 0:
+        return None
+    if table_name not in _caches:
+        _caches[table_name] = TwoTierCache(
+            namespace=f"entity:{table_name}",
+            ttl=ttl,
+            local_max_entries=settings.entity_cache.local_max_entries,
+        )
+    return _caches[table_name]
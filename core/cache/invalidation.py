@@ -0,0 +1,120 @@
+"""Cross-worker cache invalidation over Redis pub/sub"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+import redis.asyncio as redis
+
+from core.db.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache:invalidate"
+LISTEN_TIMEOUT = 10.0
+
+
+class InvalidationBus:
+    """
+    Fan out "namespace|key" invalidations to every worker
+    Local caches may only serve entries while the bus is listening, otherwise
+    they could miss an invalidation published by another worker
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable[[Optional[str]], None]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.listening = False
+
+    def register(self, namespace: str, handler: Callable[[Optional[str]], None]):
+        """Register a handler called with the key, or None to drop everything"""
+        self._handlers[namespace] = handler
+
+    def _dispatch(self, namespace: str, key: Optional[str]) -> None:
+        handler = self._handlers.get(namespace)
+        if handler:
+            handler(key)
+
+    def _drop_all(self) -> None:
+        for handler in self._handlers.values():
+            handler(None)
+
+    async def publish(
+        self, namespace: str, key: str, redis_client: Optional[redis.Redis] = None
+    ) -> None:
+        # Evict locally right away, the broadcast reaches the other workers
+        self._dispatch(namespace, key)
+        redis_client = redis_client or await get_redis_client()
+        if not redis_client:
+            return
+        try:
+            await redis_client.publish(CHANNEL, f"{namespace}|{key}")
+        except redis.RedisError:
+            logger.warning(f"Could not publish invalidation for {namespace}")
+
+    async def publish_many(
+        self,
+        namespace: str,
+        keys: List[str],
+        redis_client: Optional[redis.Redis] = None,
+    ) -> None:
+        """Publish several invalidations in one round trip"""
+        for key in keys:
+            self._dispatch(namespace, key)
+        redis_client = redis_client or await get_redis_client()
+        if not redis_client or not keys:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.publish(CHANNEL, f"{namespace}|{key}")
+                await pipe.execute()
+        except redis.RedisError:
+            logger.warning(f"Could not publish invalidations for {namespace}")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.listening = False
+        self._drop_all()
+
+    async def _listen(self) -> None:
+        delay = 1
+        while True:
+            redis_client = await get_redis_client()
+            if redis_client:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                try:
+                    await pubsub.subscribe(CHANNEL)
+                    self.listening = True
+                    delay = 1
+                    while True:
+                        # An explicit timeout instead of listen(), which would
+                        # hit the pool's short socket timeout between messages
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=LISTEN_TIMEOUT
+                        )
+                        if message:
+                            namespace, _, key = message["data"].partition("|")
+                            self._dispatch(namespace, key)
+                except redis.RedisError as e:
+                    logger.warning(f"Cache invalidation listener disconnected: {e}")
+                finally:
+                    # Invalidations may have been missed while disconnected
+                    self.listening = False
+                    self._drop_all()
+                    await pubsub.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,54 @@
+"""Bounded in-process LRU cache with per-entry expiry"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+
+class LocalLRUCache:
+    """Least-recently-used cache holding at most max_entries for ttl seconds"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(
+        self, key: Hashable, value: Any, ttl: Optional[float] = None
+    ) -> List[Tuple[Hashable, Any]]:
+        """
+        Store value for ttl seconds, the cache's ttl by default
+        Returns the unexpired entries evicted to make room, or the entry
+        itself when nothing can be stored
+        """
+        if self.max_entries <= 0:
+            return [(key, value)]
+        now = time.monotonic()
+        self._entries[key] = (now + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            evicted_key, (expires_at, evicted_value) = self._entries.popitem(last=False)
+            if expires_at >= now:
+                evicted.append((evicted_key, evicted_value))
+        return evicted
+
+    def pop(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
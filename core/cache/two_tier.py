@@ -0,0 +1,133 @@
+"""Two-tier cache: in-process LRU in front of Redis"""
+
+from typing import List, Optional
+
+import redis.asyncio as redis
+
+from core.cache.invalidation import invalidation_bus
+from core.cache.local import LocalLRUCache
+from core.db.redis_client import get_redis_client
+
+# Generation counters outlive any read in flight between lookup and fill
+GENERATION_TTL = 3600
+
+# KEYS: value key, generation key; ARGV: generation read before the query,
+# value, TTL. Fills computed across an invalidation are dropped
+SET_IF_GENERATION_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', tonumber(ARGV[3]))
+return 1
+"""
+
+
+class TwoTierCache:
+    """
+    String cache reading the local LRU first, then Redis
+    Invalidations delete the Redis entry, bump the key's generation and are
+    broadcast to every worker
+    """
+
+    def __init__(self, namespace: str, ttl: int, local_max_entries: int):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LocalLRUCache(max_entries=local_max_entries, ttl=ttl)
+        invalidation_bus.register(namespace, self._evict_local)
+
+    def _evict_local(self, key: Optional[str]) -> None:
+        if key is None:
+            self.local.clear()
+        else:
+            self.local.pop(key)
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _generation_key(self, key: str) -> str:
+        return f"{self.namespace}:generation:{key}"
+
+    async def get(self, key: str) -> Optional[str]:
+        if invalidation_bus.listening:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return None
+        try:
+            value = await redis_client.get(self._redis_key(key))
+        except redis.RedisError:
+            return None
+
+        if value is not None and invalidation_bus.listening:
+            self.local.set(key, value)
+        return value
+
+    async def generation(self, key: str) -> Optional[str]:
+        """
+        Generation of key, read before computing a value to fill it with
+        None when Redis is unavailable, the fill is then skipped
+        """
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return None
+        try:
+            return await redis_client.get(self._generation_key(key)) or "0"
+        except redis.RedisError:
+            return None
+
+    async def set(self, key: str, value: str, generation: str = None) -> None:
+        """
+        Store value, only if key's generation is still the one given, so a
+        fill racing with an invalidation cannot put the old value back
+        """
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return
+        try:
+            if generation is None:
+                await redis_client.set(self._redis_key(key), value, ex=self.ttl)
+            else:
+                script = redis_client.register_script(SET_IF_GENERATION_SCRIPT)
+                stored = await script(
+                    keys=[self._redis_key(key), self._generation_key(key)],
+                    args=[generation, value, self.ttl],
+                )
+                if not stored:
+                    return
+        except redis.RedisError:
+            return
+        if invalidation_bus.listening:
+            self.local.set(key, value)
+
+    async def _drop(self, redis_client: redis.Redis, keys: List[str]) -> None:
+        """Delete the values of keys and bump their generations"""
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(*(self._redis_key(key) for key in keys))
+                for key in keys:
+                    pipe.incr(self._generation_key(key))
+                    pipe.expire(self._generation_key(key), GENERATION_TTL)
+                await pipe.execute()
+        except redis.RedisError:
+            pass
+
+    async def invalidate(
+        self, key: str, redis_client: Optional[redis.Redis] = None
+    ) -> None:
+        redis_client = redis_client or await get_redis_client()
+        if redis_client:
+            await self._drop(redis_client, [key])
+        await invalidation_bus.publish(self.namespace, key, redis_client)
+
+    async def invalidate_many(
+        self, keys: List[str], redis_client: Optional[redis.Redis] = None
+    ) -> None:
+        if not keys:
+            return
+        redis_client = redis_client or await get_redis_client()
+        if redis_client:
+            await self._drop(redis_client, keys)
+        await invalidation_bus.publish_many(self.namespace, keys, redis_client)
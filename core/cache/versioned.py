@@ -0,0 +1,90 @@
+"""Versioned read-through cache backed by Redis"""
+
+import hashlib
+import logging
+from typing import Hashable, Optional, Tuple
+
+import redis.asyncio as redis
+
+from core.db.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    """
+    Cache whose entries live under a namespace version
+    Invalidation bumps the version, so every entry written before it becomes
+    unreachable at once and simply ages out through its TTL
+    """
+
+    def __init__(self, namespace: str, ttl: int):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.version_key = f"{namespace}:version"
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this worker"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _key(self, version: str, params: Tuple[Hashable, ...]) -> str:
+        digest = hashlib.blake2b(repr(params).encode(), digest_size=16).hexdigest()
+        return f"{self.namespace}:v{version}:{digest}"
+
+    async def lookup(
+        self, params: Tuple[Hashable, ...]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Return (cached value, key to store a fresh value under)
+        The version is read before the caller queries the database, so a value
+        computed across a concurrent invalidation lands under the old version
+        """
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return None, None
+
+        try:
+            version = await redis_client.get(self.version_key) or "0"
+            key = self._key(version, params)
+            cached = await redis_client.get(key)
+        except redis.RedisError:
+            return None, None
+
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached, key
+
+    async def store(self, key: Optional[str], value: str, ttl: int = None) -> None:
+        """Store a value under a key returned by lookup"""
+        if key is None:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+
+        redis_client = await get_redis_client()
+        if not redis_client:
+            return
+        try:
+            await redis_client.set(key, value, ex=ttl)
+        except redis.RedisError:
+            pass
+
+    async def invalidate(self, redis_client: Optional[redis.Redis] = None) -> None:
+        """Drop every entry of the namespace by bumping its version"""
+        redis_client = redis_client or await get_redis_client()
+        if not redis_client:
+            return
+        try:
+            await redis_client.incr(self.version_key)
+        except redis.RedisError:
+            logger.warning(f"Could not invalidate {self.namespace} cache")
@@ -13,7 +13,12 @@ celery_app = Celery(
     "social_network",
     broker=settings.redis.dsn,
     backend=settings.redis.dsn,
-    include=["core.tasks.cleanup"],
+    include=[
+        "core.tasks.cleanup",
+        "core.tasks.counters",
+        "core.tasks.likes",
+        "core.tasks.partitions",
+    ],
 )
 
 celery_app.conf.update(
@@ -39,4 +44,20 @@ celery_app.conf.beat_schedule = {
         "task": "core.tasks.cleanup.cleanup_expired_posts",
         "schedule": crontab(hour=23, minute=59),  # Run every day at 23:59 UTC
     },
+    "reconcile-post-counters": {
+        "task": "core.tasks.counters.reconcile_post_counters",
+        "schedule": crontab(hour=3, minute=30),  # Run every day at 03:30 UTC
+    },
+    # No-op until post is partitioned; after cleanup-expired-posts soft
+    # deleted the rows of old partitions
+    "maintain-post-partitions": {
+        "task": "core.tasks.partitions.maintain_post_partitions",
+        "schedule": crontab(hour=4, minute=0),  # Run every day at 04:00 UTC
+    },
 }
+
+if settings.likes.write_behind:
+    celery_app.conf.beat_schedule["flush-pending-likes"] = {
+        "task": "core.tasks.likes.flush_pending_likes",
+        "schedule": float(settings.likes.flush_interval),
+    }
@@ -0,0 +1,45 @@
+"""EXPLAIN support for inspecting planner estimates and query plans"""
+
+import json
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+class Explain(Executable, ClauseElement):
+    """Wrap a statement in EXPLAIN (FORMAT JSON) keeping its bound parameters"""
+
+    inherit_cache = False
+
+    def __init__(self, statement, analyze: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    options = "ANALYZE, FORMAT JSON" if element.analyze else "FORMAT JSON"
+    return f"EXPLAIN ({options}) " + compiler.process(element.statement, **kw)
+
+
+async def explain(db, statement, analyze: bool = False) -> dict:
+    """Return the top-level plan node of a statement"""
+    result = await db.exec(Explain(statement, analyze=analyze))
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+async def estimate_rows(db, statement) -> int:
+    """Planner row estimate for a statement, served from table statistics"""
+    plan = await explain(db, statement)
+    return int(plan["Plan Rows"])
+
+
+def seq_scans(plan: dict) -> list[str]:
+    """Relations read by a sequential scan anywhere in a plan"""
+    scans = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        scans += seq_scans(child)
+    return scans
@@ -0,0 +1,40 @@
+"""Alembic migrations, run at startup in place of metadata.create_all()"""
+
+import asyncio
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+# Revision matching the schema create_all() built before migrations existed
+BASELINE_REVISION = "0001"
+
+
+def alembic_config() -> Config:
+    config = Config(str(ALEMBIC_INI))
+    # Keep the application's logging setup
+    config.attributes["configure_logger"] = False
+    return config
+
+
+async def upgrade(engine: AsyncEngine, revision: str = "head") -> None:
+    """
+    Migrate the database to revision
+    A schema created by create_all() without migration history is stamped
+    with the baseline first, so only the later migrations run on it
+    """
+    async with engine.connect() as conn:
+        tables = await conn.run_sync(lambda c: inspect(c).get_table_names())
+    config = alembic_config()
+    # Alembic's env.py runs its own event loop, keep it off this one
+    if tables and "alembic_version" not in tables:
+        await asyncio.to_thread(command.stamp, config, BASELINE_REVISION)
+    await asyncio.to_thread(command.upgrade, config, revision)
+
+
+async def downgrade(revision: str) -> None:
+    await asyncio.to_thread(command.downgrade, alembic_config(), revision)
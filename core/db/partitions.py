@@ -0,0 +1,383 @@
+"""
+Monthly range partitions of post and comment by created_at
+Retention then detaches a whole partition instead of deleting its rows one by
+one. Functions take a synchronous Connection, from AsyncConnection.run_sync().
+Partitioning is switched explicitly, not by a migration:
+
+    python -m core.db.partitions partition|unpartition
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+from alembic.migration import MigrationContext
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Computed,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Uuid,
+    inspect,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import AddConstraint
+
+from core.settings import Settings
+
+settings = Settings()
+
+# Partitioned parents, in the order they are converted; comment rows point
+# at posts
+PARTITIONED_TABLES = ("post", "comment")
+# Schema detached partitions move to when archived instead of dropped
+ARCHIVE_SCHEMA = "archive"
+
+# Tables as of this migration revision, frozen so partitioning never follows
+# later model changes. Migrations changing post, comment or the keys to them
+# move it along with these definitions
+SCHEMA_REVISION = "0003"
+LIVE = text("is_deleted IS false")
+SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{settings.search.language}'::regconfig, "
+    f"coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{settings.search.language}'::regconfig, "
+    f"coalesce(content, '')), 'B')"
+)
+
+metadata = MetaData()
+Table("users", metadata, Column("id", Uuid, primary_key=True))
+Table(
+    "post",
+    metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("is_deleted", Boolean, nullable=False),
+    Column("user_id", Uuid, ForeignKey("users.id"), nullable=False),
+    Column("title", String(1000), nullable=False),
+    Column("content", String(10000), nullable=False),
+    Column("expires_at", DateTime),
+    Column("like_count", Integer, server_default=text("0"), nullable=False),
+    Column("comment_count", Integer, server_default=text("0"), nullable=False),
+    Column("search_vector", TSVECTOR, Computed(SEARCH_VECTOR, persisted=True)),
+    Index("ix_post_created_at_id_live", "created_at", "id", postgresql_where=LIVE),
+    Index("ix_post_user_id_live", "user_id", postgresql_where=LIVE),
+    Index("ix_post_search_vector", "search_vector", postgresql_using="gin"),
+)
+Table(
+    "comment",
+    metadata,
+    Column("id", Uuid, primary_key=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Column("is_deleted", Boolean, nullable=False),
+    Column("post_id", Uuid, ForeignKey("post.id"), nullable=False),
+    Column("user_id", Uuid, ForeignKey("users.id"), nullable=False),
+    Column("text", String(5000), nullable=False),
+    Index(
+        "ix_comment_post_id_created_at_id_live",
+        "post_id",
+        "created_at",
+        "id",
+        postgresql_where=LIVE,
+    ),
+    Index("ix_comment_post_id", "post_id"),
+)
+# Only the key dropped with the plain post table and restored after it
+Table(
+    "postlike",
+    metadata,
+    Column("user_id", Uuid, primary_key=True),
+    Column("post_id", Uuid, ForeignKey("post.id"), primary_key=True),
+)
+
+PARTITION_NAME = re.compile(r"^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$")
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    years, index = divmod(month.month - 1 + months, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_y{month:%Y}m{month:%m}"
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    statement = text(
+        "SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:table)"
+    )
+    return conn.execute(statement, {"table": table}).scalar() == "p"
+
+
+def partitions(conn: Connection, table: str) -> Dict[datetime, str]:
+    """Monthly partitions attached to a table, by the month they start"""
+    statement = text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    )
+    months = {}
+    for name in conn.execute(statement, {"table": table}).scalars():
+        match = PARTITION_NAME.match(name)
+        if match and match["table"] == table:
+            months[datetime(int(match["year"]), int(match["month"]), 1)] = name
+    return months
+
+
+def create_partitions(
+    conn: Connection, table: str, first: datetime, last: datetime
+) -> List[str]:
+    """Create the missing monthly partitions from first to last month inclusive"""
+    existing = partitions(conn, table)
+    created = []
+    month = month_start(first)
+    while month <= last:
+        if month not in existing:
+            name = partition_name(table, month)
+            conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                    f"TO ('{add_months(month, 1):%Y-%m-%d}')"
+                )
+            )
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def detach_partition(
+    conn: Connection, table: str, name: str, archive: bool = False
+) -> None:
+    """
+    Detach a partition, then drop it or move it to the archive schema
+    CONCURRENTLY lets reads and writes on the parent go on, it needs a
+    connection in autocommit mode
+    """
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name} CONCURRENTLY"))
+    if archive:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+        conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+    else:
+        conn.execute(text(f"DROP TABLE {name}"))
+
+
+# One statement, so atomic even in autocommit: the partition's live posts
+# are soft deleted with zeroed counters, its likes and the comments kept in
+# later partitions deleted. Returns the ids of all the partition's posts
+RETIRE_POSTS = """
+WITH retired AS (
+    UPDATE post SET is_deleted = true, like_count = 0, comment_count = 0,
+        updated_at = now() AT TIME ZONE 'utc'
+    WHERE id IN (SELECT id FROM {name}) AND is_deleted IS false
+), likes AS (
+    DELETE FROM postlike WHERE post_id IN (SELECT id FROM {name})
+), comments AS (
+    DELETE FROM comment
+    WHERE post_id IN (SELECT id FROM {name}) AND created_at >= :kept_from
+)
+SELECT id FROM {name}
+"""
+
+
+def _kept_from(retention_days: int, now: Optional[datetime]) -> datetime:
+    """First month kept; every partition before it ends by the cutoff"""
+    return month_start((now or datetime.utcnow()) - timedelta(days=retention_days))
+
+
+def _retire(conn: Connection, name: str, kept_from: datetime) -> List[UUID]:
+    statement = text(RETIRE_POSTS.format(name=name))
+    return list(conn.execute(statement, {"kept_from": kept_from}).scalars())
+
+
+def retire_partitions(
+    conn: Connection, retention_days: int, now: Optional[datetime] = None
+) -> List[UUID]:
+    """
+    Retire the posts of partitions due for detaching, returning their ids
+    Callers drop them from caches before maintain_partitions detaches them
+    """
+    if not is_partitioned(conn, "post"):
+        return []
+    kept_from = _kept_from(retention_days, now)
+    retired = []
+    for month, name in sorted(partitions(conn, "post").items()):
+        if month >= kept_from:
+            break
+        retired += _retire(conn, name, kept_from)
+    return retired
+
+
+def maintain_partitions(
+    conn: Connection,
+    months_ahead: int,
+    retention_days: int,
+    archive: bool = False,
+    now: Optional[datetime] = None,
+) -> Dict[str, list]:
+    """
+    Create partitions months_ahead and detach those whose rows are all older
+    than retention_days. A post partition is retired, and that committed,
+    before it is detached: a failed detach leaves deleted posts, not live
+    ones missing their likes and comments. Returns the partitions created
+    and detached, and the ids of the posts retired. No-op unless post is
+    partitioned
+    """
+    if not is_partitioned(conn, "post"):
+        return {"created": [], "detached": [], "retired": []}
+    now = now or datetime.utcnow()
+    kept_from = _kept_from(retention_days, now)
+
+    created = []
+    for table in PARTITIONED_TABLES:
+        created += create_partitions(
+            conn, table, month_start(now), add_months(month_start(now), months_ahead)
+        )
+
+    detached, retired = [], []
+    for month, name in sorted(partitions(conn, "post").items()):
+        if month >= kept_from:
+            break
+        retired += _retire(conn, name, kept_from)
+        detach_partition(conn, "post", name, archive)
+        detached.append(name)
+    for month, name in sorted(partitions(conn, "comment").items()):
+        if month >= kept_from:
+            break
+        detach_partition(conn, "comment", name, archive)
+        detached.append(name)
+    return {"created": created, "detached": detached, "retired": retired}
+
+
+def add_foreign_keys(conn: Connection, tables: Iterable[Table]) -> None:
+    """
+    Create the tables' missing foreign keys, except those to partitioned
+    tables: their unique keys include created_at, so nothing can reference id
+    """
+    for table in tables:
+        existing = {
+            tuple(fk["constrained_columns"])
+            for fk in inspect(conn).get_foreign_keys(table.name)
+        }
+        for constraint in table.foreign_key_constraints:
+            if tuple(constraint.column_keys) in existing:
+                continue
+            if is_partitioned(conn, constraint.referred_table.name):
+                continue
+            conn.execute(AddConstraint(constraint))
+
+
+def _rebuild(conn: Connection, table: Table, partition_by: Optional[str]) -> None:
+    """Recreate a table with or without partitioning, keeping its rows"""
+    name = table.name
+    previous = f"{name}_previous"
+    columns = ", ".join(c.name for c in table.columns if c.computed is None)
+    conn.execute(text(f"ALTER TABLE {name} RENAME TO {previous}"))
+    conn.execute(
+        text(
+            f"CREATE TABLE {name} (LIKE {previous} INCLUDING DEFAULTS "
+            f"INCLUDING GENERATED)"
+            + (f" PARTITION BY {partition_by}" if partition_by else "")
+        )
+    )
+    if partition_by:
+        first = conn.execute(text(f"SELECT min(created_at) FROM {previous}")).scalar()
+        now = datetime.utcnow()
+        create_partitions(conn, name, first or now, month_start(now))
+    conn.execute(
+        text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {previous}")
+    )
+    # Also drops the foreign keys pointing at the old table
+    conn.execute(text(f"DROP TABLE {previous} CASCADE"))
+
+    # A partitioned table's unique keys must include the partition key
+    key = "id, created_at" if partition_by else "id"
+    conn.execute(
+        text(f"ALTER TABLE {name} ADD CONSTRAINT {name}_pkey PRIMARY KEY ({key})")
+    )
+    for index in table.indexes:
+        index.create(conn)
+    add_foreign_keys(conn, [table])
+
+
+def partition_table(conn: Connection, table: Table, months_ahead: int) -> None:
+    """Rebuild a table range-partitioned by created_at month, copying its rows"""
+    _rebuild(conn, table, partition_by="RANGE (created_at)")
+    now = month_start(datetime.utcnow())
+    create_partitions(conn, table.name, now, add_months(now, months_ahead))
+
+
+def unpartition_table(conn: Connection, table: Table) -> None:
+    """Rebuild a partitioned table as a plain one, copying its rows"""
+    _rebuild(conn, table, partition_by=None)
+
+
+def _check_revision(conn: Connection) -> None:
+    revision = MigrationContext.configure(conn).get_current_revision()
+    if revision != SCHEMA_REVISION:
+        raise RuntimeError(
+            f"Partitioning is defined for revision {SCHEMA_REVISION}, "
+            f"the database is at {revision}"
+        )
+
+
+def partition(conn: Connection, months_ahead: int) -> None:
+    """
+    Rebuild post and comment range-partitioned by created_at month, copying
+    their rows. Foreign keys to post are dropped, its unique keys include
+    created_at. Run in one transaction, it locks both tables until done
+    """
+    _check_revision(conn)
+    for name in PARTITIONED_TABLES:
+        if not is_partitioned(conn, name):
+            partition_table(conn, metadata.tables[name], months_ahead)
+
+
+def unpartition(conn: Connection) -> None:
+    """Rebuild post and comment as plain tables and restore the keys to post"""
+    _check_revision(conn)
+    for name in reversed(PARTITIONED_TABLES):
+        if is_partitioned(conn, name):
+            unpartition_table(conn, metadata.tables[name])
+    add_foreign_keys(conn, metadata.sorted_tables)
+
+
+if __name__ == "__main__":
+    # python -m core.db.partitions partition|unpartition
+    import argparse
+    import asyncio
+
+    from core.db.session import build_engine
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("action", choices=("partition", "unpartition"))
+    args = parser.parse_args()
+
+    async def main():
+        engine = build_engine(pool_size=1, max_overflow=0)
+        try:
+            async with engine.begin() as conn:
+                if args.action == "partition":
+                    await conn.run_sync(
+                        partition, settings.database.partition_months_ahead
+                    )
+                else:
+                    await conn.run_sync(unpartition)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
@@ -1,30 +1,241 @@
 """Redis client for caching and rate limiting"""
 
+import asyncio
+import logging
+import time
+from typing import Optional
+
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
 
 from core.settings import Settings
 
+logger = logging.getLogger(__name__)
+
 settings = Settings()
-_redis_client: redis.Redis = None
+_redis_client: Optional["ManagedRedis"] = None
+
+
+class RedisUnavailableError(redis.ConnectionError):
+    """Raised without a round trip while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive connection failures. While open, every
+    command fails at once and a background probe pings Redis with exponential
+    backoff (half-open); the first successful probe closes it again
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, backoff: float, backoff_max: float):
+        self.threshold = threshold
+        self.initial_backoff = backoff
+        self.backoff_max = backoff_max
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = backoff
+        self.opened_at: Optional[float] = None
+
+    @property
+    def closed(self) -> bool:
+        return self.state == self.CLOSED
+
+    def record_success(self) -> None:
+        self.failures = 0
 
+    def record_failure(self) -> bool:
+        """Count a failure, True when it opens the circuit"""
+        self.failures += 1
+        if self.closed and self.failures >= self.threshold:
+            self.open()
+            return True
+        return False
+
+    def open(self) -> None:
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+    def close(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self.backoff = self.initial_backoff
+        self.opened_at = None
+
+    def next_backoff(self) -> float:
+        """Delay before the next probe, doubling up to backoff_max"""
+        delay = self.backoff
+        self.backoff = min(self.backoff * 2, self.backoff_max)
+        return delay
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "open_for": (
+                round(time.monotonic() - self.opened_at, 1)
+                if self.opened_at is not None
+                else None
+            ),
+        }
+
+
+class ManagedPipeline(Pipeline):
+    """Pipeline reporting to the circuit breaker of the client that made it"""
+
+    client: "ManagedRedis"
+
+    async def execute(self, raise_on_error: bool = True):
+        if not self.client.breaker.closed:
+            await self.reset()
+            raise RedisUnavailableError("Redis circuit breaker is open")
+        try:
+            result = await super().execute(raise_on_error)
+        except (redis.ConnectionError, redis.TimeoutError):
+            self.client.record_failure()
+            raise
+        self.client.breaker.record_success()
+        return result
 
-async def get_redis_client() -> redis.Redis:
-    """Get or create Redis client"""
+
+class ManagedRedis(redis.Redis):
+    """
+    Redis client behind a circuit breaker
+    Connection errors and timeouts count as failures; once the breaker opens,
+    commands raise RedisUnavailableError instantly so callers fail open
+    instead of waiting for a connect timeout on every request
+    """
+
+    def __init__(self, *args, breaker: CircuitBreaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+        self._probe: Optional[asyncio.Task] = None
+
+    async def execute_command(self, *args, **options):
+        if not self.breaker.closed:
+            raise RedisUnavailableError("Redis circuit breaker is open")
+        try:
+            result = await super().execute_command(*args, **options)
+        except (redis.ConnectionError, redis.TimeoutError):
+            self.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint: Optional[str] = None
+    ) -> ManagedPipeline:
+        pipe = ManagedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+        pipe.client = self
+        return pipe
+
+    def record_failure(self) -> None:
+        if self.breaker.record_failure():
+            self.trip()
+
+    def trip(self) -> None:
+        """Open the circuit and probe Redis in the background until it is back"""
+        self.breaker.open()
+        if self._probe is None or self._probe.done():
+            logger.warning("Redis unreachable, circuit breaker opened")
+            self._probe = asyncio.create_task(self._probe_until_closed())
+
+    async def _probe_until_closed(self) -> None:
+        while True:
+            self.breaker.state = CircuitBreaker.OPEN
+            await asyncio.sleep(self.breaker.next_backoff())
+            self.breaker.state = CircuitBreaker.HALF_OPEN
+            try:
+                # Bypasses the breaker check, this is the only call let through
+                await super().execute_command("PING")
+            except redis.RedisError:
+                continue
+            self.breaker.close()
+            logger.info("Redis reachable again, circuit breaker closed")
+            return
+
+    def health(self) -> dict:
+        pool = self.connection_pool
+        return {
+            **self.breaker.snapshot(),
+            "max_connections": pool.max_connections,
+            # Free slots sit in the blocking pool's queue
+            "connections_in_use": pool.max_connections - pool.pool.qsize(),
+        }
+
+    async def close(self, close_connection_pool: Optional[bool] = True) -> None:
+        if self._probe is not None:
+            self._probe.cancel()
+            self._probe = None
+        await super().close(close_connection_pool)
+
+
+def _build_client() -> ManagedRedis:
+    config = settings.redis
+    pool = redis.BlockingConnectionPool.from_url(
+        config.dsn,
+        max_connections=config.max_connections,
+        # Waiting longer than this for a pooled connection counts as a failure
+        timeout=config.pool_timeout,
+        socket_timeout=config.socket_timeout,
+        socket_connect_timeout=config.socket_connect_timeout,
+        health_check_interval=config.health_check_interval,
+        encoding="utf-8",
+        decode_responses=True,
+    )
+    breaker = CircuitBreaker(
+        threshold=config.breaker_threshold,
+        backoff=config.breaker_backoff,
+        backoff_max=config.breaker_backoff_max,
+    )
+    return ManagedRedis(connection_pool=pool, breaker=breaker)
+
+
+async def create_redis_client() -> Optional[ManagedRedis]:
+    """
+    Create a new connected Redis client, None if Redis is unreachable
+    Use this from code running in its own event loop (e.g. Celery tasks)
+    """
+    client = _build_client()
+    try:
+        # Test connection
+        await client.ping()
+    except redis.RedisError:
+        await client.close()
+        return None
+    return client
+
+
+async def get_redis_client() -> Optional[redis.Redis]:
+    """
+    Get the shared Redis client, None while its circuit breaker is open
+    The application works without Redis, but without rate limiting
+    """
     global _redis_client
     if _redis_client is None:
+        _redis_client = _build_client()
         try:
-            _redis_client = redis.from_url(
-                settings.redis.dsn, encoding="utf-8", decode_responses=True
-            )
-            # Test connection
             await _redis_client.ping()
-        except Exception:
-            # If Redis is not available, return None
-            # The application will work without Redis, but without rate limiting
-            _redis_client = None
+        except redis.RedisError:
+            # Unreachable at startup, don't wait for `threshold` failures
+            _redis_client.trip()
+    if isinstance(_redis_client, ManagedRedis) and not _redis_client.breaker.closed:
+        return None
     return _redis_client
 
 
+def redis_health() -> dict:
+    """Circuit breaker and pool state of the shared client"""
+    if not isinstance(_redis_client, ManagedRedis):
+        return {"state": "not_connected"}
+    return _redis_client.health()
+
+
 async def close_redis_client():
     """Close Redis connection"""
     global _redis_client
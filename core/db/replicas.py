@@ -0,0 +1,118 @@
+"""Read replicas: lag monitoring and per-user primary pinning"""
+
+import asyncio
+import itertools
+import logging
+from typing import List, Optional
+
+import redis.asyncio as redis
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.db.redis_client import get_redis_client
+from core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+settings = Settings()
+
+PIN_PREFIX = "db:pin:"
+
+# Seconds since the last replayed transaction, 0 when everything received has
+# been replayed (an idle primary writes nothing to replay) or on a primary
+LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
+)
+
+
+class ReplicaSet:
+    """
+    Replica engines with their replication lag, measured in the background
+    A replica only serves reads while its last measured lag is within
+    max_lag; until the first measurement, or when it fails, reads go to the
+    primary
+    """
+
+    def __init__(self, engines: List[AsyncEngine], max_lag: float, interval: float):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag: List[Optional[float]] = [None] * len(engines)
+        self._next = itertools.cycle(range(len(engines)))
+        self._task: Optional[asyncio.Task] = None
+
+    def choose(self) -> Optional[AsyncEngine]:
+        """Next replica in rotation that is within max_lag, None for the primary"""
+        for _ in self.engines:
+            index = next(self._next)
+            lag = self.lag[index]
+            if lag is not None and lag <= self.max_lag:
+                return self.engines[index]
+        return None
+
+    async def measure(self) -> None:
+        for index, engine in enumerate(self.engines):
+            try:
+                async with engine.connect() as conn:
+                    lag = float((await conn.execute(LAG_QUERY)).scalar())
+            except Exception as e:
+                if self.lag[index] is not None:
+                    logger.warning(f"Replica {engine.url.host} unavailable: {e}")
+                lag = None
+            if lag is not None and lag > self.max_lag:
+                logger.warning(f"Replica {engine.url.host} lags {lag:.1f}s")
+            self.lag[index] = lag
+
+    async def _monitor(self) -> None:
+        while True:
+            await self.measure()
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self.engines and self._task is None:
+            self._task = asyncio.create_task(self._monitor())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.lag = [None] * len(self.engines)
+
+    async def dispose(self) -> None:
+        await self.stop()
+        for engine in self.engines:
+            await engine.dispose()
+
+
+async def pin_to_primary(subject: str) -> None:
+    """Keep the subject's reads on the primary until replicas caught up"""
+    redis_client = await get_redis_client()
+    if not redis_client:
+        return
+    try:
+        await redis_client.set(
+            f"{PIN_PREFIX}{subject}", 1, ex=settings.database.replica_pin_seconds
+        )
+    except redis.RedisError:
+        logger.warning("Could not pin reads to the primary after a write")
+
+
+async def is_pinned_to_primary(subject: str) -> bool:
+    """True if the subject wrote recently, or when Redis cannot tell"""
+    redis_client = await get_redis_client()
+    if not redis_client:
+        return True
+    try:
+        return bool(await redis_client.exists(f"{PIN_PREFIX}{subject}"))
+    except redis.RedisError:
+        return True
@@ -1,28 +1,190 @@
-from sqlalchemy.ext.asyncio import create_async_engine
+import asyncio
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlmodel import SQLModel
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.selectable import CTE
+from sqlmodel import Session
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from core.db.migrations import upgrade
+from core.db.replicas import ReplicaSet, is_pinned_to_primary, pin_to_primary
+from core.security.tokens import bearer_subject
 from core.settings import Settings
 
 settings = Settings()
 DATABASE_URL = settings.postgres.adsn
 
-engine = create_async_engine(DATABASE_URL, echo=True)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Startup parameters PgBouncer passes through instead of refusing the client,
+# others (e.g. jit) belong in ALTER ROLE ... SET when running behind it
+PGBOUNCER_SERVER_SETTINGS = {"application_name"}
+
+
+def _connect_args() -> dict:
+    config = settings.database
+    if config.pgbouncer:
+        # Transaction pooling hands each transaction a different server
+        # connection, statements prepared on one are missing on the next
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            "server_settings": {
+                name: value
+                for name, value in config.server_settings.items()
+                if name in PGBOUNCER_SERVER_SETTINGS
+            },
+        }
+    return {
+        "statement_cache_size": config.statement_cache_size,
+        "prepared_statement_cache_size": config.statement_cache_size,
+        "server_settings": config.server_settings,
+    }
+
+
+def build_engine(
+    pool_size: Optional[int] = None,
+    max_overflow: Optional[int] = None,
+    url: str = DATABASE_URL,
+) -> AsyncEngine:
+    """Engine configured from DatabaseSettings, pool sizes may be overridden"""
+    config = settings.database
+    return create_async_engine(
+        url,
+        echo=config.echo,
+        pool_size=config.pool_size if pool_size is None else pool_size,
+        max_overflow=config.max_overflow if max_overflow is None else max_overflow,
+        pool_timeout=config.pool_timeout,
+        pool_recycle=config.pool_recycle,
+        pool_pre_ping=config.pool_pre_ping,
+        connect_args=_connect_args(),
+    )
+
+
+def build_task_engine() -> AsyncEngine:
+    """Smaller engine for Celery tasks, each runs in its own event loop"""
+    return build_engine(
+        pool_size=settings.database.task_pool_size,
+        max_overflow=settings.database.task_max_overflow,
+    )
+
+
+def _is_read(clause) -> bool:
+    """Plain SELECT, without FOR UPDATE or data-modifying CTEs"""
+    if clause is None or not getattr(clause, "is_select", False):
+        return False
+    if getattr(clause, "_for_update_arg", None) is not None:
+        return False
+    return not any(
+        isinstance(element, CTE) and element.element.is_dml
+        for element in visitors.iterate(clause)
+    )
+
+
+class RoutingSession(Session):
+    """
+    Sends reads to the replica chosen for the session, if any, and anything
+    else to the primary. After the first write the whole session stays on the
+    primary, so it reads what it wrote
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None:
+            if not self._flushing and _is_read(clause):
+                return replica.sync_engine
+            self.info["replica"] = None
+        if self._flushing or not _is_read(clause):
+            self.info["wrote"] = True
+        return super().get_bind(mapper, clause=clause, **kw)
+
 
+class RoutingAsyncSession(AsyncSession):
+    sync_session_class = RoutingSession
 
-async def get_session():
+    async def commit(self) -> None:
+        await super().commit()
+        info = self.sync_session.info
+        if info.pop("wrote", False) and info.get("subject") and replicas.engines:
+            await pin_to_primary(info["subject"])
+
+
+def reads_from_replica(db: AsyncSession) -> bool:
+    """
+    True while the session reads from a replica
+    Rows read there may predate a committed write and its cache
+    invalidations, so they must not fill shared caches
+    """
+    return db.sync_session.info.get("replica") is not None
+
+
+def pin_subject(db: AsyncSession, subject: str) -> None:
+    """Pin subject to the primary once the session's writes commit"""
+    db.sync_session.info["subject"] = subject
+
+
+engine = build_engine()
+replicas = ReplicaSet(
+    [
+        build_engine(url=settings.postgres.adsn_at(address))
+        for address in settings.database.replicas
+    ],
+    max_lag=settings.database.replica_max_lag,
+    interval=settings.database.replica_lag_check_interval,
+)
+AsyncSessionLocal = sessionmaker(
+    engine, class_=RoutingAsyncSession, expire_on_commit=False
+)
+
+
+async def get_session(request: Request):
+    """
+    Request session; GET and HEAD requests read from a replica unless the
+    caller wrote within replica_pin_seconds
+    """
     async with AsyncSessionLocal() as session:
+        subject = bearer_subject(request.headers.get("authorization"))
+        session.sync_session.info["subject"] = subject
+        if request.method in ("GET", "HEAD") and replicas.engines:
+            if not subject or not await is_pinned_to_primary(subject):
+                session.sync_session.info["replica"] = replicas.choose()
         yield session
 
 
+async def warm_up_pool(connections: Optional[int] = None) -> int:
+    """
+    Open pool connections ahead of the first requests
+    Connections are held together so each one is a new one, and run a query
+    so asyncpg's type introspection is done as well. Replicas are warmed the
+    same way. Returns how many opened
+    """
+    config = settings.database
+    count = min(
+        config.warm_connections if connections is None else connections,
+        config.pool_size,
+    )
+
+    async def connect(target: AsyncEngine):
+        conn = await target.connect()
+        await conn.execute(text("SELECT 1"))
+        return conn
+
+    conns = await asyncio.gather(
+        *(
+            connect(target)
+            for target in (engine, *replicas.engines)
+            for _ in range(count)
+        )
+    )
+    for conn in conns:
+        await conn.close()
+    return len(conns)
+
+
 async def init_db():
-    # Import all models to register them with SQLModel metadata
-    # This must happen before create_all() is called
-    from app.auth.models.verification import EmailVerification  # noqa: F401
-    from app.blogs.models.posts import Comment, Post, PostLike  # noqa: F401
-    from app.users.models.users import User  # noqa: F401
-
-    async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
+    """Apply pending migrations"""
+    await upgrade(engine)
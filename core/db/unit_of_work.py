@@ -0,0 +1,63 @@
+"""
+Unit of work: repositories flush, each request commits once
+Side effects that must only be seen after the data is committed, such as
+cache invalidations, are queued on the session with after_commit()
+"""
+
+from typing import Awaitable, Callable, Optional
+
+import redis.asyncio as redis
+from fastapi import Depends
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.db.session import get_session
+
+AfterCommit = Callable[[Optional[redis.Redis]], Awaitable[None]]
+
+AFTER_COMMIT = "after_commit"
+
+
+def after_commit(db: AsyncSession, callback: AfterCommit) -> None:
+    """Run callback(redis_client) once the session's transaction is committed"""
+    db.sync_session.info.setdefault(AFTER_COMMIT, []).append(callback)
+
+
+def has_after_commit(db: AsyncSession) -> bool:
+    """True while callbacks wait for a commit, i.e. cached rows were changed"""
+    return bool(db.sync_session.info.get(AFTER_COMMIT))
+
+
+def discard_after_commit(db: AsyncSession) -> None:
+    db.sync_session.info.pop(AFTER_COMMIT, None)
+
+
+async def run_after_commit(
+    db: AsyncSession, redis_client: Optional[redis.Redis] = None
+) -> None:
+    """
+    Run queued callbacks, call after commit. Code outside the API event loop
+    (e.g. Celery tasks) passes its own Redis client
+    """
+    for callback in db.sync_session.info.pop(AFTER_COMMIT, []):
+        await callback(redis_client)
+
+
+async def commit(db: AsyncSession, redis_client: Optional[redis.Redis] = None):
+    """Commit the session, then run its after_commit callbacks"""
+    await db.commit()
+    await run_after_commit(db, redis_client)
+
+
+async def unit_of_work(db: AsyncSession = Depends(get_session)):
+    """
+    Commit the request session once the endpoint returned, or roll it back
+    Declared with scope="function" so the commit lands before the response
+    is sent
+    """
+    try:
+        yield db
+    except Exception:
+        await db.rollback()
+        discard_after_commit(db)
+        raise
+    await commit(db)
@@ -0,0 +1,65 @@
+"""Conditional GET helpers: ETag, Last-Modified and Cache-Control"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+from core.settings import Settings
+
+settings = Settings()
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag derived from the values that determine a representation"""
+    digest = hashlib.blake2b(
+        "|".join(str(part) for part in parts).encode(), digest_size=16
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def cache_headers(
+    etag: str, last_modified: Optional[datetime] = None, public: bool = True
+) -> dict:
+    """Validator and freshness headers for a GET response"""
+    scope = "public" if public else "private"
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"{scope}, max-age={settings.cache.http_max_age}",
+    }
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(
+            last_modified.replace(tzinfo=timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime] = None
+) -> bool:
+    """
+    Evaluate If-None-Match, falling back to If-Modified-Since
+    as RFC 9110 requires when both are sent
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        return modified <= since
+    return False
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -0,0 +1,13 @@
+"""Request path classification shared by the middleware"""
+
+import re
+from typing import Callable, Iterable
+
+
+def prefix_matcher(prefixes: Iterable[str]) -> Callable[[str], bool]:
+    """Compile path prefixes into one anchored regex, checked in a single call"""
+    prefixes = sorted(set(prefixes), key=len, reverse=True)
+    if not prefixes:
+        return lambda path: False
+    pattern = re.compile("|".join(re.escape(prefix) for prefix in prefixes))
+    return lambda path: pattern.match(path) is not None
@@ -0,0 +1,44 @@
+"""Security headers and rate limiting in a single raw ASGI layer"""
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.middleware.rate_limit import (
+    RateLimitMiddleware,
+    rate_limit_headers,
+    send_rate_limited,
+)
+from core.middleware.security_headers import security_headers
+
+
+class SecurityPipelineMiddleware:
+    """
+    Rate limit the request, then add security and RateLimit-* headers to the
+    response with a single send wrapper. Headers are precomputed bytes and
+    paths are classified by compiled prefix matchers. Keyword arguments are
+    passed to RateLimitMiddleware, which here only checks requests
+    """
+
+    def __init__(self, app: ASGIApp, **rate_limit_options):
+        self.app = app
+        self.rate_limit = RateLimitMiddleware(app, **rate_limit_options)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = security_headers(scope["path"])
+        checked = await self.rate_limit.check(scope)
+        if checked is not None:
+            rule, result = checked
+            headers = [*headers, *rate_limit_headers(rule, result)]
+            if not result.allowed:
+                await send_rate_limited(send, rule, headers)
+                return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
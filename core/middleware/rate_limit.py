@@ -1,72 +1,175 @@
 """Rate limiting middleware for DOS protection"""
 
-from typing import Callable, Optional
+import json
+import logging
+from typing import Dict, Optional, Tuple
 
 import redis.asyncio as redis
-from fastapi import HTTPException, Request, status
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from core.db.redis_client import get_redis_client
+from core.middleware.paths import prefix_matcher
+from core.security.rate_limit import (
+    UNMATCHED_ROUTE,
+    LeasingRateLimiter,
+    RateLimiter,
+    RateLimitResult,
+    RateLimitRule,
+    bucket_key,
+)
+from core.security.tokens import bearer_subject
 from core.settings import Settings
 
+logger = logging.getLogger(__name__)
+
 settings = Settings()
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Middleware to limit request rate per IP address"""
+def rate_limit_headers(rule: RateLimitRule, result: RateLimitResult) -> list:
+    """RateLimit-* header fields (IETF httpapi draft) as raw ASGI headers"""
+    headers = [
+        (b"ratelimit-limit", str(result.limit).encode()),
+        (b"ratelimit-remaining", str(result.remaining).encode()),
+        (b"ratelimit-reset", str(result.reset).encode()),
+        (b"ratelimit-policy", rule.policy.encode()),
+    ]
+    if not result.allowed:
+        headers.append((b"retry-after", str(result.retry_after).encode()))
+    return headers
+
+
+async def send_rate_limited(send: Send, rule: RateLimitRule, headers: list) -> None:
+    """Send the 429 response of a refused request"""
+    body = json.dumps(
+        {
+            "detail": f"Rate limit exceeded. Maximum {rule.limit} requests per {rule.window} seconds."
+        }
+    ).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *headers,
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
 
-    def __init__(self, app, redis_client: Optional[redis.Redis] = None):
-        super().__init__(app)
+class RateLimitMiddleware:
+    """
+    Raw ASGI middleware limiting requests per client and route
+    Buckets are keyed by route template and method, and by client IP or, in
+    per-user mode, by token subject. Each request costs one atomic Redis
+    script call, see core.security.rate_limit
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        redis_client: Optional[redis.Redis] = None,
+        rules: Optional[Dict[str, RateLimitRule]] = None,
+        default: Optional[RateLimitRule] = None,
+        algorithm: Optional[str] = None,
+        local_leases: Optional[bool] = None,
+    ):
+        self.app = app
         self._redis_client = redis_client
-        # Rate limits: requests per window (in seconds)
-        self.limits = {
-            "/api/auth/login": (5, 60),  # 5 requests per 60 seconds
-            "/api/auth/register": (3, 60),  # 3 requests per 60 seconds
-            "default": (100, 60),  # 100 requests per 60 seconds for other endpoints
+        config = settings.rate_limit
+        self.enabled = config.enabled
+        self.rules = rules or {
+            path: RateLimitRule(*rule) for path, rule in config.rules.items()
         }
+        self.default = default or RateLimitRule(*config.default)
+        self.limiter = RateLimiter(algorithm or config.algorithm)
+        if config.local_leases if local_leases is None else local_leases:
+            self.limiter = LeasingRateLimiter(
+                self.limiter,
+                tolerance=config.lease_tolerance,
+                lease_ttl=config.lease_ttl,
+                max_buckets=config.local_max_buckets,
+            )
+        self.is_excluded = prefix_matcher(config.exclude_prefixes)
+        self.per_user = config.per_user
+
+    @staticmethod
+    def _route(scope: Scope) -> str:
+        """
+        "METHOD template" of the route a request will hit, so every post id
+        shares one bucket. Requests matching no route share one as well
+        """
+        router = getattr(scope.get("app"), "router", None)
+        template = None
+        for route in getattr(router, "routes", ()):
+            match, _ = route.matches(scope)
+            if match is Match.FULL:
+                template = route.path
+                break
+            if match is Match.PARTIAL and template is None:
+                template = route.path
+        return f"{scope['method']} {template or UNMATCHED_ROUTE}"
+
+    def _rule(self, route: str) -> RateLimitRule:
+        template = route.partition(" ")[2]
+        return self.rules.get(route) or self.rules.get(template) or self.default
+
+    def _subject(self, scope: Scope) -> str:
+        """Token subject of authenticated requests in per-user mode, else the IP"""
+        if self.per_user:
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    subject = bearer_subject(value.decode("latin-1"))
+                    if subject:
+                        return f"user:{subject}"
+                    break
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
 
     async def _get_redis(self) -> Optional[redis.Redis]:
-        """Get Redis client, initializing if needed"""
-        if self._redis_client is None:
-            self._redis_client = await get_redis_client()
-        return self._redis_client
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Skip rate limiting for documentation endpoints
-        path = request.url.path
-        excluded_paths = ["/docs", "/redoc", "/openapi.json", "/docs/oauth2-redirect"]
-        if any(path.startswith(excluded) for excluded in excluded_paths):
-            return await call_next(request)
-
-        # Get client IP
-        client_ip = request.client.host
-        if not client_ip:
-            client_ip = "unknown"
-
-        # Get rate limit for this endpoint
-        limit, window = self.limits.get(path, self.limits["default"])
+        """Injected client or the shared one, None while Redis is down"""
+        return self._redis_client or await get_redis_client()
+
+    async def check(
+        self, scope: Scope
+    ) -> Optional[Tuple[RateLimitRule, RateLimitResult]]:
+        """Rule and result of an HTTP request, None when it is not limited"""
+        if not self.enabled or self.is_excluded(scope["path"]):
+            return None
 
         redis_client = await self._get_redis()
-        if redis_client:
-            # Check rate limit using Redis
-            key = f"rate_limit:{client_ip}:{path}"
-            try:
-                current = await redis_client.get(key)
-                if current and int(current) >= limit:
-                    raise HTTPException(
-                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                        detail=f"Rate limit exceeded. Maximum {limit} requests per {window} seconds.",
-                    )
-
-                # Increment counter
-                pipe = redis_client.pipeline()
-                pipe.incr(key)
-                pipe.expire(key, window)
-                await pipe.execute()
-            except redis.RedisError:
-                # If Redis is unavailable, allow request but log warning
-                pass
-
-        response = await call_next(request)
-        return response
+        if not redis_client:
+            return None
+
+        route = self._route(scope)
+        rule = self._rule(route)
+        key = bucket_key(self.limiter.algorithm, route, self._subject(scope))
+        try:
+            result = await self.limiter.hit(redis_client, key, rule)
+        except redis.RedisError:
+            # If Redis is unavailable, allow request but log warning
+            logger.warning("Rate limiter unavailable, request not limited")
+            return None
+        return rule, result
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        checked = await self.check(scope) if scope["type"] == "http" else None
+        if checked is None:
+            await self.app(scope, receive, send)
+            return
+
+        rule, result = checked
+        headers = rate_limit_headers(rule, result)
+        if not result.allowed:
+            await send_rate_limited(send, rule, headers)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -1,43 +1,54 @@
 """Security headers middleware"""
 
-from typing import Callable
-
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-
-
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Middleware to add security headers"""
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        response = await call_next(request)
-
-        # Check if this is a documentation endpoint
-        path = request.url.path
-        is_docs = any(
-            path.startswith(p) for p in ["/docs", "/redoc", "/openapi.json", "/static"]
-        )
-
-        # For documentation endpoints, skip most security headers to allow proper rendering
-        if is_docs:
-            # Only add minimal security headers for docs
-            response.headers["X-Content-Type-Options"] = "nosniff"
-            # Don't set X-Frame-Options for docs (allows iframe embedding if needed)
-            # Don't set strict CSP for docs
-            return response
-
-        # Add full security headers for all other endpoints
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = (
-            "max-age=31536000; includeSubDomains"
-        )
-        response.headers["Content-Security-Policy"] = "default-src 'self'"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Permissions-Policy"] = (
-            "geolocation=(), microphone=(), camera=()"
-        )
-
-        return response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.middleware.paths import prefix_matcher
+
+# Documentation endpoints
+DOCS_PREFIXES = ("/docs", "/redoc", "/openapi.json", "/static")
+
+# Raw ASGI header pairs, encoded once at import
+SECURITY_HEADERS = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+    (b"content-security-policy", b"default-src 'self'"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    (b"permissions-policy", b"geolocation=(), microphone=(), camera=()"),
+)
+# Docs only get minimal headers so they render: no X-Frame-Options (allows
+# iframe embedding if needed) and no strict CSP
+DOCS_SECURITY_HEADERS = ((b"x-content-type-options", b"nosniff"),)
+
+is_docs_path = prefix_matcher(DOCS_PREFIXES)
+
+
+def security_headers(path: str) -> tuple:
+    """Precomputed security headers for a request path"""
+    return DOCS_SECURITY_HEADERS if is_docs_path(path) else SECURITY_HEADERS
+
+
+class SecurityHeadersMiddleware:
+    """
+    Raw ASGI middleware adding security headers to every response
+    The app stacks SecurityPipelineMiddleware instead, which adds the same
+    headers and rate limits in one layer
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = security_headers(scope["path"])
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -1 +1 @@
-# Models are imported in init_db() to avoid circular imports
+# Models are imported in migrations/env.py to avoid circular imports
@@ -1,13 +1,22 @@
 import uuid
 from datetime import datetime
 
+from sqlalchemy import text
 from sqlmodel import Field, SQLModel
 
+# Predicate of partial indexes over live rows. It must read exactly like the
+# repositories' is_deleted.is_(False) filters: Postgres does not prove that
+# "is_deleted IS false" implies "is_deleted = false", so an index declared
+# with "=" is never used by those queries
+LIVE_ROWS = text("is_deleted IS false")
+
 
 class BaseModel(SQLModel):
-    id: uuid.UUID = Field(
-        default_factory=lambda: uuid.uuid4(), primary_key=True, index=True
-    )
+    # Server-generated values come back with the flush (RETURNING), so rows
+    # need no refresh after a write
+    __mapper_args__ = {"eager_defaults": True}
+
+    id: uuid.UUID = Field(default_factory=lambda: uuid.uuid4(), primary_key=True)
     created_at: datetime = Field(default_factory=lambda: datetime.utcnow())
     updated_at: datetime = Field(default_factory=lambda: datetime.utcnow())
     is_deleted: bool = Field(default=False, nullable=False)
@@ -0,0 +1,43 @@
+"""Opaque cursor helpers for keyset pagination"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, status
+
+# Cursor directions
+NEXT = "n"
+PREV = "p"
+
+
+def encode_cursor(created_at: datetime, obj_id: UUID, direction: str = NEXT) -> str:
+    """Encode a (created_at, id) position into an opaque url-safe cursor"""
+    payload = json.dumps(
+        [created_at.isoformat(), str(obj_id), direction], separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: Optional[str], directions: Tuple[str, ...] = (NEXT, PREV)
+) -> Optional[Tuple[datetime, UUID, str]]:
+    """
+    Decode a cursor produced by encode_cursor
+    Raises HTTPException if the cursor is malformed or its direction is not
+    one of directions, the ones the endpoint pages in
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, obj_id, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in directions:
+            raise ValueError(direction)
+        return datetime.fromisoformat(created_at), UUID(obj_id), direction
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
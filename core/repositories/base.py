@@ -1,38 +1,193 @@
+import json
 from datetime import datetime
-from typing import Generic, Optional, Type, TypeVar
+from functools import partial
+from typing import AsyncIterator, Generic, Iterable, List, Optional, Type, TypeVar
+from uuid import UUID
 
 from pydantic import BaseModel as PydanticBaseModel
+from pydantic import ValidationError
+from sqlalchemy import ARRAY, any_, cast, inspect, update
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 from sqlmodel import SQLModel, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from core.cache.entity import get_entity_cache
+from core.cache.two_tier import TwoTierCache
+from core.db.session import reads_from_replica
+from core.db.unit_of_work import after_commit, commit, has_after_commit
+from core.settings import Settings
+
+settings = Settings()
+
 T = TypeVar("T", bound=SQLModel)
 
 
 class BaseRepository(Generic[T]):
+    # Entity cache for get(), set from the model's table when a TTL is configured
+    cache: Optional[TwoTierCache] = None
+    # Rows per UPDATE of bulk_soft_delete, bounds lock time and WAL per statement
+    bulk_chunk_size: int = 1000
+    # bulk_create switches from multi-row INSERT to COPY from this many rows
+    bulk_copy_threshold: int = 5000
+
     def __init__(self, model: Type[T], db: AsyncSession):
         self.model = model
         self.db = db
+        self.cache = get_entity_cache(model.__tablename__)
 
     async def create(self, obj_in: T) -> T:
+        obj = self._validate(obj_in)
+        self.db.add(obj)
+        await self._save(obj)
+        return obj
+
+    def _validate(self, obj_in) -> T:
         if isinstance(obj_in, PydanticBaseModel):
-            obj_data_dict = obj_in.model_dump(exclude_unset=True)
+            obj_in = obj_in.model_dump(exclude_unset=True)
+        return self.model.model_validate(obj_in)
+
+    async def bulk_create(self, objs_in: Iterable) -> List[T]:
+        """
+        Insert many rows, as batched multi-row INSERTs or with COPY from
+        bulk_copy_threshold rows. Rows written by COPY get Python-side
+        defaults only, server defaults do not apply, and are not added to
+        the session so large batches do not fill its identity map
+        """
+        objs = [self._validate(obj_in) for obj_in in objs_in]
+        if len(objs) >= self.bulk_copy_threshold:
+            await self._copy(objs)
         else:
-            obj_data_dict = obj_in
+            # insertmanyvalues packs the flush into multi-row INSERT ... RETURNING
+            self.db.add_all(objs)
+            await self.db.flush()
+        await self.commit()
+        return objs
 
-        obj = self.model.model_validate(obj_data_dict)
-        self.db.add(obj)
-        await self.db.commit()
-        await self.db.refresh(obj)
-        return obj
+    async def _copy(self, objs: List[T]) -> None:
+        """COPY rows into the table on the session's connection and transaction"""
+        # Statements queued before must land first
+        await self.db.flush()
+        attrs = inspect(self.model).column_attrs
+        table = self.model.__table__
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.name,
+            schema_name=table.schema,
+            columns=[attr.columns[0].name for attr in attrs],
+            records=[tuple(getattr(obj, attr.key) for attr in attrs) for obj in objs],
+        )
+
+    async def _save(self, obj: T) -> None:
+        """
+        Write obj: flush in unit-of-work mode, the request commits later;
+        otherwise commit and reload it right away
+        """
+        if settings.database.unit_of_work:
+            await self.db.flush()
+        else:
+            await self.db.commit()
+            await self.db.refresh(obj)
+        await self.invalidate(obj.id)
+
+    async def commit(self) -> None:
+        """Commit statements run so far, unless the request commits them"""
+        if not settings.database.unit_of_work:
+            await commit(self.db)
 
     async def get(self, obj_id) -> Optional[T]:
+        generation = None
+        if self.cache:
+            obj = await self._get_cached(obj_id)
+            if obj is not None:
+                return obj
+            # Replica rows may predate a commit and its invalidation
+            if not reads_from_replica(self.db):
+                # Read before the query: an invalidation committed meanwhile
+                # bumps it and the fill below is dropped
+                generation = await self.cache.generation(str(obj_id))
+
         statement = select(self.model).where(
             self.model.id == obj_id, self.model.is_deleted.is_(False)
         )
         result = await self.db.exec(statement)
-        return result.first()
+        obj = result.first()
+        # Uncommitted rows must not reach the shared cache
+        if obj is not None and generation is not None and not has_after_commit(self.db):
+            await self.cache.set(str(obj_id), obj.model_dump_json(), generation)
+        return obj
 
-    async def list(self) -> list[T]:
+    async def get_many(self, obj_ids: Iterable) -> List[T]:
+        """Live rows for obj_ids in one query, in the given order, missing ids skipped"""
+        obj_ids = [UUID(str(obj_id)) for obj_id in obj_ids]
+        if not obj_ids:
+            return []
+        statement = select(self.model).where(
+            self.model.id == any_(cast(obj_ids, ARRAY(PG_UUID))),
+            self.model.is_deleted.is_(False),
+        )
+        result = await self.db.exec(statement)
+        found = {obj.id: obj for obj in result.all()}
+        return [found[obj_id] for obj_id in obj_ids if obj_id in found]
+
+    async def iterate(self, *criteria, chunk_size: int = None) -> AsyncIterator[T]:
+        """
+        Stream live rows matching criteria through a server-side cursor
+        Rows are fetched chunk_size at a time, so memory stays flat however
+        many rows match. The session's connection is held until the loop ends
+        """
+        statement = (
+            select(self.model)
+            .where(*criteria, self.model.is_deleted.is_(False))
+            .execution_options(yield_per=chunk_size or self.bulk_chunk_size)
+        )
+        result = await self.db.stream_scalars(statement)
+        try:
+            async for obj in result:
+                yield obj
+        finally:
+            await result.close()
+
+    async def _get_cached(self, obj_id) -> Optional[T]:
+        """Serve a live row from the session or the entity cache"""
+        key = identity_key(self.model, obj_id)
+        obj = self.db.sync_session.identity_map.get(key)
+        if obj is not None:
+            return None if obj.is_deleted else obj
+
+        cached = await self.cache.get(str(obj_id))
+        if cached is None:
+            return None
+        try:
+            # model_validate_json skips type coercion on table models
+            obj = self.model.model_validate(json.loads(cached))
+        except ValidationError:
+            return None
+        if obj.is_deleted:
+            return None
+
+        # Attach as if loaded by a query so later updates flush normally
+        make_transient_to_detached(obj)
+        self.db.add(obj)
+        return obj
+
+    async def invalidate(self, obj_id) -> None:
+        """
+        Drop a row from the entity cache after it changed outside update()
+        Inside a transaction this waits for the commit, otherwise another
+        request could cache the old row again before it
+        """
+        if not self.cache:
+            return
+        if self.db.in_transaction():
+            after_commit(self.db, partial(self.cache.invalidate, str(obj_id)))
+        else:
+            await self.cache.invalidate(str(obj_id))
+
+    async def list(self) -> List[T]:
         statement = select(self.model).where(self.model.is_deleted.is_(False))
         result = await self.db.exec(statement)
         return result.all()
@@ -46,11 +201,71 @@ class BaseRepository(Generic[T]):
             if value is not None:
                 setattr(obj, field, value)
         obj.updated_at = datetime.utcnow()
-        await self.db.commit()
-        await self.db.refresh(obj)
+        await self._save(obj)
         return obj
 
+    async def bulk_update(self, rows: List[dict]) -> int:
+        """
+        Apply per-row values in one executemany UPDATE by primary key
+        Each dict holds the row's primary key and the columns to set.
+        Returns the number of rows given
+        """
+        if not rows:
+            return 0
+        now = datetime.utcnow()
+        rows = [{"updated_at": now, **row} for row in rows]
+        await self.db.exec(update(self.model), params=rows)
+
+        # Rows already in the session keep the new values without a reload
+        mapper = inspect(self.model)
+        identity_map = self.db.sync_session.identity_map
+        for row in rows:
+            key = mapper.identity_key_from_primary_key(
+                [row[column.key] for column in mapper.primary_key]
+            )
+            obj = identity_map.get(key)
+            if obj is not None:
+                for field, value in row.items():
+                    set_committed_value(obj, field, value)
+
+        if self.cache:
+            keys = [str(row["id"]) for row in rows]
+            after_commit(self.db, partial(self.cache.invalidate_many, keys))
+        await self.commit()
+        return len(rows)
+
+    async def bulk_soft_delete(self, *criteria, chunk_size: int = None) -> int:
+        """
+        Soft delete every live row matching criteria without committing
+        Runs set-based UPDATEs of at most chunk_size rows, nothing is loaded into
+        the session. Cached rows are invalidated after the commit
+        """
+        chunk_size = chunk_size or self.bulk_chunk_size
+        deleted_count = 0
+        while True:
+            chunk = (
+                select(self.model.id)
+                .where(*criteria, self.model.is_deleted.is_(False))
+                .limit(chunk_size)
+                .scalar_subquery()
+            )
+            statement = (
+                update(self.model)
+                .where(self.model.id.in_(chunk))
+                .values(is_deleted=True, updated_at=datetime.utcnow())
+                .returning(self.model.id)
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.db.exec(statement)
+            ids = result.scalars().all()
+            deleted_count += len(ids)
+            if self.cache and ids:
+                keys = [str(obj_id) for obj_id in ids]
+                after_commit(self.db, partial(self.cache.invalidate_many, keys))
+            if len(ids) < chunk_size:
+                return deleted_count
+
     async def delete(self, obj: T):
         obj.is_deleted = True  # for soft delete purpose
-        await self.db.commit()
-        await self.db.refresh(obj)
+        obj.updated_at = datetime.utcnow()
+        await self._save(obj)
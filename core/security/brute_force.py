@@ -1,6 +1,6 @@
 """Brute force protection utilities"""
 
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import redis.asyncio as redis
 from fastapi import HTTPException, status
@@ -9,70 +9,106 @@ from core.settings import Settings
 
 settings = Settings()
 
+# Counts a login attempt against every key, refusing it while any key is
+# locked out. Returns the remaining lockout in seconds, 0 when allowed.
+# KEYS: counters; ARGV[1] window, ARGV[2] lockout, ARGV[2 + i] max of KEYS[i]
+ATTEMPT_SCRIPT = """
+local locked = 0
+for i, key in ipairs(KEYS) do
+    local count = tonumber(redis.call('GET', key) or '0')
+    if count >= tonumber(ARGV[2 + i]) then
+        locked = math.max(locked, redis.call('TTL', key), 1)
+    end
+end
+if locked > 0 then
+    return locked
+end
+for i, key in ipairs(KEYS) do
+    local count = redis.call('INCR', key)
+    if count >= tonumber(ARGV[2 + i]) then
+        redis.call('EXPIRE', key, ARGV[2])
+    elseif count == 1 then
+        redis.call('EXPIRE', key, ARGV[1])
+    end
+end
+return 0
+"""
+
+# Takes a successful login back out of the counters.
+# KEYS[1] is cleared, KEYS[2] (the shared per-IP counter) only decremented
+SUCCESS_SCRIPT = """
+redis.call('DEL', KEYS[1])
+if KEYS[2] and tonumber(redis.call('GET', KEYS[2]) or '0') > 0 then
+    redis.call('DECR', KEYS[2])
+end
+return 0
+"""
+
 
 class BruteForceProtection:
-    """Protection against brute force attacks"""
+    """
+    Protection against brute force attacks
+    Each attempt costs a single EVALSHA. In "pair" mode attempts are counted
+    per IP + email, in "ip_and_email" mode per IP and per email at once, so
+    stuffing many emails from one IP or one email from many IPs both lock out
+    """
 
     def __init__(self, redis_client: Optional[redis.Redis] = None):
         self.redis_client = redis_client
-        self.max_attempts = 5  # Maximum failed login attempts
-        self.lockout_duration = 900  # 15 minutes in seconds
-        self.attempt_window = 300  # 5 minutes window for counting attempts
+        self.mode = settings.brute_force.mode
+        self.max_attempts = settings.brute_force.max_attempts
+        self.ip_max_attempts = settings.brute_force.ip_max_attempts
+        self.lockout_duration = settings.brute_force.lockout_duration
+        self.attempt_window = settings.brute_force.attempt_window
+        if redis_client:
+            # Scripts run by SHA and are loaded again if Redis lost them
+            self._attempt = redis_client.register_script(ATTEMPT_SCRIPT)
+            self._success = redis_client.register_script(SUCCESS_SCRIPT)
 
-    async def check_attempts(self, identifier: str) -> None:
+    def _counters(self, client_ip: str, email: str) -> List[Tuple[str, int]]:
+        """(key, max attempts) pairs, the per-email or pair key first"""
+        if self.mode == "ip_and_email":
+            return [
+                (f"brute_force:email:{email}", self.max_attempts),
+                (f"brute_force:ip:{client_ip}", self.ip_max_attempts),
+            ]
+        return [(f"brute_force:{client_ip}:{email}", self.max_attempts)]
+
+    async def register_attempt(self, client_ip: str, email: str) -> None:
         """
-        Check if identifier (IP or email) has exceeded max attempts
-        Raises HTTPException if blocked
+        Count a login attempt before the password is checked
+        Raises HTTPException if the IP or email is locked out
         """
         if not self.redis_client:
             return  # Skip protection if Redis is not available
 
-        key = f"brute_force:{identifier}"
+        counters = self._counters(client_ip, email)
         try:
-            attempts = await self.redis_client.get(key)
-            if attempts and int(attempts) >= self.max_attempts:
-                # Check if still in lockout period
-                ttl = await self.redis_client.ttl(key)
-                if ttl > 0:
-                    raise HTTPException(
-                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                        detail=f"Too many failed login attempts. Please try again in {ttl // 60} minutes.",
-                    )
+            locked_for = await self._attempt(
+                keys=[key for key, _ in counters],
+                args=[
+                    self.attempt_window,
+                    self.lockout_duration,
+                    *(max_attempts for _, max_attempts in counters),
+                ],
+            )
         except redis.RedisError:
-            pass  # If Redis fails, allow the request
-
-    async def record_failed_attempt(self, identifier: str) -> None:
-        """Record a failed login attempt"""
-        if not self.redis_client:
-            return
+            return  # If Redis fails, allow the request
 
-        key = f"brute_force:{identifier}"
-        try:
-            pipe = self.redis_client.pipeline()
-            pipe.incr(key)
-            pipe.expire(key, self.attempt_window)
-            await pipe.execute()
-        except redis.RedisError:
-            pass
+        if locked_for:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Too many failed login attempts. Please try again in {max(locked_for // 60, 1)} minutes.",
+                headers={"Retry-After": str(locked_for)},
+            )
 
-    async def record_successful_login(self, identifier: str) -> None:
+    async def record_successful_login(self, client_ip: str, email: str) -> None:
         """Clear failed attempts on successful login"""
         if not self.redis_client:
             return
 
-        key = f"brute_force:{identifier}"
-        try:
-            await self.redis_client.delete(key)
-        except redis.RedisError:
-            pass
-
-    async def block_identifier(self, identifier: str) -> None:
-        """Block identifier for lockout duration"""
-        if not self.redis_client:
-            return
-
-        key = f"brute_force:{identifier}"
+        keys = [key for key, _ in self._counters(client_ip, email)]
         try:
-            await self.redis_client.setex(key, self.lockout_duration, self.max_attempts)
+            await self._success(keys=keys)
         except redis.RedisError:
             pass
@@ -0,0 +1,120 @@
+"""Password hashing off the event loop"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+settings = Settings()
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.password.bcrypt_rounds,
+)
+
+
+class PasswordHasher:
+    """
+    Run bcrypt in a dedicated thread pool so handlers keep the loop free
+    bcrypt releases the GIL while hashing, so threads run it in parallel.
+    At most workers + queue_limit calls are admitted, the rest get a 503
+    instead of piling up behind a login burst
+    """
+
+    def __init__(self, context: CryptContext, workers: int, queue_limit: int):
+        self.context = context
+        self.workers = workers
+        self.max_pending = workers + queue_limit
+        self.pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.calls = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    def stats(self) -> dict:
+        """Load and timing counters of this worker, times in seconds"""
+        return {
+            "pending": self.pending,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "queue_wait_avg": self.queue_wait_total / self.calls if self.calls else 0.0,
+            "queue_wait_max": self.queue_wait_max,
+            "hash_time_avg": self.hash_time_total / self.calls if self.calls else 0.0,
+            "hash_time_max": self.hash_time_max,
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="password-hasher"
+            )
+        return self._executor
+
+    async def _run(self, func: Callable, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning("Password hasher saturated, shedding request")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        def timed():
+            started = time.perf_counter()
+            result = func(*args)
+            return started, time.perf_counter(), result
+
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            started, finished, result = await loop.run_in_executor(
+                self._get_executor(), timed
+            )
+        finally:
+            self.pending -= 1
+
+        queue_wait, hash_time = started - submitted, finished - started
+        self.calls += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.hash_time_total += hash_time
+        self.hash_time_max = max(self.hash_time_max, hash_time)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(
+        self, password: str, hashed: str
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password, also returning a new hash when the stored one uses
+        outdated settings (e.g. fewer bcrypt rounds), None otherwise
+        """
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    pwd_context,
+    workers=settings.password.hash_workers,
+    queue_limit=settings.password.hash_queue_limit,
+)
@@ -0,0 +1,420 @@
+"""Atomic rate limiting algorithms executed as Redis scripts"""
+
+import asyncio
+import os
+import time
+import weakref
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+
+import redis.asyncio as redis
+
+from core.cache.local import LocalLRUCache
+
+# Every script takes KEYS[1] bucket, ARGV[1] limit, ARGV[2] window in seconds,
+# ARGV[3] a unique request token, ARGV[4] units requested, and returns
+# {granted, remaining, reset seconds, retry-after seconds}. Fewer units than
+# requested may be granted, 0 means the request is refused.
+# Time comes from the Redis server so workers never disagree on the clock
+
+FIXED_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local count = tonumber(redis.call('GET', KEYS[1]) or '0')
+local granted = math.min(tonumber(ARGV[4]), math.max(limit - count, 0))
+if granted > 0 then
+    count = redis.call('INCRBY', KEYS[1], granted)
+    if count == granted then
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+end
+local reset = math.max(redis.call('TTL', KEYS[1]), 0)
+if granted == 0 then
+    return {0, 0, reset, math.max(reset, 1)}
+end
+return {granted, limit - count, reset, 0}
+"""
+
+SLIDING_LOG_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2]) * 1000
+local time = redis.call('TIME')
+local now = time[1] * 1000 + math.floor(time[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local granted = math.min(tonumber(ARGV[4]), math.max(limit - count, 0))
+if granted == 0 then
+    local oldest = tonumber(redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')[2])
+    local retry = math.ceil((oldest + window - now) / 1000)
+    return {0, 0, retry, math.max(retry, 1)}
+end
+for i = 1, granted do
+    redis.call('ZADD', KEYS[1], now, ARGV[3] .. ':' .. i)
+end
+redis.call('PEXPIRE', KEYS[1], window)
+local oldest = tonumber(redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')[2])
+return {granted, limit - count - granted, math.ceil((oldest + window - now) / 1000), 0}
+"""
+
+# Generic cell rate algorithm: one "theoretical arrival time" per bucket,
+# requests are spaced window / limit apart with a burst of limit requests
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2]) * 1000
+local interval = window / limit
+local time = redis.call('TIME')
+local now = time[1] * 1000 + math.floor(time[2] / 1000)
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local available = math.floor((window - (tat - now)) / interval + 1e-9)
+local granted = math.min(tonumber(ARGV[4]), available)
+if granted <= 0 then
+    local retry = math.ceil((tat + interval - window - now) / 1000)
+    return {0, 0, math.ceil((tat - now) / 1000), math.max(retry, 1)}
+end
+local new_tat = tat + granted * interval
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now))
+local remaining = math.floor((window - (new_tat - now)) / interval + 1e-9)
+return {granted, remaining, math.ceil((new_tat - now) / 1000), 0}
+"""
+
+# Refund scripts take the same arguments, ARGV[3] being the token of the
+# request that took the units and ARGV[4] the units given back, and return
+# how many were refunded. Only called while the units are still counted
+
+FIXED_WINDOW_REFUND_SCRIPT = """
+local count = tonumber(redis.call('GET', KEYS[1]) or '0')
+local refund = math.min(tonumber(ARGV[4]), count)
+if refund > 0 then
+    redis.call('DECRBY', KEYS[1], refund)
+end
+return refund
+"""
+
+# Entries of one request share a score, any of them can go
+SLIDING_LOG_REFUND_SCRIPT = """
+local refunded = 0
+for i = 1, tonumber(ARGV[4]) do
+    refunded = refunded + redis.call('ZREM', KEYS[1], ARGV[3] .. ':' .. i)
+end
+return refunded
+"""
+
+GCRA_REFUND_SCRIPT = """
+local interval = tonumber(ARGV[2]) * 1000 / tonumber(ARGV[1])
+local time = redis.call('TIME')
+local now = time[1] * 1000 + math.floor(time[2] / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+local new_tat = tat - tonumber(ARGV[4]) * interval
+if new_tat <= now then
+    redis.call('DEL', KEYS[1])
+    return math.floor((tat - now) / interval + 1e-9)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now))
+return tonumber(ARGV[4])
+"""
+
+KEY_PREFIX = "rate_limit:"
+# Bucket family of requests that match no route (404s, scanners)
+UNMATCHED_ROUTE = "<unmatched>"
+
+SCRIPTS = {
+    "fixed_window": FIXED_WINDOW_SCRIPT,
+    "sliding_log": SLIDING_LOG_SCRIPT,
+    "gcra": GCRA_SCRIPT,
+}
+
+REFUND_SCRIPTS = {
+    "fixed_window": FIXED_WINDOW_REFUND_SCRIPT,
+    "sliding_log": SLIDING_LOG_REFUND_SCRIPT,
+    "gcra": GCRA_REFUND_SCRIPT,
+}
+
+
+def bucket_key(algorithm: str, route: str, subject: str) -> str:
+    """
+    Key of one client's bucket on a route, e.g.
+    rate_limit:gcra:GET /api/blog/{post_id}|ip:10.0.0.1
+    Everything before "|" names the bucket family
+    """
+    return f"{KEY_PREFIX}{algorithm}:{route}|{subject}"
+
+
+async def bucket_stats(redis_client: redis.Redis, samples: int = 20) -> dict:
+    """
+    Key count and approximate memory per bucket family, memory is extrapolated
+    from MEMORY USAGE of up to `samples` keys per family
+    """
+    families: Dict[str, list] = {}
+    async for key in redis_client.scan_iter(match=f"{KEY_PREFIX}*", count=1000):
+        family = key[len(KEY_PREFIX) :].partition("|")[0]
+        families.setdefault(family, []).append(key)
+
+    stats = {}
+    for family, keys in families.items():
+        sampled = keys[:samples]
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key in sampled:
+                pipe.memory_usage(key)
+            usages = [usage or 0 for usage in await pipe.execute()]
+        average = sum(usages) / len(sampled)
+        stats[family] = {"keys": len(keys), "memory_bytes": int(average * len(keys))}
+    return stats
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitRule:
+    limit: int
+    window: int
+
+    @property
+    def policy(self) -> str:
+        """RateLimit-Policy value, e.g. "100;w=60" """
+        return f"{self.limit};w={self.window}"
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int
+    retry_after: int
+    granted: int = 1
+
+
+class RateLimiter:
+    """Check and count a request against a bucket in one script call"""
+
+    def __init__(self, algorithm: str):
+        if algorithm not in SCRIPTS:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self._client: Optional[redis.Redis] = None
+        self._script = None
+        self._refund_script = None
+
+    def _register(self, redis_client: redis.Redis) -> None:
+        if redis_client is not self._client:
+            # Runs by EVALSHA, the client loads the script again on NOSCRIPT
+            self._script = redis_client.register_script(SCRIPTS[self.algorithm])
+            self._refund_script = redis_client.register_script(
+                REFUND_SCRIPTS[self.algorithm]
+            )
+            self._client = redis_client
+
+    async def hit(
+        self,
+        redis_client: redis.Redis,
+        key: str,
+        rule: RateLimitRule,
+        requested: int = 1,
+        token: Optional[str] = None,
+    ) -> RateLimitResult:
+        """
+        Take up to `requested` units from a bucket, granted holds how many
+        Raises redis.RedisError when Redis is unavailable
+        """
+        self._register(redis_client)
+        granted, remaining, reset, retry_after = await self._script(
+            keys=[key],
+            args=[rule.limit, rule.window, token or os.urandom(8).hex(), requested],
+        )
+        return RateLimitResult(
+            allowed=granted > 0,
+            limit=rule.limit,
+            remaining=max(int(remaining), 0),
+            reset=max(int(reset), 0),
+            retry_after=int(retry_after),
+            granted=int(granted),
+        )
+
+    async def refund(
+        self,
+        redis_client: redis.Redis,
+        key: str,
+        rule: RateLimitRule,
+        token: str,
+        units: int,
+    ) -> int:
+        """
+        Give back units the request `token` took and did not spend, returns
+        how many were refunded. Raises redis.RedisError when Redis is unavailable
+        """
+        self._register(redis_client)
+        refunded = await self._refund_script(
+            keys=[key], args=[rule.limit, rule.window, token, units]
+        )
+        return int(refunded)
+
+
+@dataclass(slots=True)
+class Lease:
+    """Units taken from a Redis bucket and not spent yet by this worker"""
+
+    tokens: int
+    result: RateLimitResult
+    rule: RateLimitRule
+    # Request token the units were taken with, to refund them
+    token: str
+    taken_at: float
+
+
+class LeasingRateLimiter:
+    """
+    Local tier in front of RateLimiter: quota is leased from Redis in chunks
+    of limit * tolerance units and spent in process, so most requests under
+    the limit make no Redis call. Units are taken from Redis before they are
+    spent, so the global limit is never exceeded; a worker may hold at most
+    one chunk it does not use, which refuses up to workers * chunk requests
+    early. A lease lasts until Redis would give its units back anyway, one
+    evicted before that refunds them. Refusals are remembered for lease_ttl
+    seconds
+    """
+
+    def __init__(
+        self,
+        limiter: RateLimiter,
+        tolerance: float,
+        lease_ttl: float,
+        max_buckets: int,
+    ):
+        self.limiter = limiter
+        self.algorithm = limiter.algorithm
+        self.tolerance = tolerance
+        self.leases = LocalLRUCache(max_entries=max_buckets, ttl=lease_ttl)
+        self._leasing: Dict[str, asyncio.Future] = {}
+        self.local_hits = 0
+        self.remote_calls = 0
+        self.refunded = 0
+        _leasing_limiters.add(self)
+
+    def chunk(self, rule: RateLimitRule) -> int:
+        """Units leased per Redis call, 1 keeps small limits exact"""
+        return max(1, int(rule.limit * self.tolerance))
+
+    def lifetime(self, rule: RateLimitRule, result: RateLimitResult) -> float:
+        """
+        Seconds until Redis counts the leased units as free again: the end of
+        the fixed window or of the GCRA debt, a whole window for log entries.
+        A lease dropped earlier would lose them, one kept longer overspends
+        """
+        if self.algorithm == "sliding_log":
+            return rule.window
+        return result.reset
+
+    def stats(self) -> dict:
+        """Share of requests answered without Redis in this worker"""
+        total = self.local_hits + self.remote_calls
+        return {
+            "local_hits": self.local_hits,
+            "remote_calls": self.remote_calls,
+            "local_ratio": self.local_hits / total if total else 0.0,
+            "refunded": self.refunded,
+            "buckets": len(self.leases),
+        }
+
+    def _spend(self, key: str) -> Optional[RateLimitResult]:
+        """Answer from the local lease, None when Redis has to be asked"""
+        lease = self.leases.get(key)
+        if lease is None:
+            return None
+        if not lease.result.allowed:
+            return lease.result
+        if lease.tokens <= 0:
+            return None
+        lease.tokens -= 1
+        elapsed = int(time.monotonic() - lease.taken_at)
+        return replace(
+            lease.result,
+            remaining=lease.result.remaining + lease.tokens,
+            reset=max(lease.result.reset - elapsed, 0),
+        )
+
+    async def _refund(self, redis_client: redis.Redis, evicted: list) -> None:
+        """Give the unspent units of evicted leases back to Redis"""
+        for key, lease in evicted:
+            if not lease.result.allowed or lease.tokens <= 0:
+                continue
+            try:
+                self.refunded += await self.limiter.refund(
+                    redis_client, key, lease.rule, lease.token, lease.tokens
+                )
+            except redis.RedisError:
+                # Lost until the window resets, as a worker restart loses them
+                pass
+
+    async def hit(
+        self, redis_client: redis.Redis, key: str, rule: RateLimitRule
+    ) -> RateLimitResult:
+        while True:
+            result = self._spend(key)
+            if result is not None:
+                self.local_hits += 1
+                return result
+            # Concurrent requests for a drained bucket wait for one lease
+            # instead of each taking a chunk
+            leasing = self._leasing.get(key)
+            if leasing is None:
+                break
+            await leasing
+
+        self._leasing[key] = leased = asyncio.get_running_loop().create_future()
+        evicted = []
+        try:
+            self.remote_calls += 1
+            token = os.urandom(8).hex()
+            result = await self.limiter.hit(
+                redis_client, key, rule, requested=self.chunk(rule), token=token
+            )
+            tokens = max(result.granted - 1, 0)
+            lease = Lease(
+                tokens=tokens,
+                result=result,
+                rule=rule,
+                token=token,
+                taken_at=time.monotonic(),
+            )
+            if not result.allowed:
+                evicted = self.leases.set(key, lease)
+            elif tokens:
+                evicted = self.leases.set(key, lease, ttl=self.lifetime(rule, result))
+        finally:
+            del self._leasing[key]
+            leased.set_result(None)
+        await self._refund(redis_client, evicted)
+        return replace(result, remaining=result.remaining + tokens)
+
+
+# Leasing limiters of this worker, one per rate limiting middleware
+_leasing_limiters: "weakref.WeakSet[LeasingRateLimiter]" = weakref.WeakSet()
+
+
+def lease_stats() -> Optional[dict]:
+    """Combined stats() of this worker's leasing limiters, None without any"""
+    limiters = list(_leasing_limiters)
+    if not limiters:
+        return None
+    totals = {
+        name: sum(limiter.stats()[name] for limiter in limiters)
+        for name in ("local_hits", "remote_calls", "refunded", "buckets")
+    }
+    requests = totals["local_hits"] + totals["remote_calls"]
+    totals["local_ratio"] = totals["local_hits"] / requests if requests else 0.0
+    return totals
+
+
+if __name__ == "__main__":
+    # python -m core.security.rate_limit: print bucket families as JSON
+    import json
+
+    from core.db.redis_client import create_redis_client
+
+    async def main():
+        redis_client = await create_redis_client()
+        if not redis_client:
+            raise SystemExit("Redis is not available")
+        try:
+            print(json.dumps(await bucket_stats(redis_client), indent=2))
+        finally:
+            await redis_client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,25 @@
+"""Access token helpers usable outside of FastAPI dependencies"""
+
+from typing import Optional
+
+from jose import JWTError, jwt
+
+from core.settings import Settings
+
+settings = Settings()
+
+
+def bearer_subject(authorization: Optional[str]) -> Optional[str]:
+    """Subject of a valid bearer token in an Authorization header, else None"""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    try:
+        payload = jwt.decode(
+            token, settings.jwt.secret_key, algorithms=[settings.jwt.algorithm]
+        )
+    except JWTError:
+        return None
+    return payload.get("sub")
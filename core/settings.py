@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -17,10 +19,69 @@ class PostgresSettings(BaseSettings):
     def dsn(self):
         return f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.db}"
 
+    def adsn_at(self, address: str) -> str:
+        """Async DSN of the same database on another "host:port" server"""
+        return f"postgresql+asyncpg://{self.user}:{self.password}@{address}/{self.db}"
+
+
+class DatabaseSettings(BaseSettings):
+    pool_size: int = 10
+    max_overflow: int = 10
+    # Seconds to wait for a pooled connection before failing
+    pool_timeout: float = 30
+    # Replace connections older than this many seconds
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    echo: bool = False
+    # Pool connections opened during startup, up to pool_size
+    warm_connections: int = 5
+    # Prepared statements cached per connection by asyncpg and by SQLAlchemy
+    statement_cache_size: int = 100
+    # PostgreSQL settings sent with every new connection; JIT compilation
+    # costs more than it saves on short OLTP queries
+    server_settings: dict[str, str] = {"jit": "off", "application_name": "blog-api"}
+    # Behind PgBouncer in transaction mode: no prepared statement caches and
+    # only startup parameters PgBouncer accepts
+    pgbouncer: bool = False
+    # Repositories flush and the request commits once at the end; False
+    # restores a commit and refresh per repository write
+    unit_of_work: bool = True
+    # Pools of engines created by Celery tasks
+    task_pool_size: int = 2
+    task_max_overflow: int = 5
+    # Streaming replicas as "host:port"; GET and HEAD requests read from them
+    replicas: list[str] = []
+    # Replicas further behind the primary than this many seconds get no reads
+    replica_max_lag: float = 2.0
+    replica_lag_check_interval: float = 1.0
+    # Seconds a user's reads stay on the primary after they wrote, keep it
+    # above replica_max_lag so they read their own writes
+    replica_pin_seconds: int = 5
+    # Monthly partitions of post and comment kept created ahead of the current
+    # month, once partitioned with "python -m core.db.partitions partition"
+    partition_months_ahead: int = 3
+    # Partitions whose rows are all older than this are detached, keep it at
+    # least the cleanup_expired_posts window
+    partition_retention_days: int = 30
+    # Move detached partitions to the "archive" schema instead of dropping them
+    partition_archive: bool = False
+    model_config = SettingsConfigDict(env_prefix="database_")
+
 
 class RedisSettings(BaseSettings):
     host: str = "localhost"
     port: int = 6379
+    max_connections: int = 50
+    # Seconds to wait for a free pooled connection
+    pool_timeout: float = 1.0
+    socket_timeout: float = 0.5
+    socket_connect_timeout: float = 0.5
+    health_check_interval: int = 30
+    # Consecutive connection failures that open the circuit breaker, and the
+    # backoff between half-open probes while it is open
+    breaker_threshold: int = 3
+    breaker_backoff: float = 0.5
+    breaker_backoff_max: float = 30.0
     model_config = SettingsConfigDict(env_prefix="redis_")
 
     @property
@@ -35,7 +96,123 @@ class JWTSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="jwt_")
 
 
+class RateLimitSettings(BaseSettings):
+    enabled: bool = True
+    # "fixed_window", "sliding_log" or "gcra" (token bucket)
+    algorithm: Literal["fixed_window", "sliding_log", "gcra"] = "gcra"
+    # (requests, window seconds) per route template, optionally prefixed with
+    # the method ("POST /api/auth/login"); anything else gets the default
+    rules: dict[str, tuple[int, int]] = {
+        "/api/auth/login": (5, 60),
+        "/api/auth/register": (3, 60),
+    }
+    default: tuple[int, int] = (100, 60)
+    # Bucket authenticated requests by token subject instead of client IP
+    per_user: bool = False
+    # Lease quota from Redis in chunks of limit * lease_tolerance and spend it
+    # in process; refusals are remembered for lease_ttl seconds
+    local_leases: bool = False
+    lease_tolerance: float = 0.1
+    lease_ttl: float = 1.0
+    local_max_buckets: int = 10000
+    # Paths never limited
+    exclude_prefixes: list[str] = [
+        "/docs",
+        "/redoc",
+        "/openapi.json",
+        "/docs/oauth2-redirect",
+    ]
+    model_config = SettingsConfigDict(env_prefix="rate_limit_")
+
+
+class BruteForceSettings(BaseSettings):
+    # "pair" counts failures per IP + email, "ip_and_email" per IP and per
+    # email at the same time
+    mode: Literal["pair", "ip_and_email"] = "pair"
+    max_attempts: int = 5
+    # Per-IP budget in "ip_and_email" mode, shared by everyone behind a NAT
+    ip_max_attempts: int = 20
+    lockout_duration: int = 900  # 15 minutes in seconds
+    attempt_window: int = 300  # 5 minutes window for counting attempts
+    model_config = SettingsConfigDict(env_prefix="brute_force_")
+
+
+class PasswordSettings(BaseSettings):
+    # Raising the rounds rehashes stored passwords on their next login
+    bcrypt_rounds: int = 12
+    # Threads hashing concurrently, and calls allowed to wait for one
+    hash_workers: int = 2
+    hash_queue_limit: int = 32
+    model_config = SettingsConfigDict(env_prefix="password_")
+
+
+class SearchSettings(BaseSettings):
+    # "russian" stems cyrillic words and routes latin words to english_stem,
+    # so one config covers both alphabets allowed in post titles
+    language: str = "russian"
+    headline_options: str = (
+        "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5"
+    )
+    model_config = SettingsConfigDict(env_prefix="search_")
+
+
+class CacheSettings(BaseSettings):
+    # Seconds a cached post listing page may be served
+    post_list_ttl: int = 30
+    # max-age of public GET responses, lets a shared HTTP cache absorb reads
+    http_max_age: int = 10
+    # Seconds an authenticated principal is served without a users query
+    principal_ttl: int = 60
+    model_config = SettingsConfigDict(env_prefix="cache_")
+
+
+class EntityCacheSettings(BaseSettings):
+    enabled: bool = True
+    # Per-process LRU bound, shared by every cached table
+    local_max_entries: int = 2048
+    # Seconds to cache rows of each table, tables not listed are not cached.
+    # "users" is left out by default since cached rows carry the password hash
+    ttls: dict[str, int] = {"post": 60, "comment": 60}
+    model_config = SettingsConfigDict(env_prefix="entity_cache_")
+
+
+class PaginationSettings(BaseSettings):
+    comments_default_limit: int = 50
+    comments_max_limit: int = 200
+    model_config = SettingsConfigDict(env_prefix="pagination_")
+
+
+class LikeSettings(BaseSettings):
+    # Buffer toggles in Redis and let a Celery task write them in batches
+    write_behind: bool = False
+    # Seconds a per-post like set lives after it was loaded from Postgres
+    set_ttl: int = 3600
+    # Seconds between flushes of buffered toggles, and rows per statement
+    flush_interval: int = 5
+    flush_batch_size: int = 1000
+    # Most post ids accepted by the batch like-state endpoint
+    batch_max_ids: int = 100
+    model_config = SettingsConfigDict(env_prefix="likes_")
+
+
+class MetricsSettings(BaseSettings):
+    # Shared secret expected in the X-Metrics-Token header of /internal/metrics,
+    # the endpoint answers 404 while it is unset
+    token: Optional[str] = None
+    model_config = SettingsConfigDict(env_prefix="metrics_")
+
+
 class Settings(BaseSettings):
     postgres: PostgresSettings = PostgresSettings()
+    database: DatabaseSettings = DatabaseSettings()
     redis: RedisSettings = RedisSettings()
     jwt: JWTSettings = JWTSettings()
+    password: PasswordSettings = PasswordSettings()
+    brute_force: BruteForceSettings = BruteForceSettings()
+    rate_limit: RateLimitSettings = RateLimitSettings()
+    search: SearchSettings = SearchSettings()
+    cache: CacheSettings = CacheSettings()
+    entity_cache: EntityCacheSettings = EntityCacheSettings()
+    pagination: PaginationSettings = PaginationSettings()
+    likes: LikeSettings = LikeSettings()
+    metrics: MetricsSettings = MetricsSettings()
@@ -6,35 +6,61 @@ import asyncio
 import logging
 from datetime import datetime, timedelta
 
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.auth.dependencies.principal import invalidate_principals
 from app.auth.models.verification import EmailVerification
 from app.auth.repositories.verification import VerificationRepository
-from app.blogs.models.posts import Post
+from app.blogs.models.posts import Comment, Post, PostLike
+from app.blogs.repositories.comments import CommentRepository
+from app.blogs.repositories.likes import PostLikeRepository
 from app.blogs.repositories.posts import PostRepository
+from app.blogs.services.v1.posts import post_list_cache
+from app.users.models.users import User
 from app.users.repositories.users import UserRepository
 from core.celery_app import celery_app
+from core.db.redis_client import create_redis_client
+from core.db.session import build_task_engine
+from core.db.unit_of_work import after_commit, discard_after_commit, run_after_commit
 from core.settings import Settings
 
 logger = logging.getLogger(__name__)
 
 settings = Settings()
-DATABASE_URL = settings.postgres.adsn
+
+
+async def _commit(db: AsyncSession) -> None:
+    """Commit, then run the session's after_commit invalidations"""
+    await db.commit()
+    # The shared client is bound to the API event loop, use a task-local one
+    redis_client = await create_redis_client()
+    if not redis_client:
+        discard_after_commit(db)
+        return
+    try:
+        await run_after_commit(db, redis_client)
+    finally:
+        await redis_client.close()
+
+
+async def _invalidate_principals(emails: list):
+    """Drop cached principals of removed users"""
+    redis_client = await create_redis_client()
+    if not redis_client:
+        return
+    try:
+        await invalidate_principals(emails, redis_client)
+    finally:
+        await redis_client.close()
 
 
 async def _cleanup_expired_unverified_users_async():
     """Async function to clean up unverified users older than 1 month"""
     # Create engine and session maker fresh for each task execution
     # This ensures they're tied to the current event loop created by asyncio.run()
-    engine = create_async_engine(
-        DATABASE_URL,
-        echo=False,
-        pool_pre_ping=True,
-        pool_size=2,  # Smaller pool for individual tasks
-        max_overflow=5,
-    )
+    engine = build_task_engine()
     AsyncSessionLocal = async_sessionmaker(
         engine, class_=AsyncSession, expire_on_commit=False
     )
@@ -48,31 +74,27 @@ async def _cleanup_expired_unverified_users_async():
                 # Calculate date 1 month ago
                 one_month_ago = datetime.utcnow() - timedelta(days=30)
 
-                # Get unverified verifications older than 1 month
-                statement = select(EmailVerification).where(
+                # Users whose verification expired unused, removed with set-based
+                # UPDATEs; only their emails are streamed in for the principal cache
+                expired_user_ids = select(EmailVerification.user_id).where(
                     EmailVerification.is_verified.is_(False),
                     EmailVerification.created_at < one_month_ago,
                     EmailVerification.is_deleted.is_(False),
                 )
-                result = await db.exec(statement)
-                expired_verifications = result.all()
-
-                deleted_count = 0
-                user_ids_to_delete = []
-
-                for verification in expired_verifications:
-                    user_ids_to_delete.append(str(verification.user_id))
-                    # Delete verification record
-                    await verification_repo.delete(verification)
-
-                # Delete users
-                if user_ids_to_delete:
-                    users = await user_repo.get_users_by_user_ids(user_ids_to_delete)
-                    for user in users:
-                        await user_repo.delete(user)
-                        deleted_count += 1
+                deleted_emails = [
+                    user.email
+                    async for user in user_repo.iterate(User.id.in_(expired_user_ids))
+                ]
+                deleted_count = await user_repo.bulk_soft_delete(
+                    User.id.in_(expired_user_ids)
+                )
+                await verification_repo.bulk_soft_delete(
+                    EmailVerification.user_id.in_(expired_user_ids)
+                )
 
-                await db.commit()
+                await _commit(db)
+                if deleted_emails:
+                    await _invalidate_principals(deleted_emails)
                 logger.info(
                     f"Cleaned up {deleted_count} expired unverified users at {datetime.utcnow()}"
                 )
@@ -93,13 +115,7 @@ async def _cleanup_expired_posts_async():
     """Async function to clean up posts older than 1 month"""
     # Create engine and session maker fresh for each task execution
     # This ensures they're tied to the current event loop created by asyncio.run()
-    engine = create_async_engine(
-        DATABASE_URL,
-        echo=False,
-        pool_pre_ping=True,
-        pool_size=2,  # Smaller pool for individual tasks
-        max_overflow=5,
-    )
+    engine = build_task_engine()
     AsyncSessionLocal = async_sessionmaker(
         engine, class_=AsyncSession, expire_on_commit=False
     )
@@ -108,25 +124,30 @@ async def _cleanup_expired_posts_async():
         async with AsyncSessionLocal() as db:
             try:
                 post_repo = PostRepository(db)
+                comment_repo = CommentRepository(db)
+                like_repo = PostLikeRepository(db)
 
                 # Calculate date 1 month ago
                 one_month_ago = datetime.utcnow() - timedelta(days=30)
 
-                # Get posts older than 1 month
-                statement = select(Post).where(
+                # Expired posts and everything hanging off them, deleted in
+                # set-based chunks within one transaction
+                expired_post_ids = select(Post.id).where(
                     Post.created_at < one_month_ago,
                     Post.is_deleted.is_(False),
                 )
+                await comment_repo.bulk_soft_delete(
+                    Comment.post_id.in_(expired_post_ids)
+                )
+                await like_repo.bulk_soft_delete(PostLike.post_id.in_(expired_post_ids))
+                deleted_count = await post_repo.bulk_soft_delete(
+                    Post.created_at < one_month_ago
+                )
 
-                result = await db.exec(statement)
-                expired_posts = result.all()
-
-                deleted_count = 0
-                for post in expired_posts:
-                    await post_repo.delete(post)
-                    deleted_count += 1
-
-                await db.commit()
+                if deleted_count:
+                    # Listing pages still show the expired posts
+                    after_commit(db, post_list_cache.invalidate)
+                await _commit(db)
                 logger.info(
                     f"Cleaned up {deleted_count} expired posts at {datetime.utcnow()}"
                 )
@@ -0,0 +1,74 @@
+"""
+Celery tasks keeping denormalized counters correct
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.blogs.repositories.posts import PostRepository
+from core.celery_app import celery_app
+from core.db.redis_client import create_redis_client
+from core.db.session import build_task_engine
+from core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+settings = Settings()
+
+
+async def _invalidate_posts(post_repo: PostRepository, post_ids: list) -> None:
+    # The shared client is bound to the API event loop, use a task-local one
+    redis_client = await create_redis_client()
+    if not redis_client:
+        return
+    try:
+        for post_id in post_ids:
+            await post_repo.cache.invalidate(str(post_id), redis_client)
+    finally:
+        await redis_client.close()
+
+
+async def _reconcile_post_counters_async():
+    """Async function to recount likes and comments of every live post"""
+    # Create engine and session maker fresh for each task execution
+    # This ensures they're tied to the current event loop created by asyncio.run()
+    engine = build_task_engine()
+    AsyncSessionLocal = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    try:
+        async with AsyncSessionLocal() as db:
+            try:
+                post_repo = PostRepository(db)
+                repaired_ids = await post_repo.reconcile_counters()
+                await db.commit()
+
+                # Cached rows of repaired posts still carry the drifted counts
+                if repaired_ids and post_repo.cache:
+                    await _invalidate_posts(post_repo, repaired_ids)
+
+                logger.info(
+                    f"Repaired counters of {len(repaired_ids)} posts at {datetime.utcnow()}"
+                )
+                return {
+                    "repaired_count": len(repaired_ids),
+                    "timestamp": datetime.utcnow().isoformat(),
+                }
+            except Exception as e:
+                logger.error(f"Error reconciling post counters: {e}")
+                await db.rollback()
+                raise
+    finally:
+        # Dispose of the engine to close all connections
+        await engine.dispose()
+
+
+@celery_app.task(name="core.tasks.counters.reconcile_post_counters")
+def reconcile_post_counters():
+    """Repair drifted like/comment counters in bulk (runs daily)"""
+    return asyncio.run(_reconcile_post_counters_async())
@@ -0,0 +1,110 @@
+"""
+Celery tasks writing buffered like toggles to Postgres
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from uuid import UUID
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.blogs.repositories.like_sets import FLUSHING_KEY, PENDING_KEY
+from app.blogs.repositories.likes import PostLikeRepository
+from app.blogs.repositories.posts import PostRepository
+from core.celery_app import celery_app
+from core.db.redis_client import create_redis_client
+from core.db.session import build_task_engine
+from core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+settings = Settings()
+
+
+async def _take_pending_batch(redis_client: redis.Redis) -> dict:
+    """Move buffered toggles aside, resuming a batch a failed run left behind"""
+    if not await redis_client.exists(FLUSHING_KEY):
+        try:
+            # Atomic hand-over: toggles arriving from now on start a new hash
+            await redis_client.rename(PENDING_KEY, FLUSHING_KEY)
+        except redis.ResponseError:
+            # No toggles were buffered since the last flush
+            return {}
+    return await redis_client.hgetall(FLUSHING_KEY)
+
+
+async def _flush_pending_likes_async():
+    """Async function to write buffered like toggles in batches"""
+    # The shared client is bound to the API event loop, use a task-local one
+    redis_client = await create_redis_client()
+    if not redis_client:
+        return {"flushed_count": 0, "timestamp": datetime.utcnow().isoformat()}
+
+    # Create engine and session maker fresh for each task execution
+    # This ensures they're tied to the current event loop created by asyncio.run()
+    engine = build_task_engine()
+    AsyncSessionLocal = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    try:
+        pending = await _take_pending_batch(redis_client)
+        states = []
+        for field, liked in pending.items():
+            post_id, _, user_id = field.partition(":")
+            states.append((UUID(post_id), UUID(user_id), liked == "1"))
+
+        flushed_count = 0
+        post_ids = []
+        if states:
+            async with AsyncSessionLocal() as db:
+                try:
+                    like_repo = PostLikeRepository(db)
+                    post_repo = PostRepository(db)
+
+                    # Toggles on posts deleted meanwhile must not revive likes
+                    post_ids = list(
+                        await post_repo.get_live_ids(list({s[0] for s in states}))
+                    )
+                    states = [state for state in states if state[0] in post_ids]
+
+                    batch_size = settings.likes.flush_batch_size
+                    for start in range(0, len(states), batch_size):
+                        await like_repo.apply_states(states[start : start + batch_size])
+                    if post_ids:
+                        await post_repo.recount_likes(post_ids)
+                    await db.commit()
+                    flushed_count = len(states)
+                except Exception as e:
+                    logger.error(f"Error flushing pending likes: {e}")
+                    await db.rollback()
+                    raise
+
+            # Cached posts still carry the old like_count
+            if post_ids and post_repo.cache:
+                await post_repo.cache.invalidate_many(
+                    [str(post_id) for post_id in post_ids], redis_client
+                )
+
+        # Only drop the batch once it is committed, replaying it is harmless
+        # since it holds final states rather than deltas
+        await redis_client.delete(FLUSHING_KEY)
+
+        logger.info(f"Flushed {flushed_count} like toggles at {datetime.utcnow()}")
+        return {
+            "flushed_count": flushed_count,
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+    finally:
+        await redis_client.close()
+        # Dispose of the engine to close all connections
+        await engine.dispose()
+
+
+@celery_app.task(name="core.tasks.likes.flush_pending_likes")
+def flush_pending_likes():
+    """Write like toggles buffered in Redis to Postgres (write-behind mode)"""
+    return asyncio.run(_flush_pending_likes_async())
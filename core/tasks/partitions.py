@@ -0,0 +1,89 @@
+"""
+Celery task maintaining the monthly partitions of post and comment
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import List
+from uuid import UUID
+
+from app.blogs.services.v1.likes import like_sets
+from app.blogs.services.v1.posts import post_list_cache
+from core.cache.entity import get_entity_cache
+from core.celery_app import celery_app
+from core.db.partitions import maintain_partitions, retire_partitions
+from core.db.redis_client import create_redis_client
+from core.db.session import build_task_engine
+from core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+settings = Settings()
+
+# Posts dropped from caches per round trip
+INVALIDATE_BATCH_SIZE = 1000
+
+
+async def _invalidate_posts(post_ids: List[UUID]):
+    """Drop retired posts from the entity cache, like sets and listings"""
+    # The shared client is bound to the API event loop, use a task-local one
+    redis_client = await create_redis_client()
+    if not redis_client:
+        return
+    cache = get_entity_cache("post")
+    try:
+        for start in range(0, len(post_ids), INVALIDATE_BATCH_SIZE):
+            batch = post_ids[start : start + INVALIDATE_BATCH_SIZE]
+            if cache:
+                await cache.invalidate_many(
+                    [str(post_id) for post_id in batch], redis_client
+                )
+            await like_sets.drop_many(batch, redis_client)
+        await post_list_cache.invalidate(redis_client)
+    finally:
+        await redis_client.close()
+
+
+async def _maintain_post_partitions_async():
+    """Async function creating upcoming partitions and detaching expired ones"""
+    engine = build_task_engine()
+    try:
+        async with engine.connect() as conn:
+            # DETACH PARTITION CONCURRENTLY cannot run inside a transaction
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            # Retired posts leave the caches before their partition goes, so a
+            # failed detach does not leave them cached as live
+            retired = await conn.run_sync(
+                retire_partitions,
+                retention_days=settings.database.partition_retention_days,
+            )
+            if retired:
+                await _invalidate_posts(retired)
+            result = await conn.run_sync(
+                maintain_partitions,
+                months_ahead=settings.database.partition_months_ahead,
+                retention_days=settings.database.partition_retention_days,
+                archive=settings.database.partition_archive,
+            )
+        # Rows that reached old partitions in between
+        late = list(set(result.pop("retired")) - set(retired))
+        if late:
+            await _invalidate_posts(late)
+        logger.info(
+            f"Created partitions {result['created']}, detached {result['detached']}, "
+            f"retired {len(retired) + len(late)} posts at {datetime.utcnow()}"
+        )
+        return {**result, "timestamp": datetime.utcnow().isoformat()}
+    except Exception as e:
+        logger.error(f"Error maintaining post partitions: {e}")
+        raise
+    finally:
+        # Dispose of the engine to close all connections
+        await engine.dispose()
+
+
+@celery_app.task(name="core.tasks.partitions.maintain_post_partitions")
+def maintain_post_partitions():
+    """Pre-create and retire monthly post/comment partitions (runs daily)"""
+    return asyncio.run(_maintain_post_partitions_async())
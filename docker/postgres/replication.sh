@@ -0,0 +1,5 @@
+#!/bin/sh
+# Let the db_replica service stream from this server. Init scripts only run
+# on an empty data volume
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
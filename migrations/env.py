@@ -0,0 +1,77 @@
+"""
+Alembic environment: runs migrations over asyncpg against settings.postgres
+An advisory lock serializes concurrent runs, e.g. several app instances
+starting at once
+"""
+
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import pool, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+
+# Import all models to register them with SQLModel metadata
+from app.auth.models.verification import EmailVerification  # noqa: F401
+from app.blogs.models.posts import Comment, Post, PostLike  # noqa: F401
+from app.users.models.users import User  # noqa: F401
+from core.settings import Settings
+
+settings = Settings()
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get(
+    "configure_logger", True
+):
+    fileConfig(config.config_file_name)
+
+target_metadata = SQLModel.metadata
+
+# Arbitrary key shared by every migration run
+MIGRATION_LOCK_ID = 0x5E17B106
+
+
+def run_migrations_offline() -> None:
+    """Emit the migration SQL without connecting"""
+    context.configure(
+        url=settings.postgres.adsn,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+    # Release the implicit transaction, migrations manage their own
+    connection.commit()
+    try:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+    finally:
+        connection.execute(
+            text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID}
+        )
+        connection.commit()
+
+
+async def run_async_migrations() -> None:
+    engine = create_async_engine(settings.postgres.adsn, poolclass=pool.NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+def run_migrations_online() -> None:
+    asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,114 @@
+"""counters, search and like key
+
+Brings a baseline database to the post and postlike schema the services
+expect: like_count and comment_count backfilled from the live likes and
+comments, the generated search_vector with its GIN index, and postlike keyed
+by (user_id, post_id). The baseline key (id, user_id, post_id) let a user
+like a post more than once, those rows are merged first, keeping a live one
+if any
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 10:12:36.518904
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from core.settings import Settings
+
+settings = Settings()
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same expression as Post.search_vector, in the configured search language
+SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{settings.search.language}'::regconfig, "
+    f"coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{settings.search.language}'::regconfig, "
+    f"coalesce(content, '')), 'B')"
+)
+
+# One row per (user_id, post_id): live before deleted, then the latest
+MERGE_DUPLICATE_LIKES = """
+DELETE FROM postlike WHERE ctid IN (
+    SELECT ctid FROM (
+        SELECT ctid, row_number() OVER (
+            PARTITION BY user_id, post_id ORDER BY is_deleted, updated_at DESC
+        ) AS rank
+        FROM postlike
+    ) ranked
+    WHERE rank > 1
+)
+"""
+
+# Same counts as PostRepository.reconcile_counters
+BACKFILL_COUNTERS = """
+UPDATE post SET
+    like_count = (
+        SELECT count(*) FROM postlike
+        WHERE postlike.post_id = post.id AND postlike.is_deleted IS false
+    ),
+    comment_count = (
+        SELECT count(*) FROM comment
+        WHERE comment.post_id = post.id AND comment.is_deleted IS false
+    )
+"""
+
+
+def upgrade() -> None:
+    op.add_column(
+        "post",
+        sa.Column(
+            "like_count", sa.Integer(), server_default=sa.text("0"), nullable=False
+        ),
+    )
+    op.add_column(
+        "post",
+        sa.Column(
+            "comment_count", sa.Integer(), server_default=sa.text("0"), nullable=False
+        ),
+    )
+    op.add_column(
+        "post",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(SEARCH_VECTOR, persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "ix_post_search_vector",
+        "post",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+    op.execute(MERGE_DUPLICATE_LIKES)
+    op.drop_index(op.f("ix_postlike_id"), table_name="postlike")
+    op.drop_constraint("postlike_pkey", "postlike", type_="primary")
+    op.create_primary_key("postlike_pkey", "postlike", ["user_id", "post_id"])
+    op.create_unique_constraint("postlike_id_key", "postlike", ["id"])
+
+    op.execute(BACKFILL_COUNTERS)
+
+
+def downgrade() -> None:
+    # Merged likes are not split again
+    op.drop_constraint("postlike_id_key", "postlike", type_="unique")
+    op.drop_constraint("postlike_pkey", "postlike", type_="primary")
+    op.create_primary_key("postlike_pkey", "postlike", ["id", "user_id", "post_id"])
+    op.create_index(op.f("ix_postlike_id"), "postlike", ["id"], unique=False)
+
+    op.drop_index("ix_post_search_vector", table_name="post", postgresql_using="gin")
+    op.drop_column("post", "search_vector")
+    op.drop_column("post", "comment_count")
+    op.drop_column("post", "like_count")
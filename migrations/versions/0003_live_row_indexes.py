@@ -0,0 +1,83 @@
+"""live row indexes
+
+Partial indexes matching the repositories' is_deleted IS false filters, an
+"is_deleted = false" predicate is never chosen for them. Drops the secondary
+indexes duplicating primary keys. Indexes are built CONCURRENTLY, new ones
+before the old are dropped, so writes are never blocked and reads always
+have an index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 08:10:41.182390
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIVE = sa.text("is_deleted IS false")
+
+# (name, table, columns, predicate)
+NEW_INDEXES = [
+    ("ix_users_username_live", "users", ["username"], LIVE),
+    (
+        "ix_email_verification_created_at_pending",
+        "email_verification",
+        ["created_at"],
+        sa.text("is_verified IS false AND is_deleted IS false"),
+    ),
+    ("ix_post_created_at_id_live", "post", ["created_at", "id"], LIVE),
+    ("ix_post_user_id_live", "post", ["user_id"], LIVE),
+    (
+        "ix_comment_post_id_created_at_id_live",
+        "comment",
+        ["post_id", "created_at", "id"],
+        LIVE,
+    ),
+    ("ix_comment_post_id", "comment", ["post_id"], None),
+    ("ix_postlike_post_id_user_id_live", "postlike", ["post_id", "user_id"], LIVE),
+]
+
+OLD_INDEXES = [
+    ("ix_users_id", "users", ["id"], None),
+    ("ix_email_verification_id", "email_verification", ["id"], None),
+    ("ix_post_id", "post", ["id"], None),
+    ("ix_comment_id", "comment", ["id"], None),
+]
+
+
+def _create(indexes) -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in indexes:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_where=where,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def _drop(indexes) -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in indexes:
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
+
+
+def upgrade() -> None:
+    _create(NEW_INDEXES)
+    _drop(OLD_INDEXES)
+
+
+def downgrade() -> None:
+    _create(OLD_INDEXES)
+    _drop(NEW_INDEXES)
@@ -2,8 +2,11 @@
 Pytest configuration and fixtures
 """
 
+import fakeredis
 import pytest
+from fakeredis import aioredis as fake_aioredis
 from httpx import AsyncClient
+from redis.asyncio import BlockingConnectionPool
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
@@ -13,6 +16,7 @@ from app.auth.models.verification import EmailVerification  # noqa: F401
 from app.blogs.models.posts import Comment, Post, PostLike  # noqa: F401
 from app.main import app
 from app.users.models.users import User  # noqa: F401
+from core.db import redis_client
 from core.settings import Settings
 
 settings = Settings()
@@ -71,3 +75,21 @@ async def setup_db(test_engine):
     yield
     async with test_engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.drop_all)
+
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+    """In-memory Redis used as the shared client by caches, limits and lockouts"""
+    pool = BlockingConnectionPool(
+        connection_class=fake_aioredis.FakeAsyncRedisConnection,
+        server=fakeredis.FakeServer(),
+        decode_responses=True,
+        max_connections=10,
+    )
+    client = redis_client.ManagedRedis(
+        connection_pool=pool,
+        breaker=redis_client.CircuitBreaker(threshold=3, backoff=0.05, backoff_max=0.2),
+    )
+    monkeypatch.setattr(redis_client, "_redis_client", client)
+    yield client
+    await client.close()
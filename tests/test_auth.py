@@ -2,8 +2,38 @@
 Integration tests for authentication endpoints
 """
 
+import asyncio
+from uuid import uuid4
+
 import pytest
+import redis.asyncio as redis
+from fastapi import HTTPException
 from httpx import AsyncClient
+from sqlalchemy import event, text
+from sqlmodel import select
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+import core.cache.local
+import core.security.rate_limit
+from app import main
+from app.auth.schemas.auth import UserCreate
+from app.auth.services.auth import AuthService
+from app.auth.services.verification import VerificationService
+from app.users.models.users import User
+from app.users.repositories.users import UserRepository
+from core.db import session as db_session_module
+from core.db.redis_client import CircuitBreaker, ManagedRedis, RedisUnavailableError
+from core.db.replicas import PIN_PREFIX, is_pinned_to_primary
+from core.db.session import RoutingAsyncSession, engine, warm_up_pool
+from core.db.unit_of_work import commit
+from core.middleware.rate_limit import RateLimitMiddleware
+from core.security.brute_force import BruteForceProtection
+from core.security.password import PasswordHasher, pwd_context
+from core.security.rate_limit import LeasingRateLimiter, RateLimiter, RateLimitRule
+from core.settings import Settings
 
 
 @pytest.mark.asyncio
@@ -25,6 +55,26 @@ async def test_register_user(client: AsyncClient):
     assert data["message"] == "User registered successfully. Please verify your email."
 
 
+@pytest.mark.asyncio
+async def test_register_commits_once(client: AsyncClient, test_engine):
+    """Test user and verification rows are written in a single transaction"""
+    if not Settings().database.unit_of_work:
+        pytest.skip("repositories commit eagerly")
+    commits = []
+    event.listen(test_engine.sync_engine, "commit", lambda conn: commits.append(1))
+    response = await client.post(
+        "/api/auth/register",
+        json={
+            "email": "once@example.com",
+            "full_name": "test user",
+            "username": "onceuser",
+            "password": "testpass123",
+        },
+    )
+    assert response.status_code == 201
+    assert len(commits) == 1
+
+
 @pytest.mark.asyncio
 async def test_register_duplicate_username(client: AsyncClient):
     """Test registration with duplicate username"""
@@ -159,3 +209,404 @@ async def test_get_current_user_unauthenticated(client: AsyncClient):
     """Test getting current user without authentication"""
     response = await client.get("/api/user/me")
     assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_security_headers(client: AsyncClient):
+    """Test API responses get every security header, docs only the minimal one"""
+    response = await client.get("/api/user/me")
+    assert response.headers["x-frame-options"] == "DENY"
+    assert response.headers["content-security-policy"] == "default-src 'self'"
+    assert response.headers.get_list("x-content-type-options") == ["nosniff"]
+
+    response = await client.get("/openapi.json")
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert "x-frame-options" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_principal_follows_verification_and_email_change(
+    client: AsyncClient, test_engine, fake_redis
+):
+    """Test principals are served from cache and dropped when the user changes"""
+    user_data = {
+        "email": "test@example.com",
+        "full_name": "test user",
+        "username": "testuser",
+        "password": "testpass123",
+    }
+    register_response = await client.post("/api/auth/register", json=user_data)
+    verification_token = register_response.json()["verification_token"]
+    login_response = await client.post(
+        "/api/auth/login", json={"email": "test@example.com", "password": "testpass123"}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    users_queries = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement:
+            users_queries.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        # Authenticated while unverified: the first request caches the principal
+        post_data = {"title": "First post", "content": "content"}
+        response = await client.post("/api/blog/", json=post_data, headers=headers)
+        assert response.status_code == 403
+        assert len(users_queries) == 1
+        assert await fake_redis.get("principal:test@example.com") is not None
+
+        # and the next one is answered from it
+        response = await client.post("/api/blog/", json=post_data, headers=headers)
+        assert response.status_code == 403
+        assert len(users_queries) == 1
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", record)
+
+    # Verifying drops the entry once committed
+    await client.post(f"/api/auth/verify-email/{verification_token}")
+    assert await fake_redis.get("principal:test@example.com") is None
+    response = await client.post("/api/blog/", json=post_data, headers=headers)
+    assert response.status_code == 200
+
+    # Tokens issued for the old email stop resolving after an email change
+    response = await client.put(
+        "/api/user/me", json={"email": "new@example.com"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert await fake_redis.get("principal:test@example.com") is None
+    response = await client.get("/api/user/me", headers=headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_password(client: AsyncClient, db_session):
+    """Test a hash made with fewer bcrypt rounds is upgraded on login"""
+    user_data = {
+        "email": "test@example.com",
+        "full_name": "test user",
+        "username": "testuser",
+        "password": "testpass123",
+    }
+    await client.post("/api/auth/register", json=user_data)
+    user = (await db_session.exec(select(User))).one()
+    user.password = pwd_context.handler().using(rounds=4).hash("testpass123")
+    await db_session.commit()
+
+    login_data = {"email": "test@example.com", "password": "testpass123"}
+    response = await client.post("/api/auth/login", json=login_data)
+    assert response.status_code == 200
+    await db_session.refresh(user)
+    assert not pwd_context.needs_update(user.password)
+    assert pwd_context.verify("testpass123", user.password)
+
+
+@pytest.mark.asyncio
+async def test_token_less_writes_pin_the_user(test_engine, fake_redis, monkeypatch):
+    """Test register, verification and rehashing logins pin reads by email"""
+    # Pins are only taken while replicas are configured
+    monkeypatch.setattr(db_session_module.replicas, "engines", [test_engine])
+    email = "test@example.com"
+
+    async with RoutingAsyncSession(test_engine, expire_on_commit=False) as session:
+        registered = await AuthService(session).register(
+            UserCreate(
+                email=email,
+                full_name="test user",
+                username="testuser",
+                password="testpass123",
+            )
+        )
+        await commit(session)
+    assert await is_pinned_to_primary(email)
+
+    await fake_redis.delete(f"{PIN_PREFIX}{email}")
+    async with RoutingAsyncSession(test_engine, expire_on_commit=False) as session:
+        await VerificationService(session).verify_email(
+            registered["verification_token"]
+        )
+        await commit(session)
+    assert await is_pinned_to_primary(email)
+
+    await fake_redis.delete(f"{PIN_PREFIX}{email}")
+    async with RoutingAsyncSession(test_engine, expire_on_commit=False) as session:
+        repo = UserRepository(session)
+        user = await repo.get_by_email(email)
+        await repo.update(
+            user, {"password": pwd_context.handler().using(rounds=4).hash("x" * 8)}
+        )
+        await commit(session)
+    await fake_redis.delete(f"{PIN_PREFIX}{email}")
+    async with RoutingAsyncSession(test_engine, expire_on_commit=False) as session:
+        await AuthService(session).login(email, "x" * 8)
+        await commit(session)
+    assert await is_pinned_to_primary(email)
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_sheds_load():
+    """Test calls beyond workers + queue limit are rejected with 503"""
+    hasher = PasswordHasher(pwd_context, workers=1, queue_limit=1)
+    results = await asyncio.gather(
+        *(hasher.hash("testpass123") for _ in range(3)), return_exceptions=True
+    )
+    hasher.shutdown()
+
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert [error.status_code for error in rejected] == [503]
+    assert hasher.stats()["calls"] == 2 and hasher.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_circuit_breaker_fails_fast():
+    """Test commands fail without a round trip once the breaker is open"""
+    # Nothing listens on port 1, connecting is refused
+    client = ManagedRedis(
+        host="127.0.0.1",
+        port=1,
+        socket_connect_timeout=0.5,
+        breaker=CircuitBreaker(threshold=2, backoff=60, backoff_max=60),
+    )
+    for _ in range(2):
+        with pytest.raises(redis.ConnectionError):
+            await client.get("key")
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(RedisUnavailableError):
+        await client.get("key")
+    with pytest.raises(RedisUnavailableError):
+        async with client.pipeline() as pipe:
+            await pipe.get("key").execute()
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_pool_applies_server_settings():
+    """Test warmed connections stay pooled and carry the configured settings"""
+    try:
+        assert await warm_up_pool(2) == 2
+        assert engine.pool.checkedin() == 2
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SHOW jit"))).scalar() == "off"
+    finally:
+        # The shared engine is bound to this test's event loop
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["fixed_window", "sliding_log", "gcra"])
+async def test_leases_outlive_spaced_requests(fake_redis, monkeypatch, algorithm):
+    """Test a client spacing requests past lease_ttl still gets its whole limit"""
+
+    class Clock:
+        now = 0.0
+
+        def monotonic(self) -> float:
+            return self.now
+
+    clock = Clock()
+    monkeypatch.setattr(core.cache.local, "time", clock)
+    monkeypatch.setattr(core.security.rate_limit, "time", clock)
+
+    limiter = LeasingRateLimiter(
+        RateLimiter(algorithm), tolerance=0.1, lease_ttl=0.2, max_buckets=10
+    )
+    rule = RateLimitRule(limit=100, window=60)
+    allowed = []
+    for _ in range(101):
+        allowed.append((await limiter.hit(fake_redis, "spaced", rule)).allowed)
+        clock.now += 0.5
+    assert allowed == [True] * 100 + [False]
+    # One lease per chunk of 10, then the refusal
+    assert limiter.remote_calls == 11
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["fixed_window", "sliding_log", "gcra"])
+async def test_evicted_lease_is_refunded(fake_redis, algorithm):
+    """Test unspent units of an evicted lease go back to the Redis bucket"""
+    limiter = LeasingRateLimiter(
+        RateLimiter(algorithm), tolerance=0.1, lease_ttl=1, max_buckets=1
+    )
+    rule = RateLimitRule(limit=100, window=60)
+    await limiter.hit(fake_redis, "first", rule)
+    # Leasing for a second bucket evicts the first lease, 9 units unspent
+    await limiter.hit(fake_redis, "second", rule)
+    assert limiter.stats()["refunded"] == 9
+
+    result = await RateLimiter(algorithm).hit(fake_redis, "first", rule)
+    assert result.remaining == 98
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["pair", "ip_and_email"])
+async def test_brute_force_lockout(fake_redis, mode):
+    """Test login attempts lock out at the limit per mode and unlock afterwards"""
+    guard = BruteForceProtection(fake_redis)
+    guard.mode = mode
+    guard.max_attempts, guard.ip_max_attempts = 3, 5
+    guard.lockout_duration = 1
+
+    for _ in range(3):
+        await guard.register_attempt("10.0.0.1", "victim@example.com")
+    with pytest.raises(HTTPException) as error:
+        await guard.register_attempt("10.0.0.1", "victim@example.com")
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "1"
+
+    if mode == "pair":
+        # Only this IP and email pair is locked
+        await guard.register_attempt("10.0.0.2", "victim@example.com")
+        await guard.register_attempt("10.0.0.1", "other@example.com")
+    else:
+        # The email is locked from every IP
+        with pytest.raises(HTTPException):
+            await guard.register_attempt("10.0.0.2", "victim@example.com")
+        # and the IP once it tried ip_max_attempts emails in all
+        await guard.register_attempt("10.0.0.1", "first@example.com")
+        await guard.register_attempt("10.0.0.1", "second@example.com")
+        with pytest.raises(HTTPException):
+            await guard.register_attempt("10.0.0.1", "third@example.com")
+
+    await asyncio.sleep(1.1)
+    await guard.register_attempt("10.0.0.1", "victim@example.com")
+
+
+@pytest.mark.asyncio
+async def test_successful_login_resets_attempts(fake_redis):
+    """Test a success clears the email counter and takes one off the IP counter"""
+    guard = BruteForceProtection(fake_redis)
+    guard.mode = "ip_and_email"
+    for _ in range(3):
+        await guard.register_attempt("10.0.0.1", "user@example.com")
+    await guard.record_successful_login("10.0.0.1", "user@example.com")
+
+    assert await fake_redis.get("brute_force:email:user@example.com") is None
+    assert await fake_redis.get("brute_force:ip:10.0.0.1") == "2"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["fixed_window", "sliding_log", "gcra"])
+async def test_rate_limit_algorithms(fake_redis, algorithm):
+    """Test each script allows up to the limit, refuses, and frees up again"""
+    limiter = RateLimiter(algorithm)
+    rule = RateLimitRule(limit=3, window=1)
+    results = [await limiter.hit(fake_redis, "bucket", rule) for _ in range(4)]
+    assert [result.allowed for result in results] == [True, True, True, False]
+    assert [result.remaining for result in results] == [2, 1, 0, 0]
+    assert results[3].retry_after >= 1
+
+    # A partial grant when fewer units are left than requested
+    partial = await limiter.hit(fake_redis, "partial", rule, requested=5)
+    assert (partial.granted, partial.remaining) == (3, 0)
+
+    await asyncio.sleep(1.1)
+    assert (await limiter.hit(fake_redis, "bucket", rule)).allowed
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_middleware_refuses_over_limit(fake_redis):
+    """Test the middleware sends RateLimit headers and a 429 with Retry-After"""
+
+    async def hello(request):
+        return PlainTextResponse("hello")
+
+    limited = Starlette(
+        routes=[Route("/hello", hello)],
+        middleware=[
+            Middleware(
+                RateLimitMiddleware,
+                redis_client=fake_redis,
+                rules={"/hello": RateLimitRule(limit=2, window=60)},
+                local_leases=False,
+            )
+        ],
+    )
+    async with AsyncClient(app=limited, base_url="http://test") as client:
+        responses = [await client.get("/hello") for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert responses[0].headers["ratelimit-policy"] == "2;w=60"
+    assert responses[0].headers["ratelimit-remaining"] == "1"
+    assert int(responses[2].headers["retry-after"]) >= 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_buckets_by_route_template(client: AsyncClient, fake_redis):
+    """Test path parameters share one bucket per route and unmatched paths one"""
+    for _ in range(3):
+        response = await client.get(f"/api/blog/{uuid4()}")
+    assert response.headers["ratelimit-remaining"] == "97"
+    await client.get("/no/such/path")
+    await client.get("/another/missing/path")
+    response = await client.post(
+        "/api/auth/login", json={"email": "user@example.com", "password": "x"}
+    )
+    assert response.headers["ratelimit-policy"] == "5;w=60"
+
+    assert sorted(await fake_redis.keys("rate_limit:*")) == [
+        "rate_limit:gcra:GET /api/blog/{post_id}|ip:127.0.0.1",
+        "rate_limit:gcra:GET <unmatched>|ip:127.0.0.1",
+        "rate_limit:gcra:POST /api/auth/login|ip:127.0.0.1",
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["fixed_window", "sliding_log", "gcra"])
+async def test_lease_accounting(fake_redis, algorithm):
+    """Test leased chunks are spent locally, exactly up to the limit"""
+    limiter = LeasingRateLimiter(
+        RateLimiter(algorithm), tolerance=0.1, lease_ttl=5, max_buckets=10
+    )
+    rule = RateLimitRule(limit=100, window=60)
+    results = [await limiter.hit(fake_redis, "bucket", rule) for _ in range(101)]
+    assert [result.allowed for result in results] == [True] * 100 + [False]
+    # Remaining counts the units this worker still holds
+    assert [result.remaining for result in results[:12]] == list(range(99, 87, -1))
+    assert limiter.remote_calls == 11 and limiter.local_hits == 90
+
+    # The refusal is remembered
+    assert not (await limiter.hit(fake_redis, "bucket", rule)).allowed
+    assert limiter.remote_calls == 11
+
+    # Small limits lease one unit at a time and stay exact
+    small = RateLimitRule(limit=5, window=60)
+    results = [await limiter.hit(fake_redis, "small", small) for _ in range(6)]
+    assert [result.allowed for result in results] == [True] * 5 + [False]
+
+    # Concurrent requests on a drained bucket wait for a single lease
+    calls = limiter.remote_calls
+    results = await asyncio.gather(
+        *(limiter.hit(fake_redis, "concurrent", rule) for _ in range(50))
+    )
+    assert all(result.allowed for result in results)
+    assert limiter.remote_calls - calls == 5
+
+
+@pytest.mark.asyncio
+async def test_metrics_report_worker_stats(
+    client: AsyncClient, fake_redis, monkeypatch
+):
+    """Test worker counters are served to metrics token holders, not on /health"""
+    limiter = LeasingRateLimiter(
+        RateLimiter("gcra"), tolerance=0.1, lease_ttl=1, max_buckets=10
+    )
+    await limiter.hit(fake_redis, "bucket", RateLimitRule(limit=100, window=60))
+    await client.get("/api/blog/")
+
+    assert (await client.get("/health")).json() == {"status": "ok"}
+    # Disabled without a configured token
+    response = await client.get("/internal/metrics")
+    assert response.status_code == 404
+
+    monkeypatch.setattr(main.settings.metrics, "token", "metrics-secret")
+    for headers in ({}, {"X-Metrics-Token": "wrong"}):
+        response = await client.get("/internal/metrics", headers=headers)
+        assert response.status_code == 404
+    headers = {"X-Metrics-Token": "metrics-secret"}
+    data = (await client.get("/internal/metrics", headers=headers)).json()
+    assert data["redis"]["state"] == "closed"
+    assert data["post_list_cache"]["misses"] >= 1
+    assert {"calls", "rejected", "pending"} <= set(data["password_hasher"])
+    assert data["rate_limit_leases"]["remote_calls"] >= 1
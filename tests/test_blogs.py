@@ -0,0 +1,1091 @@
+"""
+Integration tests for blog endpoints
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from fakeredis import aioredis as fake_aioredis
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from httpx import AsyncClient
+from jose import jwt
+from sqlalchemy import event, text, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.auth.dependencies.jwt import JwtBearer
+from app.auth.dependencies.principal import Principal
+from app.auth.repositories.verification import VerificationRepository
+from app.blogs.models.posts import Comment, Post, PostLike
+from app.blogs.repositories.comments import CommentRepository
+from app.blogs.repositories.likes import PostLikeRepository
+from app.blogs.repositories.posts import PostRepository
+from app.blogs.schemas.comments import CommentCreateSchema
+from app.blogs.services.v1.comments import CommentService
+from app.blogs.services.v1.likes import PostLikeService
+from app.blogs.services.v1.posts import PostService, post_list_cache
+from app.users.models.users import User
+from app.users.repositories.users import UserRepository
+from core.cache.invalidation import CHANNEL, InvalidationBus, invalidation_bus
+from core.cache.two_tier import TwoTierCache
+from core.cache.versioned import VersionedCache
+from core.db import partitions as partitions_module
+from core.db.explain import explain, seq_scans
+from core.db.migrations import downgrade, upgrade
+from core.db.partitions import (
+    add_months,
+    is_partitioned,
+    maintain_partitions,
+    month_start,
+    partition,
+    partition_name,
+    partitions,
+    retire_partitions,
+    unpartition,
+)
+from core.db.session import DATABASE_URL, RoutingAsyncSession
+from core.db.unit_of_work import commit
+from core.pagination import PREV, encode_cursor
+from core.settings import Settings
+from core.tasks import partitions as partition_tasks
+
+
+async def create_verified_user(
+    client: AsyncClient, email: str = "author@example.com", username: str = "author1"
+) -> dict:
+    """Register, verify and log in a user, returning auth headers"""
+    user_data = {
+        "email": email,
+        "full_name": "test author",
+        "username": username,
+        "password": "testpass123",
+    }
+    register_response = await client.post("/api/auth/register", json=user_data)
+    token = register_response.json()["verification_token"]
+    await client.post(f"/api/auth/verify-email/{token}")
+
+    login_response = await client.post(
+        "/api/auth/login", json={"email": email, "password": "testpass123"}
+    )
+    return {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+
+async def create_posts(client: AsyncClient, headers: dict, count: int) -> list:
+    """Create posts with distinct titles, returning their ids in creation order"""
+    ids = []
+    for i in range(count):
+        response = await client.post(
+            "/api/blog/",
+            json={"title": f"Post number {i}", "content": f"content {i}"},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_list_posts_cursor_pagination(client: AsyncClient):
+    """Test walking the post listing forwards and backwards with cursors"""
+    headers = await create_verified_user(client)
+    ids = await create_posts(client, headers, 5)
+    newest_first = list(reversed(ids))
+
+    response = await client.get("/api/blog/", params={"limit": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["id"] for item in data["items"]] == newest_first[:2]
+    assert data["total"] == 5
+    assert data["prev_cursor"] is None
+
+    seen = [item["id"] for item in data["items"]]
+    cursor = data["next_cursor"]
+    while cursor:
+        data = (
+            await client.get("/api/blog/", params={"limit": 2, "cursor": cursor})
+        ).json()
+        seen.extend(item["id"] for item in data["items"])
+        cursor = data["next_cursor"]
+    assert seen == newest_first
+
+    # Walk back from the last page
+    data = (
+        await client.get(
+            "/api/blog/", params={"limit": 2, "cursor": data["prev_cursor"]}
+        )
+    ).json()
+    assert [item["id"] for item in data["items"]] == newest_first[2:4]
+
+
+@pytest.mark.asyncio
+async def test_list_posts_invalid_cursor(client: AsyncClient):
+    """Test listing posts with a malformed cursor"""
+    response = await client.get("/api/blog/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_list_posts_full_text_search(client: AsyncClient):
+    """Test stemmed, ranked search over latin and cyrillic posts"""
+    headers = await create_verified_user(client)
+    posts = [
+        ("Running tips", "how to start running every morning"),
+        ("Garden notes", "tomatoes need sun and water to grow"),
+        ("Бегущие собаки", "собаки бегут по парку"),
+    ]
+    for title, content in posts:
+        response = await client.post(
+            "/api/blog/", json={"title": title, "content": content}, headers=headers
+        )
+        assert response.status_code == 200
+
+    response = await client.get(
+        "/api/blog/", params={"search": "runs", "sort": "relevance"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 1
+    assert data["items"][0]["title"] == "Running tips"
+    assert data["items"][0]["rank"] > 0
+    assert "<mark>" in data["items"][0]["headline"]
+
+    response = await client.get("/api/blog/", params={"search": "собака"})
+    data = response.json()
+    assert [item["title"] for item in data["items"]] == ["Бегущие собаки"]
+
+
+@pytest.mark.asyncio
+async def test_list_posts_count_modes(client: AsyncClient):
+    """Test exact, estimated and skipped totals on the post listing"""
+    headers = await create_verified_user(client)
+    await create_posts(client, headers, 3)
+
+    data = (await client.get("/api/blog/", params={"limit": 2})).json()
+    assert data["total"] == 3
+    assert data["has_more"] is True
+
+    # Exact totals still work past the last page and in cursor mode
+    data = (await client.get("/api/blog/", params={"skip": 5})).json()
+    assert data["items"] == []
+    assert data["total"] == 3
+    data = (await client.get("/api/blog/", params={"limit": 2})).json()
+    data = (
+        await client.get(
+            "/api/blog/", params={"limit": 2, "cursor": data["next_cursor"]}
+        )
+    ).json()
+    assert data["total"] == 3
+    assert data["has_more"] is False
+
+    data = (
+        await client.get("/api/blog/", params={"limit": 2, "count_mode": "none"})
+    ).json()
+    assert data["total"] is None
+    assert data["has_more"] is True
+
+    response = await client.get("/api/blog/", params={"count_mode": "estimated"})
+    assert response.status_code == 200
+    assert isinstance(response.json()["total"], int)
+
+
+@pytest.mark.asyncio
+async def test_get_post_conditional_requests(client: AsyncClient):
+    """Test ETag and Last-Modified revalidation of a single post"""
+    headers = await create_verified_user(client)
+    [post_id] = await create_posts(client, headers, 1)
+
+    response = await client.get(f"/api/blog/{post_id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+    assert response.headers["cache-control"].startswith("public")
+
+    response = await client.get(f"/api/blog/{post_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = await client.get(
+        f"/api/blog/{post_id}", headers={"If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 304
+
+    await client.put(
+        f"/api/blog/{post_id}", json={"title": "Updated title"}, headers=headers
+    )
+    response = await client.get(f"/api/blog/{post_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_list_comments_and_posts_etag(client: AsyncClient):
+    """Test revalidation of the comment and post listings"""
+    headers = await create_verified_user(client)
+    [post_id] = await create_posts(client, headers, 1)
+
+    response = await client.get(f"/api/blog/{post_id}/comments")
+    etag = response.headers["etag"]
+    await client.post(
+        f"/api/blog/{post_id}/comments", json={"text": "first"}, headers=headers
+    )
+    response = await client.get(
+        f"/api/blog/{post_id}/comments", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    response = await client.get(
+        f"/api/blog/{post_id}/comments", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    response = await client.get("/api/blog/")
+    response = await client.get(
+        "/api/blog/", headers={"If-None-Match": response.headers["etag"]}
+    )
+    assert response.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_comment_cursor_pagination(client: AsyncClient):
+    """Test comments are paged oldest first through next_cursor"""
+    headers = await create_verified_user(client)
+    [post_id] = await create_posts(client, headers, 1)
+    for i in range(5):
+        await client.post(
+            f"/api/blog/{post_id}/comments", json={"text": f"c{i}"}, headers=headers
+        )
+
+    texts, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = await client.get(f"/api/blog/{post_id}/comments", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["limit"] == 2
+        texts += [comment["text"] for comment in data["items"]]
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert texts == [f"c{i}" for i in range(5)]
+
+    response = await client.get(
+        f"/api/blog/{post_id}/comments", params={"cursor": "garbage"}
+    )
+    assert response.status_code == 400
+
+    # Comments only page forward, a post listing PREV cursor is refused
+    prev = encode_cursor(datetime.utcnow(), uuid4(), PREV)
+    response = await client.get(
+        f"/api/blog/{post_id}/comments", params={"cursor": prev}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_post_like_and_comment_counters(client: AsyncClient, db_session):
+    """Test counters follow likes/comments and drift is repaired in bulk"""
+    author = await create_verified_user(client)
+    reader = await create_verified_user(client, "reader@example.com", "reader1")
+    [post_id] = await create_posts(client, author, 1)
+
+    await client.post(f"/api/blog/{post_id}/like", headers=reader)
+    await client.post(
+        f"/api/blog/{post_id}/comments", json={"text": "nice"}, headers=reader
+    )
+    data = (await client.get(f"/api/blog/{post_id}")).json()
+    assert (data["like_count"], data["comment_count"]) == (1, 1)
+
+    await client.post(f"/api/blog/{post_id}/like", headers=reader)
+    await client.delete(f"/api/blog/{post_id}/comments", headers=author)
+    data = (await client.get(f"/api/blog/{post_id}")).json()
+    assert (data["like_count"], data["comment_count"]) == (0, 0)
+
+    # Simulate drift and let the reconciliation repair it
+
+    await db_session.exec(update(Post).values(like_count=7, comment_count=3))
+    repaired = await PostRepository(db_session).reconcile_counters()
+    await db_session.commit()
+    assert [str(post_id) for post_id in repaired] == [post_id]
+    data = (await client.get(f"/api/blog/{post_id}")).json()
+    assert (data["like_count"], data["comment_count"]) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_delete_post_cascades(client: AsyncClient, db_session):
+    """Test deleting a post soft deletes its comments and likes in bulk"""
+    author = await create_verified_user(client)
+    reader = await create_verified_user(client, "reader@example.com", "reader1")
+    [post_id, other_id] = await create_posts(client, author, 2)
+    for target in (post_id, other_id):
+        await client.post(f"/api/blog/{target}/like", headers=reader)
+        for i in range(3):
+            await client.post(
+                f"/api/blog/{target}/comments", json={"text": f"c{i}"}, headers=reader
+            )
+
+    response = await client.delete(f"/api/blog/{post_id}", headers=author)
+    assert response.status_code == 204
+
+    for model in (Comment, PostLike):
+        statement = (
+            select(model.post_id, func.count())
+            .where(model.is_deleted.is_(False))
+            .group_by(model.post_id)
+        )
+        rows = (await db_session.exec(statement)).all()
+        assert [str(row[0]) for row in rows] == [other_id]
+
+
+@pytest.mark.asyncio
+async def test_like_toggle_reuses_like_row(client: AsyncClient, db_session):
+    """Test liking again after an unlike flips the same (user, post) row"""
+    author = await create_verified_user(client)
+    reader = await create_verified_user(client, "reader@example.com", "reader1")
+    [post_id] = await create_posts(client, author, 1)
+
+    results = []
+    for _ in range(3):
+        response = await client.post(f"/api/blog/{post_id}/like", headers=reader)
+        assert response.status_code == 200
+        data = response.json()
+        results.append((data["liked"], data["like_count"]))
+    assert results == [(True, 1), (False, 0), (True, 1)]
+
+    response = await client.get(f"/api/blog/{post_id}/like", headers=reader)
+    assert response.json() == {"liked": True}
+    rows = (await db_session.exec(select(func.count()).select_from(PostLike))).one()
+    assert rows == 1
+
+    response = await client.post(f"/api/blog/{post_id}/like", headers=author)
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_batch_like_states_and_liked_by_me(client: AsyncClient):
+    """Test like states of several posts come back in one call"""
+    settings = Settings()
+    author = await create_verified_user(client)
+    reader = await create_verified_user(client, "reader@example.com", "reader1")
+    post_ids = await create_posts(client, author, 3)
+    await client.post(f"/api/blog/{post_ids[1]}/like", headers=reader)
+
+    response = await client.get(
+        "/api/blog/likes", params={"post_ids": post_ids}, headers=reader
+    )
+    assert response.status_code == 200
+    states = {item["post_id"]: item for item in response.json()["items"]}
+    assert [states[post_id]["liked"] for post_id in post_ids] == [False, True, False]
+    assert [states[post_id]["like_count"] for post_id in post_ids] == [0, 1, 0]
+
+    response = await client.get(
+        "/api/blog/", params={"include": "liked_by_me"}, headers=reader
+    )
+    liked = {item["id"]: item["liked_by_me"] for item in response.json()["items"]}
+    assert liked == {post_ids[0]: False, post_ids[1]: True, post_ids[2]: False}
+    assert response.headers["cache-control"].startswith("private")
+
+    response = await client.get("/api/blog/", params={"include": "liked_by_me"})
+    assert {item["liked_by_me"] for item in response.json()["items"]} == {None}
+    assert response.headers["cache-control"].startswith("public")
+    assert response.headers["vary"] == "Authorization"
+
+    # A bad or expired token reads the feed anonymously instead of failing
+    expired = jwt.encode(
+        {"sub": "reader@example.com", "exp": datetime.utcnow() - timedelta(minutes=1)},
+        settings.jwt.secret_key,
+        algorithm=settings.jwt.algorithm,
+    )
+    for token in ("garbage", expired):
+        headers = {"Authorization": f"Bearer {token}"}
+        for params in ({}, {"include": "liked_by_me"}):
+            response = await client.get("/api/blog/", params=params, headers=headers)
+            assert response.status_code == 200
+            assert {item["liked_by_me"] for item in response.json()["items"]} == {None}
+            assert response.headers["cache-control"].startswith("public")
+
+    response = await client.get("/api/blog/likes", params={"post_ids": post_ids})
+    assert response.status_code in (401, 403)
+
+
+@pytest.mark.asyncio
+async def test_session_routes_reads_to_replica(test_engine):
+    """Test plain reads go to the replica, writes pin the session to the primary"""
+    # Same database, told apart by the statements each engine executes
+    replica = create_async_engine(DATABASE_URL)
+    on_replica = []
+    event.listen(
+        replica.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: on_replica.append(statement),
+    )
+
+    async with RoutingAsyncSession(test_engine) as session:
+        session.sync_session.info["replica"] = replica
+        await session.exec(select(Post))
+        assert len(on_replica) == 1
+
+        await session.exec(select(Post).with_for_update())
+        assert len(on_replica) == 1
+
+        # SELECT over a data-modifying CTE writes
+        updated = (
+            update(Post)
+            .where(Post.id == uuid4())
+            .values(like_count=Post.like_count)
+            .returning(Post.id)
+            .cte("updated")
+        )
+        await session.exec(select(updated.c.id))
+        await session.exec(select(Post))
+        assert len(on_replica) == 1
+        assert session.sync_session.info["wrote"]
+        await session.commit()
+    await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_repository_bulk_api(db_session):
+    """Test batched inserts (INSERT and COPY), ordered get_many, bulk_update, iterate"""
+
+    def users(start: int, count: int) -> list[dict]:
+        return [
+            {
+                "email": f"user{i}@example.com",
+                "full_name": f"user {'abcde'[i]}",
+                "username": f"username{i}",
+                "password": "x",
+            }
+            for i in range(start, start + count)
+        ]
+
+    repo = UserRepository(db_session)
+    inserted = await repo.bulk_create(users(0, 3))
+    repo.bulk_copy_threshold = 2
+    copied = await repo.bulk_create(users(3, 2))
+    await db_session.commit()
+
+    ids = [user.id for user in inserted + copied]
+    found = await repo.get_many([ids[4], uuid4(), ids[0], str(ids[2])])
+    assert [user.id for user in found] == [ids[4], ids[0], ids[2]]
+
+    updated = await repo.bulk_update(
+        [{"id": user_id, "full_name": f"renamed {n}"} for n, user_id in enumerate(ids)]
+    )
+    await db_session.commit()
+    assert updated == 5
+    assert inserted[1].full_name == "renamed 1"
+
+    db_session.expunge_all()
+    names = [user.full_name async for user in repo.iterate(chunk_size=2)]
+    assert sorted(names) == [f"renamed {n}" for n in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_migrations_match_models(test_engine):
+    """Test migrating either a pre-migration schema or an empty one ends at the models"""
+
+    def schema_diff(conn):
+        return compare_metadata(MigrationContext.configure(conn), SQLModel.metadata)
+
+    now = datetime.utcnow()
+    author, fan, other = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    post = uuid.uuid4()
+    users = [
+        {"id": user_id, "email": f"{n}@example.com", "username": f"user{n}"}
+        for n, user_id in enumerate([author, fan, other])
+    ]
+    # Likes the baseline key allowed: fan liked twice, unliked the older one,
+    # other liked twice and unliked both
+    likes = [
+        {"user_id": fan, "is_deleted": True, "updated_at": now - timedelta(days=2)},
+        {"user_id": fan, "is_deleted": False, "updated_at": now - timedelta(days=3)},
+        {"user_id": other, "is_deleted": True, "updated_at": now - timedelta(days=1)},
+        {"user_id": other, "is_deleted": True, "updated_at": now},
+    ]
+    comments = [False, False, True]
+
+    try:
+        async with test_engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.drop_all)
+        # The schema create_all() built before migrations, without history
+        await upgrade(test_engine, "0001")
+        async with test_engine.begin() as conn:
+            await conn.execute(text("DROP TABLE alembic_version"))
+            await conn.execute(
+                text(
+                    "INSERT INTO users (id, created_at, updated_at, is_deleted, "
+                    "email, full_name, username, password) VALUES (:id, :now, "
+                    ":now, false, :email, 'test user', :username, 'x')"
+                ),
+                [dict(user, now=now) for user in users],
+            )
+            await conn.execute(
+                text(
+                    "INSERT INTO post (id, created_at, updated_at, is_deleted, "
+                    "user_id, title, content) VALUES (:id, :now, :now, false, "
+                    ":user_id, 'Adopted post', 'written before migrations')"
+                ),
+                {"id": post, "now": now, "user_id": author},
+            )
+            await conn.execute(
+                text(
+                    "INSERT INTO postlike (id, created_at, updated_at, is_deleted, "
+                    "user_id, post_id) VALUES (:id, :updated_at, :updated_at, "
+                    ":is_deleted, :user_id, :post_id)"
+                ),
+                [dict(like, id=uuid.uuid4(), post_id=post) for like in likes],
+            )
+            await conn.execute(
+                text(
+                    "INSERT INTO comment (id, created_at, updated_at, is_deleted, "
+                    "post_id, user_id, text) VALUES (:id, :now, :now, :is_deleted, "
+                    ":post_id, :user_id, 'nice')"
+                ),
+                [
+                    {
+                        "id": uuid.uuid4(),
+                        "now": now,
+                        "is_deleted": is_deleted,
+                        "post_id": post,
+                        "user_id": fan,
+                    }
+                    for is_deleted in comments
+                ],
+            )
+
+        # Adopted at the baseline, then migrated with its rows
+        await upgrade(test_engine)
+        async with test_engine.connect() as conn:
+            assert await conn.run_sync(schema_diff) == []
+            rows = await conn.execute(
+                text("SELECT user_id, is_deleted FROM postlike ORDER BY is_deleted")
+            )
+            assert rows.all() == [(fan, False), (other, True)]
+            counts = await conn.execute(
+                text(
+                    "SELECT like_count, comment_count FROM post "
+                    "WHERE search_vector @@ plainto_tsquery('adopted')"
+                )
+            )
+            assert counts.all() == [(1, 2)]
+
+        await downgrade("base")
+        await upgrade(test_engine)
+        async with test_engine.connect() as conn:
+            assert await conn.run_sync(schema_diff) == []
+    finally:
+        async with test_engine.begin() as conn:
+            await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+
+@pytest.mark.asyncio
+async def test_repository_queries_use_indexes(db_session, test_engine):
+    """Test no hot-path query plans a sequential scan over a large seeded dataset"""
+    user_count, per_user = 1000, 10
+    users = await UserRepository(db_session).bulk_create(
+        {
+            "email": f"user{i}@example.com",
+            "full_name": "test user",
+            "username": f"username{i}",
+            "password": "x",
+        }
+        for i in range(user_count)
+    )
+    old = datetime.utcnow() - timedelta(days=40)
+    await VerificationRepository(db_session).bulk_create(
+        {"user_id": user.id, "token": f"token{i}", "created_at": old}
+        for i, user in enumerate(users)
+    )
+    posts = await PostRepository(db_session).bulk_create(
+        {"user_id": user.id, "title": f"post title {n}", "content": "text"}
+        for user in users
+        for n in range(per_user)
+    )
+    await CommentRepository(db_session).bulk_create(
+        {"post_id": post.id, "user_id": users[n % user_count].id, "text": "nice"}
+        for n, post in enumerate(posts)
+    )
+    await PostLikeRepository(db_session).bulk_create(
+        {"post_id": post.id, "user_id": users[n % user_count].id}
+        for n, post in enumerate(posts)
+    )
+    await db_session.commit()
+    async with test_engine.connect() as conn:
+        await conn.execute(text("ANALYZE"))
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        user, post = users[7], posts[7]
+        user_repo = UserRepository(db_session)
+        await user_repo.get_by_username(user.username)
+        await user_repo.get_by_email(user.email)
+        await user_repo.get_many([users[1].id, users[2].id])
+        verification_repo = VerificationRepository(db_session)
+        await verification_repo.get_by_token("token7")
+        await verification_repo.get_by_user_id(str(user.id))
+        post_repo = PostRepository(db_session)
+        await post_repo.get_version(post.id)
+        await post_repo.get_live_ids([post.id])
+        await post_repo.recount_likes([post.id])
+        comment_repo = CommentRepository(db_session)
+        await comment_repo.list_by_post_id(post.id, limit=10)
+        await comment_repo.get_version_by_post_id(post.id)
+        like_repo = PostLikeRepository(db_session)
+        await like_repo.get_by_user_and_post(user.id, post.id)
+        await like_repo.get_liker_ids(post.id)
+        await like_repo.get_states(user.id, [post.id, posts[8].id])
+        page = await PostService(db_session).list_posts(count_mode="none")
+        await PostService(db_session).list_posts(
+            cursor=page.next_cursor, count_mode="none"
+        )
+        expired = [u async for u in user_repo.iterate(User.id.in_([user.id]))]
+        assert expired
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", record)
+
+    connection = await db_session.connection()
+    driver = (await connection.get_raw_connection()).driver_connection
+    scans = {}
+    for statement, parameters in statements:
+        plan = await driver.fetchval(f"EXPLAIN (FORMAT JSON) {statement}", *parameters)
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        for relation in seq_scans(plan[0]["Plan"]):
+            scans.setdefault(relation, []).append(statement)
+    assert scans == {}
+    await db_session.rollback()
+
+
+@pytest.mark.asyncio
+async def test_post_partitioning(db_session, test_engine, fake_redis, monkeypatch):
+    """Test monthly partitions: partitioning, pruning, retention, unpartitioning"""
+    # Migrated schema, the revision partitioning is written for
+    async with test_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        with pytest.raises(RuntimeError):
+            await conn.run_sync(partition, 3)
+    await upgrade(test_engine, "0003")
+
+    now = datetime.utcnow()
+    old = now - timedelta(days=70)
+    [user] = await UserRepository(db_session).bulk_create(
+        [
+            {
+                "email": "author@example.com",
+                "full_name": "test author",
+                "username": "author1",
+                "password": "x",
+            }
+        ]
+    )
+    posts = await PostRepository(db_session).bulk_create(
+        {"user_id": user.id, "title": f"post title {n}", "content": "text", **extra}
+        for n, extra in enumerate([{"created_at": old}, {}])
+    )
+    old_id = posts[0].id
+    # The old post also has a recent comment, stored in a partition kept
+    await CommentRepository(db_session).bulk_create(
+        {"post_id": post.id, "user_id": user.id, "text": "nice", **extra}
+        for post, extra in [(posts[0], {"created_at": old}), *((p, {}) for p in posts)]
+    )
+    await PostLikeRepository(db_session).bulk_create(
+        {"post_id": post.id, "user_id": user.id} for post in posts
+    )
+    await db_session.commit()
+
+    async def count(model) -> int:
+        return (await db_session.exec(select(func.count()).select_from(model))).one()
+
+    def relations(plan: dict) -> set:
+        names = {plan.get("Relation Name")}
+        for child in plan.get("Plans", []):
+            names |= relations(child)
+        return names - {None}
+
+    try:
+        async with test_engine.begin() as conn:
+            await conn.run_sync(partition, 3)
+        async with test_engine.connect() as conn:
+            for table in ("post", "comment"):
+                assert await conn.run_sync(is_partitioned, table)
+        assert (await count(Post), await count(Comment)) == (2, 3)
+
+        # Date filters of list_posts only read the partitions they cover
+        filters = PostService._list_filters(date_from=now - timedelta(days=1))
+        plan = await explain(db_session, select(Post.id).where(*filters))
+        scanned = relations(plan)
+        assert partition_name("post", month_start(now)) in scanned
+        assert partition_name("post", month_start(old)) not in scanned
+        await db_session.rollback()
+
+        def fail_detach(*args, **kwargs):
+            raise RuntimeError("detach failed")
+
+        # A failed detach leaves the old post deleted, not live without likes
+        async with test_engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            with monkeypatch.context() as patched:
+                patched.setattr(partitions_module, "detach_partition", fail_detach)
+                with pytest.raises(RuntimeError):
+                    await conn.run_sync(
+                        maintain_partitions, months_ahead=4, retention_days=30
+                    )
+            retired = await conn.run_sync(retire_partitions, retention_days=30)
+        assert retired == [old_id]
+        statement = select(Post.is_deleted, Post.like_count).where(Post.id == old_id)
+        assert tuple((await db_session.exec(statement)).one()) == (True, 0)
+        assert (await count(Post), await count(PostLike)) == (2, 1)
+        await db_session.rollback()
+
+        # Retired posts leave the entity cache and like sets
+        task_client = fake_aioredis.FakeRedis(decode_responses=True)
+        await task_client.set(f"entity:post:{old_id}", "{}")
+        await task_client.sadd(f"likes:post:{old_id}", "*")
+
+        async def create_task_client():
+            return task_client
+
+        monkeypatch.setattr(partition_tasks, "create_redis_client", create_task_client)
+        await partition_tasks._invalidate_posts(retired)
+        assert await task_client.keys("entity:post:*") == [
+            f"entity:post:generation:{old_id}"
+        ]
+        assert not await task_client.exists(f"likes:post:{old_id}")
+
+        async with test_engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            result = await conn.run_sync(
+                maintain_partitions, months_ahead=4, retention_days=30
+            )
+            months = await conn.run_sync(partitions, "post")
+            comment_months = await conn.run_sync(partitions, "comment")
+        assert result["retired"] == [old_id]
+        old_month = month_start(old)
+        assert partition_name("post", old_month) in result["detached"]
+        assert partition_name("comment", old_month) in result["detached"]
+        ahead = add_months(month_start(now), 4)
+        assert max(months) == ahead
+        # Created by the first, failed run already
+        assert ahead in comment_months
+        assert min(months) > old_month
+        counts = (await count(Post), await count(Comment), await count(PostLike))
+        assert counts == (1, 1, 1)
+
+        await db_session.rollback()
+        async with test_engine.begin() as conn:
+            await conn.run_sync(unpartition)
+        async with test_engine.connect() as conn:
+            assert not await conn.run_sync(is_partitioned, "post")
+            diff = await conn.run_sync(
+                lambda c: compare_metadata(
+                    MigrationContext.configure(c), SQLModel.metadata
+                )
+            )
+        assert diff == []
+        assert await count(Post) == 1
+    finally:
+        await db_session.rollback()
+        async with test_engine.begin() as conn:
+            await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+
+@pytest.mark.asyncio
+async def test_orphan_likes_and_comments_are_rejected(db_session, fake_redis):
+    """Test likes and comments on a post gone from the database are refused"""
+    author, reader = await UserRepository(db_session).bulk_create(
+        {
+            "email": f"{name}@example.com",
+            "full_name": "test user",
+            "username": name,
+            "password": "x",
+        }
+        for name in ("author", "reader")
+    )
+    [post] = await PostRepository(db_session).bulk_create(
+        [{"user_id": author.id, "title": "Hello world", "content": "text"}]
+    )
+    post_id = post.id
+    # As once post is partitioned: nothing references it
+    for table in ("postlike", "comment"):
+        await db_session.exec(
+            text(f"ALTER TABLE {table} DROP CONSTRAINT {table}_post_id_fkey")
+        )
+    await db_session.commit()
+    db_session.expunge_all()
+    await PostRepository(db_session).get(post_id)
+
+    # Gone behind the entity cache, e.g. with a detached partition
+    await db_session.exec(text("DELETE FROM post"))
+    await db_session.commit()
+    db_session.expunge_all()
+    assert await PostRepository(db_session).get(post_id) is not None
+
+    principal = Principal(reader.id, reader.email, reader.username, True)
+    with pytest.raises(HTTPException) as exc_info:
+        await PostLikeService(db_session).toggle_like(post_id, principal)
+    assert exc_info.value.status_code == 404
+    with pytest.raises(HTTPException) as exc_info:
+        await CommentService(db_session).create_comment(
+            post_id, CommentCreateSchema(text="nice"), principal
+        )
+    assert exc_info.value.status_code == 404
+    await db_session.rollback()
+
+    for model in (PostLike, Comment):
+        statement = select(func.count()).select_from(model)
+        assert (await db_session.exec(statement)).one() == 0
+
+
+@pytest.mark.asyncio
+async def test_versioned_cache(fake_redis):
+    """Test hits, misses, TTL capping and invalidation by version bump"""
+    cache = VersionedCache("test:versioned", ttl=30)
+    cached, key = await cache.lookup(("page", 1))
+    assert cached is None
+    await cache.store(key, "first", ttl=300)
+    assert await cache.lookup(("page", 1)) == ("first", key)
+    assert 0 < await fake_redis.ttl(key) <= 30
+    # Pages that expire at once are not stored
+    _, other_key = await cache.lookup(("page", 2))
+    await cache.store(other_key, "expired", ttl=0)
+    assert await fake_redis.get(other_key) is None
+
+    await cache.invalidate()
+    cached, new_key = await cache.lookup(("page", 1))
+    assert cached is None and new_key != key
+    assert cache.stats() == {"hits": 1, "misses": 3, "hit_ratio": 0.25}
+
+
+@pytest.mark.asyncio
+async def test_post_listing_cache(client: AsyncClient, fake_redis):
+    """Test the listing is served from cache until a write invalidates it"""
+    headers = await create_verified_user(client)
+    await create_posts(client, headers, 2)
+    hits = post_list_cache.hits
+    first = (await client.get("/api/blog/")).json()
+    assert (await client.get("/api/blog/")).json() == first
+    assert post_list_cache.hits == hits + 1
+
+    await create_posts(client, headers, 1)
+    assert (await client.get("/api/blog/")).json()["total"] == 3
+    assert post_list_cache.hits == hits + 1
+
+
+@pytest.mark.asyncio
+async def test_two_tier_cache_invalidation_across_workers(fake_redis):
+    """Test local copies are evicted by invalidations published on the bus"""
+
+    async def eventually(condition) -> bool:
+        for _ in range(100):
+            if condition():
+                return True
+            await asyncio.sleep(0.01)
+        return False
+
+    cache = TwoTierCache("test:two_tier", ttl=60, local_max_entries=10)
+    # Another worker, with its own bus
+    worker = InvalidationBus()
+    evicted = []
+    worker.register("test:two_tier", evicted.append)
+    await invalidation_bus.start()
+    await worker.start()
+    try:
+        assert await eventually(lambda: invalidation_bus.listening and worker.listening)
+        await cache.set("key", "value")
+        # Served from the local tier once listening
+        await fake_redis.delete("test:two_tier:key")
+        assert await cache.get("key") == "value"
+
+        await fake_redis.publish(CHANNEL, "test:two_tier|key")
+        assert await eventually(lambda: cache.local.get("key") is None)
+        assert await cache.get("key") is None
+
+        # Every worker hears every invalidation, this one's included
+        await cache.invalidate("other")
+        assert await eventually(lambda: evicted == ["key", "other"])
+    finally:
+        await worker.stop()
+        await invalidation_bus.stop()
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_get(test_engine, fake_redis):
+    """Test get() caches committed rows only and rehydrates them typed"""
+    maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as session:
+        user = await UserRepository(session).create(
+            {
+                "email": "author@example.com",
+                "full_name": "test author",
+                "username": "author1",
+                "password": "x",
+            }
+        )
+        post = await PostRepository(session).create(
+            {"user_id": user.id, "title": "Hello world", "content": "text"}
+        )
+        key = f"entity:post:{post.id}"
+        if Settings().database.unit_of_work:
+            # Read back before the commit, the row must not reach the cache
+            session.expunge(post)
+            assert (await PostRepository(session).get(post.id)).id == post.id
+            assert await fake_redis.get(key) is None
+        await commit(session)
+
+    async with maker() as session:
+        await PostRepository(session).get(post.id)
+    assert await fake_redis.get(key) is not None
+
+    async with test_engine.begin() as conn:
+        await conn.execute(text("UPDATE post SET title = 'Changed behind'"))
+    async with maker() as session:
+        repo = PostRepository(session)
+        cached = await repo.get(post.id)
+        assert cached.title == "Hello world"
+        # Fields come back with their types, not as JSON strings
+        assert isinstance(cached.user_id, UUID) and cached.user_id == user.id
+        assert isinstance(cached.created_at, datetime)
+
+        await repo.update(cached, {"title": "Updated title"})
+        await commit(session)
+    assert await fake_redis.get(key) is None
+    async with maker() as session:
+        assert (await PostRepository(session).get(post.id)).title == "Updated title"
+
+
+@pytest.mark.asyncio
+async def test_replica_reads_do_not_fill_shared_caches(test_engine, fake_redis):
+    """Test rows read from a replica are served but not cached"""
+    async with RoutingAsyncSession(test_engine, expire_on_commit=False) as session:
+        user = await UserRepository(session).create(
+            {
+                "email": "author@example.com",
+                "full_name": "test author",
+                "username": "author1",
+                "password": "x",
+            }
+        )
+        post = await PostRepository(session).create(
+            {"user_id": user.id, "title": "Hello world", "content": "text"}
+        )
+        await commit(session)
+
+    jwt_bearer = JwtBearer()
+    token = HTTPAuthorizationCredentials(
+        scheme="Bearer",
+        credentials=await jwt_bearer.create_access_token({"sub": user.email}),
+    )
+
+    async def read_all(session) -> None:
+        assert (await PostRepository(session).get(post.id)).id == post.id
+        assert (await PostService(session).list_posts()).total == 1
+        principal = await jwt_bearer.get_current_user(token=token, session=session)
+        assert principal.id == user.id
+
+    async def cached_keys() -> list:
+        keys = [f"entity:post:{post.id}", f"principal:{user.email}"]
+        keys += await fake_redis.keys("posts:list:v*")
+        return [key for key in keys if await fake_redis.exists(key)]
+
+    # Same database, standing in for a replica that may lag
+    replica = create_async_engine(DATABASE_URL)
+    async with RoutingAsyncSession(test_engine) as session:
+        session.sync_session.info["replica"] = replica
+        await read_all(session)
+    await replica.dispose()
+    assert await cached_keys() == []
+
+    async with RoutingAsyncSession(test_engine) as session:
+        await read_all(session)
+    assert len(await cached_keys()) == 3
+
+
+@pytest.mark.asyncio
+async def test_entity_cache_fill_loses_to_invalidation(test_engine, fake_redis):
+    """Test a row read before a concurrent invalidation is not cached after it"""
+    maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    async with maker() as session:
+        user = await UserRepository(session).create(
+            {
+                "email": "author@example.com",
+                "full_name": "test author",
+                "username": "author1",
+                "password": "x",
+            }
+        )
+        post = await PostRepository(session).create(
+            {"user_id": user.id, "title": "Hello world", "content": "text"}
+        )
+        await commit(session)
+    key = f"entity:post:{post.id}"
+
+    async with maker() as session:
+        repo = PostRepository(session)
+        query = session.exec
+
+        async def exec_then_invalidate(statement):
+            # A writer commits between the query and the fill, and invalidates
+            result = await query(statement)
+            await repo.cache.invalidate(str(post.id))
+            return result
+
+        session.exec = exec_then_invalidate
+        assert (await repo.get(post.id)).title == "Hello world"
+    assert await fake_redis.get(key) is None
+
+    async with maker() as session:
+        await PostRepository(session).get(post.id)
+    assert await fake_redis.get(key) is not None
+
+
+@pytest.mark.asyncio
+async def test_like_callbacks_use_the_committing_redis_client(db_session, fake_redis):
+    """Test like set updates queued for after commit go to the client passed in"""
+    if not Settings().database.unit_of_work:
+        pytest.skip("repositories commit eagerly")
+
+    author, reader = await UserRepository(db_session).bulk_create(
+        {
+            "email": f"{name}@example.com",
+            "full_name": "test user",
+            "username": name,
+            "password": "x",
+        }
+        for name in ("author", "reader")
+    )
+    [post] = await PostRepository(db_session).bulk_create(
+        [{"user_id": author.id, "title": "Hello world", "content": "text"}]
+    )
+    await commit(db_session)
+    key = f"likes:post:{post.id}"
+
+    # A task-local client, as Celery tasks pass, next to the shared one
+    task_client = fake_aioredis.FakeRedis(decode_responses=True)
+    for client in (fake_redis, task_client):
+        await client.sadd(key, "*")
+
+    principal = Principal(reader.id, reader.email, reader.username, True)
+    await PostLikeService(db_session).toggle_like(post.id, principal)
+    await commit(db_session, task_client)
+    assert await task_client.sismember(key, str(reader.id))
+    assert not await fake_redis.sismember(key, str(reader.id))
+
+    principal = Principal(author.id, author.email, author.username, True)
+    await PostService(db_session).delete_post(post.id, principal)
+    await commit(db_session, task_client)
+    assert not await task_client.exists(key)
+    assert await fake_redis.exists(key)